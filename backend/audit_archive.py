@@ -0,0 +1,192 @@
+"""
+Archivage du journal d'audit : les logs plus anciens que la durée de rétention quittent la
+collection audit_logs pour des fichiers mensuels JSONL compressés (gzip)
+
+La collection active reste petite (index en mémoire) ; les archives restent consultables
+par l'API du Journal (include_archives) et sont listées dans la collection audit_log_archives.
+"""
+import asyncio
+import gzip
+import json
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+import logging
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DIR = Path(__file__).parent / "archives" / "audit_logs"
+
+# Nombre de mois conservés dans la collection active (mois en cours non compris)
+AUDIT_RETENTION_MONTHS = int(os.environ.get("AUDIT_RETENTION_MONTHS", 12))
+
+ARCHIVE_BATCH_SIZE = 1000
+
+
+def _month_start(year: int, month: int) -> datetime:
+    return datetime(year, month, 1, tzinfo=timezone.utc)
+
+
+def _next_month(start: datetime) -> datetime:
+    return _month_start(start.year + start.month // 12, start.month % 12 + 1)
+
+
+def _serialize(log: dict) -> str:
+    log = {**log, "_id": str(log["_id"]), "timestamp": log["timestamp"].isoformat()}
+    return json.dumps(log, ensure_ascii=False, default=str)
+
+
+def _read_archive(paths: List[Path]) -> List[dict]:
+    """Logs d'un mois (toutes ses parties), du plus récent au plus ancien, sans doublon"""
+    logs = {}
+    for path in paths:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                log = json.loads(line)
+                log["timestamp"] = datetime.fromisoformat(log["timestamp"])
+                # Une partie peut répéter des logs si un archivage a été interrompu avant la purge
+                logs[log["_id"]] = log
+    return sorted(logs.values(), key=lambda log: (log["timestamp"], ObjectId(log["_id"])), reverse=True)
+
+
+class AuditArchive:
+    """Archives mensuelles du journal d'audit"""
+
+    def __init__(self, db: AsyncIOMotorDatabase):
+        self.db = db
+        # Dernier mois lu : les pages successives d'un même mois ne relisent pas le fichier
+        self._cache: Tuple[Optional[str], List[dict]] = (None, [])
+
+    def retention_cutoff(self, now: Optional[datetime] = None) -> datetime:
+        """Début du plus ancien mois conservé dans la collection active"""
+        now = now or datetime.now(timezone.utc)
+        index = now.year * 12 + now.month - 1 - AUDIT_RETENTION_MONTHS
+        return _month_start(index // 12, index % 12 + 1)
+
+    async def archive_old_logs(self):
+        """
+        Tâche planifiée : archive mois par mois les logs antérieurs à la durée de rétention
+
+        Chaque mois est écrit dans un fichier .part, renommé une fois complet, puis ses
+        logs sont supprimés de la collection active : une interruption ne perd rien.
+        """
+        try:
+            cutoff = self.retention_cutoff()
+            oldest = await self.db.audit_logs.find_one(
+                {"timestamp": {"$lt": cutoff}}, {"timestamp": 1}, sort=[("timestamp", 1)]
+            )
+            if not oldest:
+                return
+
+            await asyncio.to_thread(ARCHIVE_DIR.mkdir, parents=True, exist_ok=True)
+            start = _month_start(oldest["timestamp"].year, oldest["timestamp"].month)
+            archived = 0
+            while start < cutoff:
+                end = _next_month(start)
+                archived += await self._archive_month(start, end)
+                start = end
+
+            logger.info(f"🗄️ Journal d'audit : {archived} log(s) archivé(s) avant le {cutoff.strftime('%d/%m/%Y')}")
+        except Exception as e:
+            logger.error(f"❌ Erreur lors de l'archivage du journal d'audit: {str(e)}")
+
+    async def _archive_month(self, start: datetime, end: datetime) -> int:
+        month = start.strftime("%Y-%m")
+        run = datetime.now(timezone.utc).strftime("%Y%m%d%H%M%S")
+        final_path = ARCHIVE_DIR / f"audit_logs-{month}-{run}.jsonl.gz"
+        partial_path = final_path.with_name(f".{final_path.name}.part")
+
+        cursor = self.db.audit_logs.find({"timestamp": {"$gte": start, "$lt": end}}).sort([("timestamp", 1), ("_id", 1)])
+        ids = []
+        out = await asyncio.to_thread(gzip.open, partial_path, "wt", encoding="utf-8")
+        try:
+            batch = []
+            async for log in cursor:
+                if log["timestamp"].tzinfo is None:
+                    log["timestamp"] = log["timestamp"].replace(tzinfo=timezone.utc)
+                ids.append(log["_id"])
+                batch.append(_serialize(log))
+                if len(batch) >= ARCHIVE_BATCH_SIZE:
+                    await asyncio.to_thread(out.write, "\n".join(batch) + "\n")
+                    batch = []
+            if batch:
+                await asyncio.to_thread(out.write, "\n".join(batch) + "\n")
+        finally:
+            await asyncio.to_thread(out.close)
+
+        if not ids:
+            await asyncio.to_thread(partial_path.unlink)
+            return 0
+
+        await asyncio.to_thread(os.replace, partial_path, final_path)
+        await self.db.audit_log_archives.insert_one({
+            "_id": final_path.name,
+            "month": month,
+            "count": len(ids),
+            "size": (await asyncio.to_thread(final_path.stat)).st_size,
+            "created_at": datetime.now(timezone.utc)
+        })
+        for i in range(0, len(ids), ARCHIVE_BATCH_SIZE):
+            await self.db.audit_logs.delete_many({"_id": {"$in": ids[i:i + ARCHIVE_BATCH_SIZE]}})
+
+        if self._cache[0] == month:
+            self._cache = (None, [])
+        return len(ids)
+
+    async def list_archives(self) -> List[dict]:
+        """Archives disponibles (mois, nombre de logs, taille du fichier)"""
+        return await self.db.audit_log_archives.find().sort("month", -1).to_list(length=None)
+
+    async def count(self) -> int:
+        """Nombre total de logs archivés"""
+        result = await self.db.audit_log_archives.aggregate([
+            {"$group": {"_id": None, "count": {"$sum": "$count"}}}
+        ]).to_list(length=1)
+        return result[0]["count"] if result else 0
+
+    async def _month_logs(self, month: str) -> List[dict]:
+        if self._cache[0] != month:
+            paths = sorted(ARCHIVE_DIR.glob(f"audit_logs-{month}-*.jsonl.gz"))
+            self._cache = (month, await asyncio.to_thread(_read_archive, paths))
+        return self._cache[1]
+
+    async def search(
+        self,
+        matches: Callable[[dict], bool],
+        limit: int,
+        before: Optional[Tuple[datetime, ObjectId]] = None,
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None
+    ) -> List[dict]:
+        """
+        Logs archivés dans l'ordre du Journal, après la position before (timestamp, _id)
+
+        Args:
+            matches: Filtre appliqué à chaque log (mêmes critères que la collection active)
+            limit: Nombre maximal de logs
+            before: Position du dernier log déjà renvoyé
+            start_date, end_date: Bornes de dates (limitent les mois lus)
+        """
+        months = sorted({archive["month"] for archive in await self.list_archives()}, reverse=True)
+        results = []
+        for month in months:
+            month_start = datetime.strptime(month, "%Y-%m").replace(tzinfo=timezone.utc)
+            if before and month_start > before[0]:
+                continue
+            if end_date and month_start > end_date:
+                continue
+            if start_date and _next_month(month_start) <= start_date:
+                break
+
+            for log in await self._month_logs(month):
+                if before and (log["timestamp"], ObjectId(log["_id"])) >= before:
+                    continue
+                if matches(log):
+                    results.append(log)
+                    if len(results) >= limit:
+                        return results
+        return results
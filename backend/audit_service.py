@@ -1,18 +1,156 @@
 """Service pour gérer les logs d'audit (Journal)"""
+import asyncio
+import base64
+import os
 import uuid
 from datetime import datetime, timezone
+from bson import ObjectId
+from bson.codec_options import CodecOptions
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from models import AuditLogCreate, ActionType, EntityType
+from audit_archive import AuditArchive
 from typing import Optional, Dict
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Écriture groupée : les logs sont mis en file et insérés par lots (insert_many)
+AUDIT_BATCH_SIZE = int(os.environ.get("AUDIT_BATCH_SIZE", 200))
+AUDIT_FLUSH_INTERVAL = float(os.environ.get("AUDIT_FLUSH_INTERVAL", 1.0))  # secondes
+
+# Taille maximale de la file : au-delà, log_action attend que l'écriture rattrape son retard
+AUDIT_BUFFER_SIZE = int(os.environ.get("AUDIT_BUFFER_SIZE", 5000))
+
+# Nouvelles tentatives d'insertion d'un lot avant abandon (base indisponible)
+AUDIT_WRITE_RETRIES = 3
+
+# Modes de calcul du total renvoyé avec une page de logs
+COUNT_EXACT = "exact"
+COUNT_ESTIMATED = "estimated"
+COUNT_NONE = "none"
+
+# Au-delà, le total filtré est plafonné (compter tout l'index coûterait plus que la page)
+AUDIT_COUNT_LIMIT = 10000
+
+# Taille des lots lus pour un export (mémoire bornée quel que soit le volume exporté)
+AUDIT_EXPORT_BATCH_SIZE = 2000
+
+# Ordre du Journal (du plus récent au plus ancien) ; _id départage les logs de même horodatage
+AUDIT_SORT = [("timestamp", -1), ("_id", -1)]
+
+
+def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Les dates sans fuseau reçues par l'API sont en UTC, comme les logs"""
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
 class AuditService:
     """Service centralisé pour enregistrer toutes les actions dans le système"""
     
+    # Instances créées (server.py, routes avec leur propre connexion) : vidées à l'arrêt
+    _instances = []
+    
     def __init__(self, db: AsyncIOMotorDatabase):
         self.db = db
+        # Horodatages relus en UTC avec fuseau : sérialisés directement en ISO 8601 (+00:00)
+        self.logs = db.audit_logs.with_options(
+            codec_options=CodecOptions(tz_aware=True, tzinfo=timezone.utc)
+        )
+        self.archive = AuditArchive(db)
+        self._queue: Optional[asyncio.Queue] = None
+        self._writer: Optional[asyncio.Task] = None
+        AuditService._instances.append(self)
+    
+    def _ensure_writer(self):
+        """Démarre la tâche d'écriture au premier log (dans la boucle d'événements)"""
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=AUDIT_BUFFER_SIZE)
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.create_task(self._write_batches())
+    
+    async def _write_batches(self):
+        """Tâche de fond : regroupe les logs en attente et les insère par lots"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + AUDIT_FLUSH_INTERVAL
+            while len(batch) < AUDIT_BATCH_SIZE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            
+            try:
+                await self._insert_batch(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+    
+    async def _insert_batch(self, batch: list):
+        for attempt in range(1, AUDIT_WRITE_RETRIES + 1):
+            try:
+                await self.db.audit_logs.insert_many(batch, ordered=False)
+                logger.debug(f"Audit: {len(batch)} log(s) enregistré(s)")
+                return
+            except Exception as e:
+                if attempt == AUDIT_WRITE_RETRIES:
+                    logger.error(f"❌ Erreur lors de l'écriture de {len(batch)} log(s) d'audit: {e}")
+                    return
+                await asyncio.sleep(attempt)
+    
+    async def flush(self):
+        """Attend que tous les logs en file soient écrits en base"""
+        if self._queue is not None and self._writer is not None and not self._writer.done():
+            await self._queue.join()
+    
+    async def shutdown(self):
+        """Écrit les logs restants puis arrête la tâche d'écriture"""
+        await self.flush()
+        if self._writer is not None:
+            self._writer.cancel()
+            self._writer = None
+    
+    @classmethod
+    async def shutdown_all(cls):
+        """Vide la file de toutes les instances (appelé par shutdown_services)"""
+        for instance in cls._instances:
+            await instance.shutdown()
+    
+    async def ensure_indexes(self):
+        """Index du Journal : tri (timestamp, _id) seul ou précédé de chaque filtre"""
+        await self.db.audit_logs.create_index(AUDIT_SORT)
+        for field in ("user_id", "action", "entity_type"):
+            await self.db.audit_logs.create_index([(field, 1)] + AUDIT_SORT)
+        await self.db.audit_logs.create_index([("entity_type", 1), ("entity_id", 1), ("timestamp", -1)])
+    
+    @staticmethod
+    def encode_cursor(log: dict) -> str:
+        """Curseur de la page suivante : position (timestamp, _id) du dernier log affiché"""
+        raw = f"{log['timestamp'].isoformat()}|{log['_id']}"
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+    
+    @staticmethod
+    def parse_cursor(cursor: str):
+        """Position (timestamp, _id) encodée dans un curseur"""
+        try:
+            timestamp, _, log_id = base64.urlsafe_b64decode(cursor.encode()).decode().partition("|")
+            return _as_utc(datetime.fromisoformat(timestamp)), ObjectId(log_id)
+        except Exception:
+            raise ValueError("Curseur de pagination invalide")
+    
+    @classmethod
+    def decode_cursor(cls, cursor: str) -> dict:
+        """Filtre des logs situés après le curseur dans l'ordre du Journal"""
+        timestamp, log_id = cls.parse_cursor(cursor)
+        return {"$or": [
+            {"timestamp": {"$lt": timestamp}},
+            {"timestamp": timestamp, "_id": {"$lt": log_id}}
+        ]}
     
     async def log_action(
         self,
@@ -55,8 +193,10 @@ class AuditService:
                 "changes": changes
             }
             
-            await self.db.audit_logs.insert_one(audit_log)
-            logger.info(f"Audit log créé: {action.value} {entity_type.value} par {user_email}")
+            # Mis en file : l'insertion en base est faite par lots, hors de la requête
+            self._ensure_writer()
+            await self._queue.put(audit_log)
+            logger.debug(f"Audit log créé: {action.value} {entity_type.value} par {user_email}")
             
         except Exception as e:
             logger.error(f"Erreur lors de la création du log d'audit: {e}")
@@ -70,12 +210,32 @@ class AuditService:
         action: Optional[ActionType] = None,
         entity_type: Optional[EntityType] = None,
         start_date: Optional[datetime] = None,
-        end_date: Optional[datetime] = None
+        end_date: Optional[datetime] = None,
+        cursor: Optional[str] = None,
+        count: str = COUNT_EXACT,
+        include_archives: bool = False
     ):
         """
         Récupère les logs d'audit avec filtres optionnels
+        
+        Pagination par curseur (cursor = encode_cursor du dernier log de la page précédente) :
+        chaque page est lue directement dans l'index (timestamp, _id), quelle que soit sa
+        profondeur. skip reste accepté pour les anciens appels.
+        
+        count: "exact", "estimated" (métadonnées de la collection sans filtre, comptage plafonné
+        à AUDIT_COUNT_LIMIT avec filtres) ou "none"
+        
+        include_archives: une fois la collection active épuisée, la pagination par curseur
+        continue dans les archives mensuelles (voir audit_archive)
+        
+        Returns:
+            (logs, total) ; total vaut None en mode "none"
         """
+        # Les actions qui viennent d'être journalisées apparaissent dans le Journal
+        await self.flush()
+        
         query = {}
+        start_date, end_date = _as_utc(start_date), _as_utc(end_date)
         
         if user_id:
             query["user_id"] = user_id
@@ -83,6 +243,8 @@ class AuditService:
             query["action"] = action.value
         if entity_type:
             query["entity_type"] = entity_type.value
+        # Mêmes critères pour les archives (dates exclues : elles sont traitées à part)
+        filters = dict(query)
         if start_date or end_date:
             query["timestamp"] = {}
             if start_date:
@@ -90,62 +252,72 @@ class AuditService:
             if end_date:
                 query["timestamp"]["$lte"] = end_date
         
-        cursor = self.db.audit_logs.find(query).sort("timestamp", -1).skip(skip).limit(limit)
-        logs = await cursor.to_list(length=limit)
+        page_query = {"$and": [query, self.decode_cursor(cursor)]} if cursor else query
+        find = self.logs.find(page_query).sort(AUDIT_SORT)
+        if skip and not cursor:
+            find = find.skip(skip)
+        logs = await find.limit(limit).to_list(length=limit)
         
-        # Convertir les ObjectId et timestamps pour la sérialisation JSON
         for log in logs:
-            if "_id" in log:
-                log["_id"] = str(log["_id"])
-            # S'assurer que le timestamp est au format ISO avec timezone UTC
-            if "timestamp" in log and log["timestamp"]:
-                if hasattr(log["timestamp"], 'isoformat'):
-                    # Convertir en ISO format
-                    iso_str = log["timestamp"].isoformat()
-                    # Ajouter 'Z' si pas de timezone
-                    if '+' not in iso_str and 'Z' not in iso_str:
-                        log["timestamp"] = iso_str + 'Z'
-                    else:
-                        log["timestamp"] = iso_str
-                elif isinstance(log["timestamp"], str):
-                    # Si c'est déjà une string, s'assurer qu'elle a 'Z'
-                    if '+' not in log["timestamp"] and not log["timestamp"].endswith('Z'):
-                        log["timestamp"] = log["timestamp"] + 'Z'
+            log["_id"] = str(log["_id"])
+        
+        if include_archives and len(logs) < limit and (cursor or not skip):
+            if logs:
+                before = (logs[-1]["timestamp"], ObjectId(logs[-1]["_id"]))
+            else:
+                before = self.parse_cursor(cursor) if cursor else None
+            
+            def matches(log: dict) -> bool:
+                return (
+                    all(log.get(field) == value for field, value in filters.items())
+                    and (start_date is None or log["timestamp"] >= start_date)
+                    and (end_date is None or log["timestamp"] <= end_date)
+                )
+            
+            logs += await self.archive.search(matches, limit - len(logs), before, start_date, end_date)
         
         # Compter le total
-        total = await self.db.audit_logs.count_documents(query)
+        if count == COUNT_NONE:
+            total = None
+        elif count == COUNT_ESTIMATED and not query:
+            total = await self.db.audit_logs.estimated_document_count()
+        elif count == COUNT_ESTIMATED:
+            total = await self.db.audit_logs.count_documents(query, limit=AUDIT_COUNT_LIMIT)
+        else:
+            total = await self.db.audit_logs.count_documents(query)
+        
+        # Total des archives connu par leur index (sans filtre uniquement)
+        if include_archives and total is not None and not query:
+            total += await self.archive.count()
         
         return logs, total
     
+    async def iter_log_batches(self, batch_size: int = AUDIT_EXPORT_BATCH_SIZE, **filters):
+        """
+        Parcourt tous les logs correspondant aux filtres, par lots (export)
+        
+        Chaque lot est une page par curseur : un seul lot est en mémoire à la fois.
+        Accepte les mêmes filtres que get_logs (y compris include_archives).
+        """
+        cursor = None
+        while True:
+            logs, _ = await self.get_logs(limit=batch_size, cursor=cursor, count=COUNT_NONE, **filters)
+            if logs:
+                yield logs
+            if len(logs) < batch_size:
+                return
+            cursor = self.encode_cursor(logs[-1])
+    
     async def get_entity_history(self, entity_type: EntityType, entity_id: str):
         """
         Récupère l'historique complet d'une entité spécifique
         """
+        await self.flush()
+        
         query = {
             "entity_type": entity_type.value,
             "entity_id": entity_id
         }
         
-        cursor = self.db.audit_logs.find(query).sort("timestamp", -1)
-        logs = await cursor.to_list(length=None)
-        
-        # Convertir les ObjectId et timestamps pour la sérialisation JSON
-        for log in logs:
-            if "_id" in log:
-                log["_id"] = str(log["_id"])
-            # S'assurer que le timestamp est au format ISO avec timezone UTC
-            if "timestamp" in log and log["timestamp"]:
-                if hasattr(log["timestamp"], 'isoformat'):
-                    # Convertir en ISO format
-                    iso_str = log["timestamp"].isoformat()
-                    # Ajouter 'Z' si pas de timezone
-                    if '+' not in iso_str and 'Z' not in iso_str:
-                        log["timestamp"] = iso_str + 'Z'
-                    else:
-                        log["timestamp"] = iso_str
-                elif isinstance(log["timestamp"], str):
-                    # Si c'est déjà une string, s'assurer qu'elle a 'Z'
-                    if '+' not in log["timestamp"] and not log["timestamp"].endswith('Z'):
-                        log["timestamp"] = log["timestamp"] + 'Z'
-        
-        return logs
+        cursor = self.logs.find(query, {"_id": 0}).sort("timestamp", -1)
+        return await cursor.to_list(length=None)
@@ -2,7 +2,7 @@
 Routes API pour les Autorisations Particulières de Travaux
 Format: MAINT_FE_003_V03
 """
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.responses import HTMLResponse
 from typing import List, Optional
 from datetime import datetime, timezone
@@ -14,6 +14,9 @@ from models import AutorisationParticuliere, AutorisationParticuliereCreate, Aut
 from dependencies import get_current_user, get_current_user_optional
 from auth import decode_access_token
 from autorisation_template import generate_autorisation_html
+from counter_service import CounterService
+from document_pdf import document_pdf_cache, render_autorisations_pdf
+from file_responder import send_file
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/autorisations", tags=["autorisations"])
@@ -24,6 +27,7 @@ import os
 
 client = AsyncIOMotorClient(os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
 db = client.gmao_iris
+counter_service = CounterService(db)
 
 
 # ==================== CRUD ====================
@@ -113,10 +117,7 @@ async def create_autorisation(
     """Créer une nouvelle autorisation"""
     try:
         # Générer le numéro d'autorisation (>= 8000)
-        last_autorisation = await db.autorisations_particulieres.find_one(
-            sort=[("numero", -1)]
-        )
-        next_numero = 8000 if not last_autorisation else last_autorisation.get("numero", 7999) + 1
+        next_numero = await counter_service.next_value("autorisations")
         
         data = autorisation.model_dump()
         data["id"] = str(uuid.uuid4())
@@ -190,6 +191,7 @@ async def delete_autorisation(
         result = await db.autorisations_particulieres.delete_one({"id": autorisation_id})
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Autorisation non trouvée")
+        await document_pdf_cache.invalidate(f"autorisation-{autorisation_id}")
         
         logger.info(f"Autorisation supprimée: {autorisation_id}")
         return {"success": True, "message": "Autorisation supprimée"}
@@ -204,11 +206,18 @@ async def delete_autorisation(
 
 @router.get("/{autorisation_id}/pdf")
 async def generate_autorisation_pdf(
+    request: Request,
     autorisation_id: str,
     token: str = None,
+    format: Optional[str] = None,
     current_user: dict = Depends(get_current_user_optional)
 ):
-    """Générer le PDF de l'autorisation particulière - Format MAINT_FE_003_V03"""
+    """
+    Générer le PDF de l'autorisation particulière - Format MAINT_FE_003_V03
+
+    Rendu une seule fois par version puis servi depuis le cache disque.
+    Avec format=html, renvoie le HTML à imprimer par le navigateur.
+    """
     try:
         # Vérifier l'authentification
         if not current_user and token:
@@ -218,14 +227,20 @@ async def generate_autorisation_pdf(
         elif not current_user and not token:
             raise HTTPException(status_code=401, detail="Non authentifié")
         
-        autorisation = await db.autorisations_particulieres.find_one({"id": autorisation_id})
+        autorisation = await db.autorisations_particulieres.find_one({"id": autorisation_id}, {"_id": 0})
         if not autorisation:
             raise HTTPException(status_code=404, detail="Autorisation non trouvée")
         
-        # Générer le HTML avec le template
-        html_content = generate_autorisation_html(autorisation)
+        if format == "html":
+            # Générer le HTML avec le template
+            return HTMLResponse(content=generate_autorisation_html(autorisation))
         
-        return HTMLResponse(content=html_content)
+        version = str(autorisation.get("updated_at") or autorisation.get("created_at") or "")
+        path = await document_pdf_cache.get(
+            f"autorisation-{autorisation_id}", version, render_autorisations_pdf, [autorisation]
+        )
+        filename = f"autorisation_{autorisation.get('numero') or autorisation_id}.pdf"
+        return await send_file(request, path, filename, "application/pdf", inline=True)
     except HTTPException:
         raise
     except Exception as e:
@@ -2,23 +2,70 @@
 Template HTML pour générer le PDF d'Autorisation Particulière de Travaux
 Format: MAINT_FE_003_V03
 """
+from html import escape
+
+# Mesures de sécurité (libellé, champ) - partagées avec le rendu PDF (document_pdf.py)
+MESURES_SECURITE = [
+    ("CONSIGNATION MAT. OU PIÈCE EN MOUV", "mesure_consignation_materiel"),
+    ("CONSIGNATION ÉLECTRIQUE", "mesure_consignation_electrique"),
+    ("DÉBRANCHEMENT FORCE MOTRICE", "mesure_debranchement_force"),
+    ("VIDANGE APPAREIL/TUYAUTERIE", "mesure_vidange_appareil"),
+    ("DÉCONTAMINATION/LAVAGE", "mesure_decontamination"),
+    ("DÉGAZAGE", "mesure_degazage"),
+    ("POSE JOINT PLEIN", "mesure_pose_joint"),
+    ("VENTILATION FORCÉE", "mesure_ventilation"),
+    ("ZONE BALISÉE", "mesure_zone_balisee"),
+    ("CANALISATIONS ÉLECTRIQUES", "mesure_canalisations_electriques"),
+    ("SOUTERRAINES BALISÉES", "mesure_souterraines_balisees"),
+    ("ÉGOUTS ET CÂBLES PROTÉGÉS", "mesure_egouts_cables"),
+    ("TAUX D'OXYGÈNE", "mesure_taux_oxygene"),
+    ("TAUX D'EXPLOSIVITÉ", "mesure_taux_explosivite"),
+    ("EXPLOSIMÈTRE EN CONTINU", "mesure_explosimetre"),
+    ("ÉCLAIRAGE DE SÛRETÉ", "mesure_eclairage_surete"),
+    ("EXTINCTEUR TYPE", "mesure_extincteur"),
+    ("AUTRES", "mesure_autres")
+]
+
+# EPI (champ, libellé)
+EPI = [
+    ("epi_visiere", "VISIÈRE"),
+    ("epi_tenue_impermeable", "TENUE IMPERMÉABLE, BOTTES"),
+    ("epi_cagoule_air", "CAGOULE AIR RESPIRABLE/ART"),
+    ("epi_masque", "MASQUE TYPE"),
+    ("epi_gant", "GANT TYPE"),
+    ("epi_harnais", "HARNAIS DE SÉCURITÉ"),
+    ("epi_outillage_anti_etincelle", "OUTILLAGE ANTI-ÉTINCELLE"),
+    ("epi_presence_surveillant", "PRÉSENCE D'UN SURVEILLANT"),
+    ("epi_autres", "AUTRES")
+]
+
+# Le document n'a besoin d'aucune ressource externe : tout chargement est bloqué
+CONTENT_SECURITY_POLICY = "default-src 'none'; style-src 'unsafe-inline'"
+
 
 def generate_autorisation_html(autorisation: dict) -> str:
-    """Génère le HTML pour l'autorisation particulière - Format avec colonnes pour sections spécifiques"""
+    """
+    Génère le HTML pour l'autorisation particulière - Format avec colonnes pour sections spécifiques
+    
+    Les valeurs saisies sont échappées : elles ne peuvent pas injecter de balises.
+    """
+    
+    def field(key, source=autorisation):
+        return escape(str(source.get(key) or ""))
     
     # Données de l'autorisation
-    numero = autorisation.get("numero", "")
-    date_etablissement = autorisation.get("date_etablissement", "")
-    service_demandeur = autorisation.get("service_demandeur", "")
-    responsable = autorisation.get("responsable", "")
+    numero = field("numero")
+    date_etablissement = field("date_etablissement")
+    service_demandeur = field("service_demandeur")
+    responsable = field("responsable")
     
     # Personnel autorisé (4 entrées)
     personnel_autorise = autorisation.get("personnel_autorise", [])
     personnel_rows = ""
     for i in range(4):
         if i < len(personnel_autorise):
-            nom = personnel_autorise[i].get("nom", "")
-            fonction = personnel_autorise[i].get("fonction", "")
+            nom = field("nom", personnel_autorise[i])
+            fonction = field("fonction", personnel_autorise[i])
         else:
             nom = ""
             fonction = ""
@@ -38,12 +85,12 @@ def generate_autorisation_html(autorisation: dict) -> str:
     
     newline = "\n"
     br_tag = "<br>"
-    description_travaux = autorisation.get("description_travaux", "").replace(newline, br_tag)
-    horaire_debut = autorisation.get("horaire_debut", "")
-    horaire_fin = autorisation.get("horaire_fin", "")
-    lieu_travaux = autorisation.get("lieu_travaux", "")
+    description_travaux = field("description_travaux").replace(newline, br_tag)
+    horaire_debut = field("horaire_debut")
+    horaire_fin = field("horaire_fin")
+    lieu_travaux = field("lieu_travaux")
     
-    risques_potentiels = autorisation.get("risques_potentiels", "").replace(newline, br_tag)
+    risques_potentiels = field("risques_potentiels").replace(newline, br_tag)
     
     # Fonction helper pour afficher les mesures de sécurité
     def format_mesure(key):
@@ -56,31 +103,9 @@ def generate_autorisation_html(autorisation: dict) -> str:
             return '<span style="color: gray;">-</span>'
     
     # Mesures de sécurité - tableau sur 2 colonnes
-    mesures_data = [
-        ("CONSIGNATION MAT. OU PIÈCE EN MOUV", "mesure_consignation_materiel"),
-        ("CONSIGNATION ÉLECTRIQUE", "mesure_consignation_electrique"),
-        ("DÉBRANCHEMENT FORCE MOTRICE", "mesure_debranchement_force"),
-        ("VIDANGE APPAREIL/TUYAUTERIE", "mesure_vidange_appareil"),
-        ("DÉCONTAMINATION/LAVAGE", "mesure_decontamination"),
-        ("DÉGAZAGE", "mesure_degazage"),
-        ("POSE JOINT PLEIN", "mesure_pose_joint"),
-        ("VENTILATION FORCÉE", "mesure_ventilation"),
-        ("ZONE BALISÉE", "mesure_zone_balisee"),
-        ("CANALISATIONS ÉLECTRIQUES", "mesure_canalisations_electriques"),
-        ("SOUTERRAINES BALISÉES", "mesure_souterraines_balisees"),
-        ("ÉGOUTS ET CÂBLES PROTÉGÉS", "mesure_egouts_cables"),
-        ("TAUX D'OXYGÈNE", "mesure_taux_oxygene"),
-        ("TAUX D'EXPLOSIVITÉ", "mesure_taux_explosivite"),
-        ("EXPLOSIMÈTRE EN CONTINU", "mesure_explosimetre"),
-        ("ÉCLAIRAGE DE SÛRETÉ", "mesure_eclairage_surete"),
-        ("EXTINCTEUR TYPE", "mesure_extincteur"),
-        ("AUTRES", "mesure_autres")
-    ]
-    
-    # Diviser en 2 colonnes
-    mid = (len(mesures_data) + 1) // 2
-    mesures_col1 = mesures_data[:mid]
-    mesures_col2 = mesures_data[mid:]
+    mid = (len(MESURES_SECURITE) + 1) // 2
+    mesures_col1 = MESURES_SECURITE[:mid]
+    mesures_col2 = MESURES_SECURITE[mid:]
     
     mesures_rows = ""
     for i in range(max(len(mesures_col1), len(mesures_col2))):
@@ -104,27 +129,15 @@ def generate_autorisation_html(autorisation: dict) -> str:
         row += "</tr>"
         mesures_rows += row
     
-    mesures_securite_texte = autorisation.get("mesures_securite_texte", "").replace(newline, br_tag)
+    mesures_securite_texte = field("mesures_securite_texte").replace(newline, br_tag)
     
     # EPI (checkboxes) - sur 3 colonnes
-    epi_data = [
-        ("epi_visiere", "VISIÈRE"),
-        ("epi_tenue_impermeable", "TENUE IMPERMÉABLE, BOTTES"),
-        ("epi_cagoule_air", "CAGOULE AIR RESPIRABLE/ART"),
-        ("epi_masque", "MASQUE TYPE"),
-        ("epi_gant", "GANT TYPE"),
-        ("epi_harnais", "HARNAIS DE SÉCURITÉ"),
-        ("epi_outillage_anti_etincelle", "OUTILLAGE ANTI-ÉTINCELLE"),
-        ("epi_presence_surveillant", "PRÉSENCE D'UN SURVEILLANT"),
-        ("epi_autres", "AUTRES")
-    ]
-    
     epi_rows = ""
-    for i in range(0, len(epi_data), 3):
+    for i in range(0, len(EPI), 3):
         row = "<tr>"
         for j in range(3):
-            if i + j < len(epi_data):
-                key, label = epi_data[i + j]
+            if i + j < len(EPI):
+                key, label = EPI[i + j]
                 checked = "☑" if autorisation.get(key) else "☐"
                 row += f'<td style="border: 1px solid black; padding: 4px; font-size: 9pt;"><span style="font-size: 11pt;">{checked}</span> {label}</td>'
             else:
@@ -132,18 +145,19 @@ def generate_autorisation_html(autorisation: dict) -> str:
         row += "</tr>"
         epi_rows += row
     
-    equipements_protection_texte = autorisation.get("equipements_protection_texte", "").replace(newline, br_tag)
+    equipements_protection_texte = field("equipements_protection_texte").replace(newline, br_tag)
     
-    signature_demandeur = autorisation.get("signature_demandeur", "")
-    date_signature_demandeur = autorisation.get("date_signature_demandeur", "")
-    signature_responsable_securite = autorisation.get("signature_responsable_securite", "")
-    date_signature_responsable = autorisation.get("date_signature_responsable", "")
+    signature_demandeur = field("signature_demandeur")
+    date_signature_demandeur = field("date_signature_demandeur")
+    signature_responsable_securite = field("signature_responsable_securite")
+    date_signature_responsable = field("date_signature_responsable")
     
     html = f"""
 <!DOCTYPE html>
 <html lang="fr">
 <head>
     <meta charset="UTF-8">
+    <meta http-equiv="Content-Security-Policy" content="{CONTENT_SECURITY_POLICY}">
     <title>Autorisation Particulière N°{numero}</title>
     <style>
         @page {{
@@ -0,0 +1,84 @@
+"""Service des compteurs affichés dans les badges du header"""
+import asyncio
+import time
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, Optional
+import logging
+
+from dependencies import check_permission
+
+logger = logging.getLogger(__name__)
+
+
+class BadgeService:
+    """
+    Compteurs des badges du header gardés en mémoire.
+
+    Chaque module enregistre une fonction de calcul ; les routes d'écriture appellent
+    invalidate() et le prochain appel recalcule une seule fois. Les compteurs dépendant
+    de la date du jour (échéances, retards) sont recalculés au changement de jour, et
+    max_age borne la durée de vie d'une valeur pour les écritures faites hors de ce
+    processus (autre worker, import direct en base).
+    """
+
+    def __init__(self, max_age: int = 300):
+        self.max_age = max_age
+        self._sources: Dict[str, tuple] = {}
+        self._cache: Dict[str, tuple] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def register(self, key: str, module: str, compute: Callable[[], Awaitable[dict]], max_age: Optional[int] = None):
+        """
+        Enregistre un compteur
+
+        Args:
+            key: Clé du compteur dans la réponse de /api/badges
+            module: Module de permission requis en lecture (ex: 'surveillance')
+            compute: Coroutine renvoyant le dictionnaire des valeurs du badge
+            max_age: Durée de vie propre à ce compteur (secondes), pour ceux dont les
+                écritures n'appellent pas invalidate()
+        """
+        self._sources[key] = (module, compute, max_age or self.max_age)
+        self._locks[key] = asyncio.Lock()
+
+    def invalidate(self, *keys: str):
+        """Invalide les compteurs donnés (tous si aucune clé n'est fournie)"""
+        for key in keys or list(self._cache.keys()):
+            self._cache.pop(key, None)
+
+    def _fresh(self, key: str) -> Optional[dict]:
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        day, computed_at, values = entry
+        max_age = self._sources[key][2]
+        if day != datetime.now(timezone.utc).date() or time.monotonic() - computed_at > max_age:
+            return None
+        return values
+
+    async def get(self, key: str) -> dict:
+        """Renvoie les valeurs d'un compteur, recalculées uniquement si invalidées"""
+        values = self._fresh(key)
+        if values is not None:
+            return values
+
+        # Un seul recalcul même si plusieurs navigateurs interrogent en même temps
+        async with self._locks[key]:
+            values = self._fresh(key)
+            if values is None:
+                _, compute, _ = self._sources[key]
+                values = await compute()
+                self._cache[key] = (datetime.now(timezone.utc).date(), time.monotonic(), values)
+        return values
+
+    async def get_for_user(self, current_user: dict) -> dict:
+        """Renvoie tous les compteurs que l'utilisateur a le droit de voir"""
+        badges = {}
+        for key, (module, _, _) in self._sources.items():
+            if not check_permission(current_user, module, "view"):
+                continue
+            try:
+                badges[key] = await self.get(key)
+            except Exception as e:
+                logger.error(f"Erreur calcul du compteur '{key}': {e}")
+        return badges
@@ -0,0 +1,300 @@
+"""
+Stockage des fichiers joints par contenu (SHA-256), avec déduplication et comptage des références
+
+Un même fichier uploadé plusieurs fois (notice, photo, certificat) n'est stocké qu'une
+fois sous son empreinte. La collection blobs garde pour chaque empreinte sa taille et
+son nombre de références ; la tâche gc() recompte les références depuis tous les sites
+de pièces jointes et supprime les fichiers qui ne sont plus référencés.
+
+Le stockage physique est local (uploads/blobs) ou compatible S3 (MinIO...), selon
+BLOB_BACKEND.
+"""
+import asyncio
+import os
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Optional
+import logging
+
+import aiofiles.os
+from fastapi import HTTPException, Request, UploadFile
+from fastapi.responses import Response, StreamingResponse
+
+import upload_service
+from file_responder import send_file, content_disposition
+
+logger = logging.getLogger(__name__)
+
+BLOB_ROOT = Path(__file__).parent / "uploads" / "blobs"
+
+# Fichiers reçus en attente d'être rangés dans le stockage
+INCOMING_DIR = BLOB_ROOT / "_incoming"
+
+# Un blob sans référence n'est supprimé qu'après ce délai (upload en cours d'enregistrement)
+GC_GRACE_PERIOD = timedelta(hours=1)
+
+# Sites de pièces jointes : (collection, tableau à dérouler ou None, champ empreinte)
+REFERENCE_SITES = [
+    ("work_orders", "attachments", "attachments.sha256"),
+    ("improvements", "attachments", "attachments.sha256"),
+    ("improvement_requests", "attachments", "attachments.sha256"),
+    ("surveillance_history", "fichiers", "fichiers.sha256"),
+    ("documents", None, "fichier_sha256"),
+]
+
+STORAGE_BLOB = "blob"
+
+
+class LocalBlobBackend:
+    """Blobs rangés sur disque sous uploads/blobs/<2 premiers caractères>/<empreinte>"""
+
+    def __init__(self, root: Path = BLOB_ROOT):
+        self.root = root
+
+    def path(self, sha256: str) -> Path:
+        return self.root / sha256[:2] / sha256
+
+    async def exists(self, sha256: str) -> bool:
+        return await aiofiles.os.path.exists(self.path(sha256))
+
+    async def put(self, source: Path, sha256: str):
+        target = self.path(sha256)
+        await aiofiles.os.makedirs(target.parent, exist_ok=True)
+        await aiofiles.os.replace(source, target)
+
+    async def delete(self, sha256: str):
+        try:
+            await aiofiles.os.remove(self.path(sha256))
+        except FileNotFoundError:
+            pass
+
+    async def response(self, request: Request, sha256: str, filename: str, media_type: Optional[str], inline: bool) -> Response:
+        return await send_file(request, self.path(sha256), filename, media_type, inline=inline)
+
+    @asynccontextmanager
+    async def local_file(self, sha256: str):
+        yield self.path(sha256)
+
+
+class S3BlobBackend:
+    """Blobs stockés dans un bucket compatible S3 (clé blobs/<empreinte>)"""
+
+    def __init__(self):
+        import boto3
+
+        self.bucket = os.environ["S3_BUCKET"]
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=os.environ.get("S3_ENDPOINT_URL") or None,
+            aws_access_key_id=os.environ.get("S3_ACCESS_KEY"),
+            aws_secret_access_key=os.environ.get("S3_SECRET_KEY"),
+            region_name=os.environ.get("S3_REGION", "us-east-1")
+        )
+
+    @staticmethod
+    def key(sha256: str) -> str:
+        return f"blobs/{sha256}"
+
+    async def exists(self, sha256: str) -> bool:
+        from botocore.exceptions import ClientError
+
+        try:
+            await asyncio.to_thread(self.client.head_object, Bucket=self.bucket, Key=self.key(sha256))
+            return True
+        except ClientError:
+            return False
+
+    async def put(self, source: Path, sha256: str):
+        await asyncio.to_thread(self.client.upload_file, str(source), self.bucket, self.key(sha256))
+        await aiofiles.os.remove(source)
+
+    async def delete(self, sha256: str):
+        await asyncio.to_thread(self.client.delete_object, Bucket=self.bucket, Key=self.key(sha256))
+
+    @asynccontextmanager
+    async def local_file(self, sha256: str):
+        """Copie temporaire de l'objet sur disque (supprimée en sortie)"""
+        await aiofiles.os.makedirs(INCOMING_DIR, exist_ok=True)
+        target = INCOMING_DIR / f"{uuid.uuid4()}.tmp"
+        await asyncio.to_thread(self.client.download_file, self.bucket, self.key(sha256), str(target))
+        try:
+            yield target
+        finally:
+            try:
+                await aiofiles.os.remove(target)
+            except FileNotFoundError:
+                pass
+
+    async def response(self, request: Request, sha256: str, filename: str, media_type: Optional[str], inline: bool) -> Response:
+        """Relaie l'objet S3 (en-têtes Range et If-None-Match transmis au stockage)"""
+        from botocore.exceptions import ClientError
+
+        params = {"Bucket": self.bucket, "Key": self.key(sha256)}
+        if request.headers.get("range"):
+            params["Range"] = request.headers["range"]
+        if request.headers.get("if-none-match"):
+            params["IfNoneMatch"] = request.headers["if-none-match"]
+
+        try:
+            obj = await asyncio.to_thread(self.client.get_object, **params)
+        except ClientError as e:
+            status = e.response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+            if status == 304:
+                return Response(status_code=304, headers={"ETag": request.headers["if-none-match"]})
+            if status == 416:
+                raise HTTPException(status_code=416, detail="Plage demandée hors du fichier")
+            raise HTTPException(status_code=404, detail="Fichier non trouvé dans le stockage")
+
+        body = obj["Body"]
+
+        async def chunks():
+            try:
+                while True:
+                    chunk = await asyncio.to_thread(body.read, upload_service.CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    yield chunk
+            finally:
+                body.close()
+
+        headers = {
+            "ETag": obj.get("ETag", ""),
+            "Content-Length": str(obj["ContentLength"]),
+            "Accept-Ranges": "bytes",
+            "Cache-Control": "private, no-cache",
+            "Content-Disposition": content_disposition(filename, inline)
+        }
+        if obj.get("ContentRange"):
+            headers["Content-Range"] = obj["ContentRange"]
+        return StreamingResponse(
+            chunks(),
+            status_code=206 if obj.get("ContentRange") else 200,
+            media_type=media_type or "application/octet-stream",
+            headers=headers
+        )
+
+
+class BlobStore:
+    """Dépôt des fichiers joints par empreinte SHA-256"""
+
+    def __init__(self):
+        self.db = None
+        self.backend = None
+
+    def init(self, database):
+        """Initialise le dépôt (connexion DB et stockage choisi par BLOB_BACKEND=local|s3)"""
+        self.db = database
+        if os.environ.get("BLOB_BACKEND", "local").lower() == "s3":
+            self.backend = S3BlobBackend()
+            logger.info(f"📦 Stockage des pièces jointes: S3 (bucket {self.backend.bucket})")
+        else:
+            self.backend = LocalBlobBackend()
+
+    async def ensure_indexes(self):
+        await self.db.blobs.create_index([("refcount", 1), ("updated_at", 1)])
+        for collection, _, field in REFERENCE_SITES:
+            await self.db[collection].create_index(field, sparse=True)
+
+    async def store_upload(
+        self,
+        file: Optional[UploadFile],
+        upload_id: Optional[str],
+        user_id: str,
+        max_size: int = upload_service.MAX_UPLOAD_SIZE
+    ) -> dict:
+        """
+        Reçoit un fichier (multipart ou upload par morceaux) et le range par empreinte
+
+        Si le contenu est déjà stocké, le fichier reçu est supprimé et seul le compteur
+        de références augmente.
+
+        Returns:
+            dict avec sha256, size, original_filename, mime_type et storage
+        """
+        stored = await upload_service.receive_upload(file, upload_id, user_id, INCOMING_DIR, max_size=max_size)
+        sha256 = stored["sha256"]
+        now = datetime.now(timezone.utc)
+
+        result = await self.db.blobs.update_one(
+            {"_id": sha256},
+            {
+                "$inc": {"refcount": 1},
+                "$set": {"updated_at": now},
+                "$setOnInsert": {"size": stored["size"], "mime_type": stored["mime_type"], "created_at": now}
+            },
+            upsert=True
+        )
+
+        if result.upserted_id is None and await self.backend.exists(sha256):
+            await aiofiles.os.remove(stored["path"])
+            logger.info(f"📎 Fichier déjà stocké, dédupliqué: {sha256[:12]}…")
+        else:
+            await self.backend.put(stored["path"], sha256)
+
+        return {
+            "sha256": sha256,
+            "filename": sha256,
+            "size": stored["size"],
+            "original_filename": stored["original_filename"],
+            "mime_type": stored["mime_type"],
+            "storage": STORAGE_BLOB
+        }
+
+    async def release(self, *sha256s: Optional[str]):
+        """Retire une référence (pièce jointe supprimée) ; le fichier part au prochain gc()"""
+        now = datetime.now(timezone.utc)
+        for sha256 in filter(None, sha256s):
+            await self.db.blobs.update_one({"_id": sha256}, {"$inc": {"refcount": -1}, "$set": {"updated_at": now}})
+
+    async def response(self, request: Request, sha256: str, filename: str, media_type: Optional[str], inline: bool = False) -> Response:
+        """Réponse HTTP pour le contenu d'un blob"""
+        return await self.backend.response(request, sha256, filename, media_type, inline)
+
+    def local_file(self, sha256: str):
+        """Chemin local du contenu d'un blob (copie temporaire pour S3), à utiliser avec async with"""
+        return self.backend.local_file(sha256)
+
+    async def gc(self):
+        """
+        Tâche planifiée : recompte les références depuis tous les sites et supprime les orphelins
+
+        Les compteurs tenus à jour à l'upload et à la suppression sont corrigés ici pour les
+        références disparues sans passer par release() (ordre de travail supprimé, document
+        remplacé, import direct en base).
+        """
+        try:
+            references = {}
+            for collection, unwind, field in REFERENCE_SITES:
+                pipeline = [{"$match": {field: {"$exists": True, "$ne": None}}}]
+                if unwind:
+                    pipeline.append({"$unwind": f"${unwind}"})
+                pipeline += [
+                    {"$match": {field: {"$ne": None}}},
+                    {"$group": {"_id": f"${field}", "count": {"$sum": 1}}}
+                ]
+                async for entry in self.db[collection].aggregate(pipeline):
+                    references[entry["_id"]] = references.get(entry["_id"], 0) + entry["count"]
+
+            cutoff = datetime.now(timezone.utc) - GC_GRACE_PERIOD
+            removed = 0
+            async for blob in self.db.blobs.find({}, {"refcount": 1, "updated_at": 1}):
+                count = references.get(blob["_id"], 0)
+                if count == 0 and blob["updated_at"].replace(tzinfo=timezone.utc) < cutoff:
+                    # Document supprimé d'abord et seulement s'il n'a pas bougé : un upload
+                    # concurrent du même contenu (updated_at modifié) conserve le fichier
+                    result = await self.db.blobs.delete_one({"_id": blob["_id"], "updated_at": blob["updated_at"]})
+                    if result.deleted_count:
+                        await self.backend.delete(blob["_id"])
+                        removed += 1
+                elif count != blob.get("refcount"):
+                    await self.db.blobs.update_one({"_id": blob["_id"]}, {"$set": {"refcount": count}})
+
+            logger.info(f"🧹 Stockage des pièces jointes: {removed} fichier(s) orphelin(s) supprimé(s)")
+        except Exception as e:
+            logger.error(f"❌ Erreur lors du nettoyage du stockage des pièces jointes: {str(e)}")
+
+
+# Instance partagée : initialisée par server.py, utilisée par tous les sites de pièces jointes
+blob_store = BlobStore()
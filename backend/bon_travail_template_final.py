@@ -3,36 +3,53 @@ Template HTML pour la génération du PDF Bon de Travail
 Basé EXACTEMENT sur le prompt détaillé de l'utilisateur
 Utilise les valeurs du formulaire JSX (formData)
 """
+from html import escape
+
+# LISTES DU FORMULAIRE JSX (PAS DU DOCX) - partagées avec le rendu PDF (document_pdf.py)
+RISQUES_MATERIEL = ['Chute plain pied', 'Chute en hauteur', 'Manutention', 'Matériel en rotation', 'Electricité', 'Circulation engin']
+RISQUES_AUTORISATION = ['Point chaud', 'Espace confiné']
+RISQUES_PRODUITS = ['Toxique', 'Inflammable', 'Corrosif', 'Irritant', 'CMR']
+RISQUES_ENVIRONNEMENT = ['Co-activité', 'Passage chariot', 'Zone piétonne', 'Zone ATEX']
+
+PRECAUTIONS_MATERIEL = ['Echafaudage', 'Nacelle', 'Harnais', 'Ligne vie', 'Consignation', 'Déconsignation']
+PRECAUTIONS_EPI = ['Casque', 'Lunettes', 'Gants', 'Chaussures S3', 'Masque', 'Bouchons oreilles', 'Gilet HV']
+PRECAUTIONS_ENVIRONNEMENT = ['Balisage', 'Signalisation', 'Permis feu', 'Ventilation']
+
+# Textes fixes du formulaire
+INTRODUCTION = "Le bon de travail, permet d'identifier les risques liés aux travaux spécifiés ci-dessous ainsi que les précautions à prendre pour éviter tout accident, dégât matériel ou atteinte à l'environnement. Ce bon de travail tient lieu de plan de prévention. Sauf contre-indication particulière (ou modification des conditions d'intervention), le bon de travail est valable pour toute la durée du chantier (dans la limite de 24 heures)."
+NOTE_CHARIOT = "L'utilisation d'un chariot ou d'une nacelle n'est possible qu'après que l'entreprise intervenante ait fourni à IRIS une autorisation nominative de conduite."
+ENGAGEMENT = "Le représentant de l'entreprise intervenante reconnaît avoir pris connaissance des risques liés aux travaux qui lui sont confiés et s'engage à appliquer et faire appliquer les mesures de précaution qui lui ont été notifiées."
+PIED_DE_PAGE = "Remettre une copie à l'intervenant – Archivage Direction du site"
+
+# Le document n'a besoin d'aucune ressource externe : tout chargement est bloqué
+CONTENT_SECURITY_POLICY = "default-src 'none'; style-src 'unsafe-inline'"
+
 
 def generate_bon_travail_html(bon):
     """
     Génère le HTML du bon de travail selon le prompt utilisateur détaillé
+    
+    Les valeurs saisies sont échappées : elles ne peuvent pas injecter de balises.
     """
     
     # Extraction des données
-    date_engagement = bon.get('date_engagement', '')[:10] if bon.get('date_engagement') else ''
+    date_engagement = escape(str(bon.get('date_engagement') or '')[:10])
+    
+    def field(key):
+        return escape(str(bon.get(key) or ''))
     
     # Fonction helper pour générer les checkboxes
     def checkbox(label, checked_list, value):
         checked = value in (checked_list or [])
         check_mark = '✓' if checked else ''
-        return f'<div class="checkbox-item"><span class="checkbox {"checked" if checked else ""}">{check_mark}</span> {label}</div>'
-    
-    # LISTES DU FORMULAIRE JSX (PAS DU DOCX)
-    risques_materiel_list = ['Chute plain pied', 'Chute en hauteur', 'Manutention', 'Matériel en rotation', 'Electricité', 'Circulation engin']
-    risques_autorisation_list = ['Point chaud', 'Espace confiné']
-    risques_produits_list = ['Toxique', 'Inflammable', 'Corrosif', 'Irritant', 'CMR']
-    risques_environnement_list = ['Co-activité', 'Passage chariot', 'Zone piétonne', 'Zone ATEX']
-    
-    precautions_materiel_list = ['Echafaudage', 'Nacelle', 'Harnais', 'Ligne vie', 'Consignation', 'Déconsignation']
-    precautions_epi_list = ['Casque', 'Lunettes', 'Gants', 'Chaussures S3', 'Masque', 'Bouchons oreilles', 'Gilet HV']
-    precautions_environnement_list = ['Balisage', 'Signalisation', 'Permis feu', 'Ventilation']
+        return f'<div class="checkbox-item"><span class="checkbox {"checked" if checked else ""}">{check_mark}</span> {escape(label)}</div>'
     
     html_content = f"""
 <!DOCTYPE html>
 <html>
 <head>
     <meta charset="UTF-8">
+    <meta http-equiv="Content-Security-Policy" content="{CONTENT_SECURITY_POLICY}">
     <title>Bon de travail - MAINT_FE_004_V02</title>
     <style>
         @page {{
@@ -223,7 +240,7 @@ def generate_bon_travail_html(bon):
     
     <!-- 2. PARAGRAPHE D'INTRODUCTION -->
     <div class="intro">
-        Le bon de travail, permet d'identifier les risques liés aux travaux spécifiés ci-dessous ainsi que les précautions à prendre pour éviter tout accident, dégât matériel ou atteinte à l'environnement. Ce bon de travail tient lieu de plan de prévention. Sauf contre-indication particulière (ou modification des conditions d'intervention), le bon de travail est valable pour toute la durée du chantier (dans la limite de 24 heures).
+        {INTRODUCTION}
     </div>
     
     <!-- 3. SECTION: TRAVAUX À RÉALISER -->
@@ -232,27 +249,27 @@ def generate_bon_travail_html(bon):
         
         <div class="field">
             <span class="field-label">Localisation / Ligne :</span>
-            <span class="field-value">{bon.get('localisation_ligne', '')}</span>
+            <span class="field-value">{field('localisation_ligne')}</span>
         </div>
         
         <div class="field">
             <span class="field-label">Description :</span>
-            <span class="field-value">{bon.get('description_travaux', '')}</span>
+            <span class="field-value">{field('description_travaux')}</span>
         </div>
         
         <div class="field">
             <span class="field-label">Nom des intervenants :</span>
-            <span class="field-value">{bon.get('nom_intervenants', '')}</span>
+            <span class="field-value">{field('nom_intervenants')}</span>
         </div>
         
         <div class="field">
             <span class="field-label">Titre :</span>
-            <span class="field-value">{bon.get('titre', '')}</span>
+            <span class="field-value">{field('titre')}</span>
         </div>
         
         <div class="field">
             <span class="field-label">Entreprise :</span>
-            <span class="field-value">{bon.get('entreprise', '')}</span>
+            <span class="field-value">{field('entreprise')}</span>
         </div>
     </div>
     
@@ -263,32 +280,32 @@ def generate_bon_travail_html(bon):
         <!-- Sous-section 1: Matériel/Infrastructures -->
         <div class="subsection-title">Intervention sur du matériel ou des infrastructures :</div>
         <div class="checkbox-group">
-            {''.join([checkbox(label, bon.get('risques_materiel', []), label) for label in risques_materiel_list])}
+            {''.join([checkbox(label, bon.get('risques_materiel', []), label) for label in RISQUES_MATERIEL])}
             <div class="field" style="margin-top: 8px;">
                 <span class="field-label">Autre (préciser) :</span>
-                <span class="field-value">{bon.get('risques_materiel_autre', '')}</span>
+                <span class="field-value">{field('risques_materiel_autre')}</span>
             </div>
         </div>
         
         <!-- Sous-section 2: Autorisation -->
         <div class="subsection-title">Travaux nécessitant une autorisation particulière :</div>
         <div class="checkbox-group">
-            {''.join([checkbox(label, bon.get('risques_autorisation', []), label) for label in risques_autorisation_list])}
+            {''.join([checkbox(label, bon.get('risques_autorisation', []), label) for label in RISQUES_AUTORISATION])}
         </div>
         
         <!-- Sous-section 3: Produits -->
         <div class="subsection-title">Produits dangereux :</div>
         <div class="checkbox-group">
-            {''.join([checkbox(label, bon.get('risques_produits', []), label) for label in risques_produits_list])}
+            {''.join([checkbox(label, bon.get('risques_produits', []), label) for label in RISQUES_PRODUITS])}
         </div>
         
         <!-- Sous-section 4: Environnement -->
         <div class="subsection-title">Environnement des travaux nécessitant une attention particulière :</div>
         <div class="checkbox-group">
-            {''.join([checkbox(label, bon.get('risques_environnement', []), label) for label in risques_environnement_list])}
+            {''.join([checkbox(label, bon.get('risques_environnement', []), label) for label in RISQUES_ENVIRONNEMENT])}
             <div class="field" style="margin-top: 8px;">
                 <span class="field-label">Autre (préciser) :</span>
-                <span class="field-value">{bon.get('risques_environnement_autre', '')}</span>
+                <span class="field-value">{field('risques_environnement_autre')}</span>
             </div>
         </div>
     </div>
@@ -300,35 +317,35 @@ def generate_bon_travail_html(bon):
         <!-- Sous-section 1: Matériel -->
         <div class="subsection-title">Sur le matériel ou les infrastructures :</div>
         <div class="checkbox-group">
-            {''.join([checkbox(label, bon.get('precautions_materiel', []), label) for label in precautions_materiel_list])}
+            {''.join([checkbox(label, bon.get('precautions_materiel', []), label) for label in PRECAUTIONS_MATERIEL])}
             <div class="field" style="margin-top: 8px;">
                 <span class="field-label">Autre (préciser) :</span>
-                <span class="field-value">{bon.get('precautions_materiel_autre', '')}</span>
+                <span class="field-value">{field('precautions_materiel_autre')}</span>
             </div>
         </div>
         
         <!-- NOTE OBLIGATOIRE -->
         <div class="note">
-            L'utilisation d'un chariot ou d'une nacelle n'est possible qu'après que l'entreprise intervenante ait fourni à IRIS une autorisation nominative de conduite.
+            {NOTE_CHARIOT}
         </div>
         
         <!-- Sous-section 2: EPI -->
         <div class="subsection-title">Sur les hommes, le matériel ou l'environnement :</div>
         <div class="checkbox-group">
-            {''.join([checkbox(label, bon.get('precautions_epi', []), label) for label in precautions_epi_list])}
+            {''.join([checkbox(label, bon.get('precautions_epi', []), label) for label in PRECAUTIONS_EPI])}
             <div class="field" style="margin-top: 8px;">
                 <span class="field-label">Autre (préciser) :</span>
-                <span class="field-value">{bon.get('precautions_epi_autre', '')}</span>
+                <span class="field-value">{field('precautions_epi_autre')}</span>
             </div>
         </div>
         
         <!-- Sous-section 3: Environnement -->
         <div class="subsection-title">Sur l'environnement des travaux :</div>
         <div class="checkbox-group">
-            {''.join([checkbox(label, bon.get('precautions_environnement', []), label) for label in precautions_environnement_list])}
+            {''.join([checkbox(label, bon.get('precautions_environnement', []), label) for label in PRECAUTIONS_ENVIRONNEMENT])}
             <div class="field" style="margin-top: 8px;">
                 <span class="field-label">Autre (préciser) :</span>
-                <span class="field-value">{bon.get('precautions_environnement_autre', '')}</span>
+                <span class="field-value">{field('precautions_environnement_autre')}</span>
             </div>
         </div>
     </div>
@@ -337,7 +354,7 @@ def generate_bon_travail_html(bon):
     <div class="engagement">
         <div class="engagement-title">Engagement</div>
         <p style="margin: 0; text-align: justify;">
-            Le représentant de l'entreprise intervenante reconnaît avoir pris connaissance des risques liés aux travaux qui lui sont confiés et s'engage à appliquer et faire appliquer les mesures de précaution qui lui ont été notifiées.
+            {ENGAGEMENT}
         </p>
     </div>
     
@@ -350,14 +367,14 @@ def generate_bon_travail_html(bon):
         </tr>
         <tr>
             <td>{date_engagement}</td>
-            <td>{bon.get('nom_agent_maitrise', '')}</td>
-            <td>{bon.get('nom_representant', '')}</td>
+            <td>{field('nom_agent_maitrise')}</td>
+            <td>{field('nom_representant')}</td>
         </tr>
     </table>
     
     <!-- 8. PIED DE PAGE -->
     <div class="footer">
-        Remettre une copie à l'intervenant – Archivage Direction du site
+        {PIED_DE_PAGE}
     </div>
 </body>
 </html>
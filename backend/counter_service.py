@@ -0,0 +1,67 @@
+"""Service des numéros séquentiels (ordres de travail, améliorations, autorisations...)"""
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+from typing import Dict
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Séquences connues : nom -> (collection numérotée, dernier numéro avant le premier attribué)
+SEQUENCES = {
+    "work_orders": ("work_orders", 5800),
+    "improvements": ("improvements", 7000),
+    "autorisations": ("autorisations_particulieres", 7999),
+    "bons_travail": ("bons_travail", 0),
+}
+
+
+class CounterService:
+    """
+    Numéros séquentiels stockés dans la collection counters.
+
+    Chaque numéro est obtenu par un find_one_and_update $inc atomique : deux créations
+    simultanées ne peuvent pas recevoir le même numéro et une suppression ne provoque
+    pas de réattribution. Au premier appel d'une séquence dans le processus, le compteur
+    est aligné ($max) sur le plus grand numéro déjà présent dans la collection, ce qui
+    reprend la numérotation existante sans migration.
+    """
+
+    def __init__(self, db: AsyncIOMotorDatabase):
+        self.db = db
+        self._seeded: Dict[str, bool] = {}
+
+    async def _seed(self, name: str):
+        collection, base = SEQUENCES[name]
+        result = await self.db[collection].aggregate([
+            {"$group": {
+                "_id": None,
+                "max": {"$max": {"$convert": {"input": "$numero", "to": "long", "onError": None, "onNull": None}}}
+            }}
+        ]).to_list(length=1)
+        current = max(base, int(result[0]["max"] or 0) if result else 0)
+
+        await self.db.counters.update_one(
+            {"_id": name},
+            {"$max": {"seq": current}},
+            upsert=True
+        )
+        self._seeded[name] = True
+        logger.info(f"Compteur '{name}' aligné sur {current}")
+
+    async def next_value(self, name: str) -> int:
+        """
+        Renvoie le prochain numéro de la séquence
+
+        Args:
+            name: Nom de la séquence (clé de SEQUENCES)
+        """
+        if not self._seeded.get(name):
+            await self._seed(name)
+
+        counter = await self.db.counters.find_one_and_update(
+            {"_id": name},
+            {"$inc": {"seq": 1}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return counter["seq"]
@@ -0,0 +1,197 @@
+"""
+Import en masse de fichiers CSV/Excel (plan de surveillance, presqu'accidents)
+
+Les colonnes sont nettoyées et contrôlées en entier avec pandas (pas de boucle par ligne),
+puis les lignes valides sont insérées par lots (insert_many non ordonné). Toutes les erreurs
+sont écrites dans un rapport CSV téléchargeable ; la réponse n'en reprend que les premières.
+"""
+import asyncio
+import os
+import time
+import uuid
+from io import BytesIO
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+import logging
+
+import pandas as pd
+from fastapi import HTTPException, UploadFile
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+IMPORT_REPORTS_DIR = Path(__file__).parent / "uploads" / "import_reports"
+
+# Nombre de documents par insert_many
+IMPORT_CHUNK_SIZE = 1000
+
+# Durée de conservation des rapports d'erreurs
+IMPORT_REPORT_RETENTION = 7 * 24 * 3600  # secondes
+
+# Erreurs reprises dans la réponse (le rapport les contient toutes)
+ERRORS_IN_RESPONSE = 10
+
+REPORT_COLUMNS = ["ligne", "colonne", "valeur", "erreur"]
+
+
+def _read_file(filename: str, content: bytes) -> pd.DataFrame:
+    # Tout est lu en texte : les colonnes sont converties par la validation
+    if filename.endswith('.csv'):
+        return pd.read_csv(BytesIO(content), dtype=str)
+    return pd.read_excel(BytesIO(content), dtype=str)
+
+
+async def read_import_file(file: UploadFile) -> "ImportFrame":
+    """Lit le fichier importé (CSV ou Excel)"""
+    if not file.filename.endswith(('.csv', '.xlsx', '.xls')):
+        raise HTTPException(status_code=400, detail="Format de fichier non supporté")
+    content = await file.read()
+    df = await asyncio.to_thread(_read_file, file.filename, content)
+    return ImportFrame(df)
+
+
+class ImportFrame:
+    """Fichier importé en cours de validation : colonnes nettoyées et erreurs par ligne"""
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self.invalid = pd.Series(False, index=df.index)
+        self._errors: List[pd.DataFrame] = []
+
+    def _column(self, column: str) -> pd.Series:
+        """Colonne en texte sans espaces superflus, cellules vides à NA"""
+        if column not in self.df:
+            return pd.Series(pd.NA, index=self.df.index, dtype="string")
+        values = self.df[column].astype("string").str.strip()
+        return values.mask(values == "")
+
+    def reject(self, mask: pd.Series, column: str, message: str):
+        """Marque les lignes de mask comme invalides"""
+        if not mask.any():
+            return
+        raw = self._column(column)[mask].astype(object)
+        self._errors.append(pd.DataFrame({
+            "ligne": (mask.index[mask.to_numpy()] + 2).to_numpy(),  # en-tête + numérotation à partir de 1
+            "colonne": column,
+            "valeur": raw.where(raw.notna(), ""),
+            "erreur": message
+        }))
+        self.invalid |= mask
+
+    def add_errors(self, errors: Iterable[dict]):
+        """Erreurs détectées après la validation (écriture en base)"""
+        errors = list(errors)
+        if errors:
+            self._errors.append(pd.DataFrame(errors, columns=REPORT_COLUMNS))
+
+    def text(self, column: str, default: Optional[str] = None, required: bool = False) -> pd.Series:
+        """Colonne texte ; valeur par défaut pour les cellules vides"""
+        values = self._column(column)
+        if required:
+            self.reject(values.isna(), column, "Valeur obligatoire manquante")
+        if default is not None:
+            values = values.fillna(default)
+        return values
+
+    def choice(self, column: str, allowed: Iterable[str], default: Optional[str] = None) -> pd.Series:
+        """Colonne à valeurs imposées (énumération), comparée sans tenir compte de la casse"""
+        allowed = list(allowed)
+        values = self.text(column, default, required=default is None).str.upper()
+        self.reject(values.notna() & ~values.isin(allowed), column, f"Valeur invalide (attendu : {', '.join(allowed)})")
+        return values
+
+    def date(self, column: str, required: bool = False) -> pd.Series:
+        """Colonne date (ISO ou JJ/MM/AAAA), normalisée en AAAA-MM-JJ"""
+        values = self.text(column, required=required)
+        parsed = pd.to_datetime(values, format="ISO8601", errors="coerce", utc=True)
+        french = pd.to_datetime(values.where(parsed.isna()), format="%d/%m/%Y", errors="coerce", utc=True)
+        parsed = parsed.fillna(french)
+        self.reject(values.notna() & parsed.isna(), column, "Date invalide (attendu : AAAA-MM-JJ ou JJ/MM/AAAA)")
+        return parsed.dt.strftime("%Y-%m-%d")
+
+    def valid_rows(self, columns: Dict[str, object]) -> List[Tuple[int, dict]]:
+        """Lignes valides (numéro de ligne du fichier, valeurs), cellules vides à None"""
+        data = pd.DataFrame(columns, index=self.df.index)[~self.invalid].astype(object)
+        data = data.where(data.notna(), None)
+        return list(zip((data.index + 2).tolist(), data.to_dict("records")))
+
+    def errors(self) -> pd.DataFrame:
+        """Toutes les erreurs, par numéro de ligne"""
+        if not self._errors:
+            return pd.DataFrame(columns=REPORT_COLUMNS)
+        return pd.concat(self._errors, ignore_index=True).sort_values("ligne", kind="stable")
+
+
+async def insert_chunks(collection, rows: List[Tuple[int, dict]], frame: ImportFrame) -> int:
+    """
+    Insère les documents par lots non ordonnés
+
+    Un document refusé par MongoDB n'empêche pas l'insertion des autres ; son erreur est
+    ajoutée au rapport avec son numéro de ligne.
+    """
+    inserted = 0
+    for start in range(0, len(rows), IMPORT_CHUNK_SIZE):
+        chunk = rows[start:start + IMPORT_CHUNK_SIZE]
+        try:
+            result = await collection.insert_many([document for _, document in chunk], ordered=False)
+            inserted += len(result.inserted_ids)
+        except BulkWriteError as e:
+            inserted += e.details.get("nInserted", 0)
+            frame.add_errors(
+                {"ligne": chunk[error["index"]][0], "colonne": "", "valeur": "", "erreur": error.get("errmsg", "")}
+                for error in e.details.get("writeErrors", [])
+            )
+    return inserted
+
+
+def _write_report(errors: pd.DataFrame, path: Path):
+    IMPORT_REPORTS_DIR.mkdir(parents=True, exist_ok=True)
+
+    # Supprimer les rapports expirés
+    expired = time.time() - IMPORT_REPORT_RETENTION
+    for old in IMPORT_REPORTS_DIR.glob("*.csv"):
+        if old.stat().st_mtime < expired:
+            old.unlink(missing_ok=True)
+
+    partial = path.with_suffix(".part")
+    errors.to_csv(partial, index=False, encoding='utf-8-sig')
+    os.replace(partial, path)
+
+
+def report_path(report_id: str) -> Path:
+    """Fichier d'un rapport d'erreurs (404 si inconnu ou expiré)"""
+    try:
+        path = IMPORT_REPORTS_DIR / f"{uuid.UUID(report_id)}.csv"
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Rapport d'import non trouvé")
+    if not path.exists():
+        raise HTTPException(status_code=404, detail="Rapport d'import non trouvé")
+    return path
+
+
+async def import_result(frame: ImportFrame, imported_count: int, report_url: str) -> dict:
+    """
+    Réponse de l'import, avec le rapport complet des erreurs s'il y en a
+
+    Args:
+        report_url: URL de téléchargement des rapports ({report_id} remplacé)
+    """
+    errors = frame.errors()
+    result = {
+        "success": True,
+        "imported_count": imported_count,
+        "error_count": len(errors),
+        "errors": [
+            f"Ligne {row.ligne}: {row.colonne + ' - ' if row.colonne else ''}{row.erreur}"
+            for row in errors.head(ERRORS_IN_RESPONSE).itertuples()
+        ],
+        "error_report_id": None,
+        "error_report_url": None
+    }
+    if len(errors):
+        report_id = str(uuid.uuid4())
+        await asyncio.to_thread(_write_report, errors, IMPORT_REPORTS_DIR / f"{report_id}.csv")
+        result["error_report_id"] = report_id
+        result["error_report_url"] = report_url.format(report_id=report_id)
+    logger.info(f"📥 Import : {imported_count} ligne(s) importée(s), {len(errors)} erreur(s)")
+    return result
@@ -16,6 +16,7 @@ from models import (
 )
 import email_service
 import audit_service as audit_module
+from realtime_service import realtime_service
 import os
 from motor.motor_asyncio import AsyncIOMotorClient
 
@@ -107,6 +108,7 @@ async def create_demande_arret(
         data["_id"] = ObjectId()
         
         await db.demandes_arret.insert_one(data)
+        realtime_service.publish("demande_arret", "created", data["id"])
         
         # Envoyer l'email de demande
         await send_demande_email(data)
@@ -230,6 +232,7 @@ async def validate_demande_by_token(
             }
             await db.planning_equipement.insert_one(entry)
         
+        realtime_service.publish("demande_arret", "updated", demande["id"], {"statut": DemandeArretStatus.APPROUVEE})
         logger.info(f"Demande approuvée: {demande['id']}")
         
         # Envoyer email de confirmation au demandeur
@@ -286,6 +289,7 @@ async def refuse_demande_by_token(
             {"$set": update_data}
         )
         
+        realtime_service.publish("demande_arret", "updated", demande["id"], {"statut": DemandeArretStatus.REFUSEE})
         logger.info(f"Demande refusée: {demande['id']}")
         
         # Envoyer email de refus au demandeur
@@ -369,6 +373,7 @@ async def check_expired_demandes():
                     "updated_at": now.isoformat()
                 }}
             )
+            realtime_service.publish("demande_arret", "updated", demande["id"], {"statut": DemandeArretStatus.EXPIREE})
             
             # Envoyer email d'expiration
             await send_expiration_email(demande)
@@ -14,12 +14,11 @@ def set_database(database):
     global db
     db = database
 
-async def get_current_user_optional(credentials: HTTPAuthorizationCredentials = Depends(security_optional)):
-    """Version optionnelle de get_current_user qui ne lève pas d'erreur si pas de credentials"""
-    if credentials is None:
-        return None
-    
-    token = credentials.credentials
+async def get_user_from_token(token: str) -> Optional[dict]:
+    """
+    Retrouve l'utilisateur correspondant à un token JWT, None si invalide.
+    Utilisé quand le token ne peut pas passer par l'en-tête Authorization (EventSource).
+    """
     payload = decode_access_token(token)
     
     if payload is None:
@@ -40,6 +39,13 @@ async def get_current_user_optional(credentials: HTTPAuthorizationCredentials =
     
     return user
 
+async def get_current_user_optional(credentials: HTTPAuthorizationCredentials = Depends(security_optional)):
+    """Version optionnelle de get_current_user qui ne lève pas d'erreur si pas de credentials"""
+    if credentials is None:
+        return None
+    
+    return await get_user_from_token(credentials.credentials)
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     token = credentials.credentials
     payload = decode_access_token(token)
@@ -0,0 +1,512 @@
+"""
+Rendu PDF côté serveur des documents imprimables (bons de travail, autorisations particulières)
+
+Les formulaires MAINT_FE_004 et MAINT_FE_003 sont dessinés avec ReportLab (comme le manuel),
+dans le pool de processus partagé. Les PDF sont conservés sur disque par document et version
+(updated_at) : un document inchangé n'est rendu qu'une fois. Les gabarits HTML restent
+disponibles (format=html) pour l'impression par le navigateur.
+"""
+import asyncio
+import hashlib
+import os
+import re
+from html import escape
+from pathlib import Path
+from typing import Callable, List
+import logging
+
+import aiofiles.os
+
+import worker_pool
+from bon_travail_template_final import (
+    RISQUES_MATERIEL, RISQUES_AUTORISATION, RISQUES_PRODUITS, RISQUES_ENVIRONNEMENT,
+    PRECAUTIONS_MATERIEL, PRECAUTIONS_EPI, PRECAUTIONS_ENVIRONNEMENT,
+    INTRODUCTION, NOTE_CHARIOT, ENGAGEMENT, PIED_DE_PAGE,
+    CONTENT_SECURITY_POLICY
+)
+from autorisation_template import MESURES_SECURITE, EPI
+
+logger = logging.getLogger(__name__)
+
+PDF_CACHE_DIR = Path(__file__).parent / "cache" / "documents_pdf"
+
+STYLE_REGEX = re.compile(r"<style[^>]*>.*?</style>", re.S | re.I)
+BODY_REGEX = re.compile(r"<body[^>]*>(.*)</body>", re.S | re.I)
+
+
+def merge_html_documents(documents: List[str], title: str) -> str:
+    """
+    Assemble plusieurs documents HTML du même gabarit en un seul, un document par page
+
+    Les styles sont repris du premier document (gabarit commun).
+    """
+    styles = "\n".join(STYLE_REGEX.findall(documents[0])) if documents else ""
+    bodies = []
+    for document in documents:
+        match = BODY_REGEX.search(document)
+        bodies.append(match.group(1) if match else document)
+    page_break = '\n<div style="page-break-after: always;"></div>\n'
+    return (
+        '<!DOCTYPE html>\n<html>\n<head>\n<meta charset="UTF-8">\n'
+        f'<meta http-equiv="Content-Security-Policy" content="{CONTENT_SECURITY_POLICY}">\n'
+        f"<title>{escape(title)}</title>\n{styles}\n</head>\n"
+        f"<body>\n{page_break.join(bodies)}\n</body>\n</html>"
+    )
+
+
+# ==================== Rendu ReportLab ====================
+
+def _text(value) -> str:
+    """Valeur saisie pour un paragraphe ReportLab (balisage échappé, retours à la ligne)"""
+    return escape(str(value or ""), quote=False).replace("\n", "<br/>")
+
+
+def _styles() -> dict:
+    from reportlab.lib.enums import TA_CENTER, TA_JUSTIFY, TA_RIGHT
+    from reportlab.lib.styles import ParagraphStyle
+
+    base = ParagraphStyle("base", fontName="Helvetica", fontSize=9, leading=12)
+    return {
+        "base": base,
+        "title": ParagraphStyle("title", parent=base, fontName="Helvetica-Bold", fontSize=18, leading=22),
+        "reference": ParagraphStyle("reference", parent=base, fontName="Helvetica-Bold", fontSize=10, alignment=TA_RIGHT),
+        "header_right": ParagraphStyle("header_right", parent=base, fontSize=8, leading=11, alignment=TA_RIGHT),
+        "h1": ParagraphStyle("h1", parent=base, fontName="Helvetica-Bold", fontSize=13, leading=16,
+                             alignment=TA_CENTER, spaceBefore=6, spaceAfter=6),
+        "intro": ParagraphStyle("intro", parent=base, fontSize=10, leading=14, alignment=TA_JUSTIFY),
+        "section": ParagraphStyle("section", parent=base, fontName="Helvetica-Bold", fontSize=12, leading=15,
+                                  spaceBefore=10, spaceAfter=6),
+        "subsection": ParagraphStyle("subsection", parent=base, fontName="Helvetica-Bold", fontSize=10, leading=13,
+                                     spaceBefore=8, spaceAfter=4),
+        "field": ParagraphStyle("field", parent=base, fontSize=11, leading=16, spaceAfter=2),
+        "note": ParagraphStyle("note", parent=base, fontName="Helvetica-Oblique", fontSize=10, leading=13),
+        "banner": ParagraphStyle("banner", parent=base, fontName="Helvetica-Bold", fontSize=10),
+        "center": ParagraphStyle("center", parent=base, alignment=TA_CENTER),
+        "bold_center": ParagraphStyle("bold_center", parent=base, fontName="Helvetica-Bold", alignment=TA_CENTER),
+        "footer": ParagraphStyle("footer", parent=base, fontName="Helvetica-Oblique", alignment=TA_CENTER, spaceBefore=12),
+    }
+
+
+def _boxed(content, width, background=None, border="#000000", border_width=1, left_border=None, padding=6):
+    """Encadré autour d'un ou plusieurs éléments"""
+    from reportlab.lib import colors
+    from reportlab.platypus import Table, TableStyle
+
+    box = Table([[content]], colWidths=[width])
+    commands = [
+        ("LEFTPADDING", (0, 0), (-1, -1), padding + 2), ("RIGHTPADDING", (0, 0), (-1, -1), padding + 2),
+        ("TOPPADDING", (0, 0), (-1, -1), padding), ("BOTTOMPADDING", (0, 0), (-1, -1), padding),
+    ]
+    if border:
+        commands.append(("BOX", (0, 0), (-1, -1), border_width, colors.HexColor(border)))
+    if left_border:
+        commands.append(("LINEBEFORE", (0, 0), (0, -1), 4, colors.HexColor(left_border)))
+    if background:
+        commands.append(("BACKGROUND", (0, 0), (-1, -1), colors.HexColor(background)))
+    box.setStyle(TableStyle(commands))
+    return box
+
+
+def _checkbox(checked: bool):
+    """Case à cocher dessinée (pleine si cochée)"""
+    from reportlab.lib import colors
+    from reportlab.lib.units import mm
+    from reportlab.platypus import Table, TableStyle
+
+    box = Table([[""]], colWidths=[3.5 * mm], rowHeights=[3.5 * mm])
+    commands = [("BOX", (0, 0), (-1, -1), 1.2, colors.black)]
+    if checked:
+        commands.append(("BACKGROUND", (0, 0), (-1, -1), colors.black))
+    box.setStyle(TableStyle(commands))
+    return box
+
+
+def _checkbox_grid(labels: List[str], checked: List[str], styles: dict, width: float, columns: int = 3):
+    """Cases à cocher sur plusieurs colonnes (libellés échappés)"""
+    from reportlab.lib.units import mm
+    from reportlab.platypus import Paragraph, Table, TableStyle
+
+    checked = checked or []
+    cells = [(_checkbox(label in checked), Paragraph(_text(label), styles["base"])) for label in labels]
+    rows = []
+    for i in range(0, len(cells), columns):
+        row = []
+        for box, label in cells[i:i + columns]:
+            row += [box, label]
+        row += ["", ""] * (columns - len(cells[i:i + columns]))
+        rows.append(row)
+    column_width = width / columns
+    grid = Table(rows, colWidths=[6 * mm, column_width - 6 * mm] * columns)
+    grid.setStyle(TableStyle([("VALIGN", (0, 0), (-1, -1), "MIDDLE"), ("LEFTPADDING", (0, 0), (-1, -1), 2)]))
+    return grid
+
+
+def _bon_story(bon: dict, styles: dict) -> list:
+    """Éléments du bon de travail - Format MAINT_FE_004_V02"""
+    from reportlab.lib import colors
+    from reportlab.lib.units import mm
+    from reportlab.platypus import Paragraph, Spacer, Table, TableStyle
+
+    width = 180 * mm
+
+    def field(label, key):
+        return Paragraph(f"<b>{label} :</b> {_text(bon.get(key))}", styles["field"])
+
+    def checkboxes(labels, key):
+        return _checkbox_grid(labels, bon.get(key), styles, width)
+
+    header = Table(
+        [[Paragraph("Bon de travail", styles["title"]), Paragraph("MAINT_FE_004_V02", styles["reference"])]],
+        colWidths=[width * 0.6, width * 0.4]
+    )
+    header.setStyle(TableStyle([
+        ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+        ("LINEBELOW", (0, 0), (-1, 0), 2, colors.black),
+        ("LEFTPADDING", (0, 0), (-1, -1), 0), ("RIGHTPADDING", (0, 0), (-1, -1), 0),
+        ("BOTTOMPADDING", (0, 0), (-1, -1), 8),
+    ]))
+
+    story = [
+        header,
+        Spacer(1, 4 * mm),
+        _boxed(Paragraph(escape(INTRODUCTION), styles["intro"]), width, background="#f5f5f5", border="#cccccc"),
+
+        Paragraph("<u>Travaux à réaliser</u>", styles["section"]),
+        field("Localisation / Ligne", "localisation_ligne"),
+        field("Description", "description_travaux"),
+        field("Nom des intervenants", "nom_intervenants"),
+        field("Titre", "titre"),
+        field("Entreprise", "entreprise"),
+
+        Paragraph("<u>Risques Identifiés</u>", styles["section"]),
+        Paragraph("Intervention sur du matériel ou des infrastructures :", styles["subsection"]),
+        checkboxes(RISQUES_MATERIEL, "risques_materiel"),
+        field("Autre (préciser)", "risques_materiel_autre"),
+        Paragraph("Travaux nécessitant une autorisation particulière :", styles["subsection"]),
+        checkboxes(RISQUES_AUTORISATION, "risques_autorisation"),
+        Paragraph("Produits dangereux :", styles["subsection"]),
+        checkboxes(RISQUES_PRODUITS, "risques_produits"),
+        Paragraph("Environnement des travaux nécessitant une attention particulière :", styles["subsection"]),
+        checkboxes(RISQUES_ENVIRONNEMENT, "risques_environnement"),
+        field("Autre (préciser)", "risques_environnement_autre"),
+
+        Paragraph("<u>Précautions à Prendre</u>", styles["section"]),
+        Paragraph("Sur le matériel ou les infrastructures :", styles["subsection"]),
+        checkboxes(PRECAUTIONS_MATERIEL, "precautions_materiel"),
+        field("Autre (préciser)", "precautions_materiel_autre"),
+        Spacer(1, 2 * mm),
+        _boxed(Paragraph(escape(NOTE_CHARIOT), styles["note"]), width, background="#fff8dc", border=None, left_border="#ffa500"),
+        Paragraph("Sur les hommes, le matériel ou l'environnement :", styles["subsection"]),
+        checkboxes(PRECAUTIONS_EPI, "precautions_epi"),
+        field("Autre (préciser)", "precautions_epi_autre"),
+        Paragraph("Sur l'environnement des travaux :", styles["subsection"]),
+        checkboxes(PRECAUTIONS_ENVIRONNEMENT, "precautions_environnement"),
+        field("Autre (préciser)", "precautions_environnement_autre"),
+
+        Spacer(1, 5 * mm),
+        _boxed(
+            [Paragraph("<u>Engagement</u>", styles["section"]), Paragraph(escape(ENGAGEMENT), styles["intro"])],
+            width, background="#f9f9f9", border_width=2
+        ),
+        Spacer(1, 5 * mm),
+    ]
+
+    signatures = Table(
+        [
+            [Paragraph("<b>Date</b>", styles["center"]),
+             Paragraph("<b>Nom et visa du demandeur</b>", styles["center"]),
+             Paragraph("<b>Nom et visa du représentant de l'intervenant</b>", styles["center"])],
+            [Paragraph(_text(str(bon.get("date_engagement") or "")[:10]), styles["center"]),
+             Paragraph(_text(bon.get("nom_agent_maitrise")), styles["center"]),
+             Paragraph(_text(bon.get("nom_representant")), styles["center"])],
+        ],
+        colWidths=[width / 3] * 3,
+        rowHeights=[None, 25 * mm]
+    )
+    signatures.setStyle(TableStyle([
+        ("GRID", (0, 0), (-1, -1), 2, colors.black),
+        ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#d0d0d0")),
+        ("VALIGN", (0, 0), (-1, 0), "MIDDLE"),
+        ("VALIGN", (0, 1), (-1, 1), "TOP"),
+    ]))
+    story += [signatures, Paragraph(escape(PIED_DE_PAGE), styles["footer"])]
+    return story
+
+
+def _autorisation_story(autorisation: dict, styles: dict) -> list:
+    """Éléments de l'autorisation particulière - Format MAINT_FE_003_V03"""
+    from reportlab.lib import colors
+    from reportlab.lib.units import mm
+    from reportlab.platypus import Paragraph, Spacer, Table, TableStyle
+
+    width = 186 * mm
+    grey = colors.HexColor("#e0e0e0")
+    base = styles["base"]
+
+    def text(key, source=autorisation):
+        return _text(source.get(key))
+
+    def th(label):
+        return Paragraph(f"<b>{label}</b>", base)
+
+    def table(rows, col_widths, header_cells=(), row_heights=None, extra=()):
+        t = Table(rows, colWidths=col_widths, rowHeights=row_heights)
+        commands = [
+            ("GRID", (0, 0), (-1, -1), 1, colors.black), ("VALIGN", (0, 0), (-1, -1), "TOP"),
+            ("TOPPADDING", (0, 0), (-1, -1), 2), ("BOTTOMPADDING", (0, 0), (-1, -1), 2),
+        ]
+        commands += [("BACKGROUND", start, end, grey) for start, end in header_cells]
+        t.setStyle(TableStyle(commands + list(extra)))
+        return t
+
+    def section(title):
+        return _boxed(Paragraph(title, styles["banner"]), width, background="#c0c0c0", padding=3)
+
+    def precisions(key):
+        value = text(key)
+        return [table([[Paragraph(f"<b>Précisions:</b> {value}", base)]], [width])] if value else []
+
+    date_etablissement = text("date_etablissement")
+    numero = text("numero")
+
+    logo = Table([[Paragraph("LOGO", styles["center"])]], colWidths=[30 * mm], rowHeights=[13 * mm])
+    logo.setStyle(TableStyle([
+        ("BOX", (0, 0), (-1, -1), 1, colors.HexColor("#cccccc")),
+        ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+        ("TEXTCOLOR", (0, 0), (-1, -1), colors.HexColor("#666666")),
+    ]))
+    header = Table(
+        [[logo, Paragraph(
+            f"<b>Référence :</b> MAINT_FE_003<br/><b>Révision :</b> V03<br/><b>Date :</b> {date_etablissement}",
+            styles["header_right"]
+        )]],
+        colWidths=[width / 2, width / 2]
+    )
+    header.setStyle(TableStyle([
+        ("VALIGN", (0, 0), (-1, -1), "TOP"),
+        ("LINEBELOW", (0, 0), (-1, 0), 2, colors.black),
+        ("LEFTPADDING", (0, 0), (-1, -1), 0), ("RIGHTPADDING", (0, 0), (-1, -1), 0),
+        ("BOTTOMPADDING", (0, 0), (-1, -1), 6),
+    ]))
+
+    references = Table(
+        [[Paragraph(f"<b>N° D'AUTORISATION : {numero}</b>", base),
+          Paragraph(f"<b>DATE D'ÉTABLISSEMENT : {date_etablissement}</b>", styles["header_right"])]],
+        colWidths=[width / 2, width / 2]
+    )
+    references.setStyle(TableStyle([
+        ("BOX", (0, 0), (-1, -1), 2, colors.black),
+        ("BACKGROUND", (0, 0), (-1, -1), colors.HexColor("#f0f0f0")),
+    ]))
+
+    personnel = autorisation.get("personnel_autorise") or []
+    personnel_rows = [[th("N°"), th("NOM ET PRÉNOM"), th("FONCTION")]]
+    for i in range(4):
+        person = personnel[i] if i < len(personnel) else {}
+        personnel_rows.append([
+            Paragraph(str(i + 1), styles["center"]),
+            Paragraph(text("nom", person), base),
+            Paragraph(text("fonction", person), base)
+        ])
+
+    def check_cell(key, label):
+        cell = Table([[_checkbox(bool(autorisation.get(key))), Paragraph(label, base)]], colWidths=[6 * mm, None])
+        cell.setStyle(TableStyle([
+            ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+            ("LEFTPADDING", (0, 0), (-1, -1), 0), ("TOPPADDING", (0, 0), (-1, -1), 0), ("BOTTOMPADDING", (0, 0), (-1, -1), 0),
+        ]))
+        return cell
+
+    def mesure(key):
+        value = autorisation.get(key)
+        if value == "FAIT":
+            return Paragraph('<font color="green"><b>FAIT</b></font>', styles["center"])
+        if value == "A_FAIRE":
+            return Paragraph('<font color="orange"><b>À FAIRE</b></font>', styles["center"])
+        return Paragraph('<font color="gray">-</font>', styles["center"])
+
+    half = (len(MESURES_SECURITE) + 1) // 2
+    mesures_rows = []
+    for i in range(half):
+        row = []
+        for label, key in (MESURES_SECURITE[i], MESURES_SECURITE[i + half] if i + half < len(MESURES_SECURITE) else (None, None)):
+            row += [Paragraph(label, base), mesure(key)] if label else ["", ""]
+        mesures_rows.append(row)
+
+    epi_rows = [
+        [check_cell(key, label) for key, label in EPI[i:i + 3]] + [""] * (3 - len(EPI[i:i + 3]))
+        for i in range(0, len(EPI), 3)
+    ]
+
+    risques = text("risques_potentiels")
+
+    def signature(title, name_key, date_key):
+        return [
+            Paragraph(f"<b>{title}</b>", styles["bold_center"]),
+            Spacer(1, 2 * mm),
+            Paragraph(f"<b>Nom :</b> {text(name_key)}", base),
+            Spacer(1, 8 * mm),
+            Paragraph(f"Date : {text(date_key)}", base),
+        ]
+
+    signatures = Table(
+        [[signature("DEMANDEUR", "signature_demandeur", "date_signature_demandeur"), "",
+          signature("RESPONSABLE SÉCURITÉ", "signature_responsable_securite", "date_signature_responsable")]],
+        colWidths=[width * 0.48, width * 0.04, width * 0.48]
+    )
+    signatures.setStyle(TableStyle([
+        ("BOX", (0, 0), (0, 0), 1, colors.black),
+        ("BOX", (2, 0), (2, 0), 1, colors.black),
+        ("VALIGN", (0, 0), (-1, -1), "TOP"),
+    ]))
+
+    return [
+        header,
+        Paragraph("AUTORISATION PARTICULIÈRE DE TRAVAUX", styles["h1"]),
+        references,
+        Spacer(1, 3 * mm),
+        table(
+            [[th("SERVICE DEMANDEUR"), Paragraph(text("service_demandeur"), base)],
+             [th("RESPONSABLE"), Paragraph(text("responsable"), base)]],
+            [width * 0.3, width * 0.7], header_cells=[((0, 0), (0, -1))]
+        ),
+        section("PERSONNEL AUTORISÉ"),
+        table(personnel_rows, [width * 0.08, width * 0.46, width * 0.46], header_cells=[((0, 0), (-1, 0))]),
+        section("TYPE DE TRAVAUX"),
+        table(
+            [[check_cell("type_point_chaud", "Par point chaud"), check_cell("type_fouille", "De fouille")],
+             [check_cell("type_espace_clos", "En espace clos ou confiné"), check_cell("type_autre_cas", "Autre cas")]],
+            [width / 2, width / 2]
+        ),
+        *precisions("description_travaux"),
+        Spacer(1, 2 * mm),
+        table(
+            [[th("HORAIRE DÉBUT"), Paragraph(text("horaire_debut"), base),
+              th("HORAIRE FIN"), Paragraph(text("horaire_fin"), base)],
+             [th("LIEU DES TRAVAUX"), Paragraph(text("lieu_travaux"), base), "", ""]],
+            [width / 4] * 4,
+            header_cells=[((0, 0), (0, -1)), ((2, 0), (2, 0))],
+            extra=[("SPAN", (1, 1), (3, 1))]
+        ),
+        section("RISQUES POTENTIELS"),
+        table([[Paragraph(risques, base)]], [width], row_heights=None if risques else [12 * mm]),
+        section("MESURES DE SÉCURITÉ"),
+        table(mesures_rows, [width * 0.35, width * 0.15] * 2, extra=[("VALIGN", (0, 0), (-1, -1), "MIDDLE")]),
+        *precisions("mesures_securite_texte"),
+        section("ÉQUIPEMENTS DE PROTECTION INDIVIDUELLE (EPI)"),
+        table(epi_rows, [width / 3] * 3),
+        *precisions("equipements_protection_texte"),
+        Spacer(1, 4 * mm),
+        signatures,
+    ]
+
+
+def _build_pdf(target: str, title: str, stories: List[list], margins: tuple):
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import mm
+    from reportlab.platypus import SimpleDocTemplate, PageBreak
+
+    vertical, horizontal = margins
+    doc = SimpleDocTemplate(
+        target,
+        pagesize=A4,
+        topMargin=vertical * mm,
+        bottomMargin=vertical * mm,
+        leftMargin=horizontal * mm,
+        rightMargin=horizontal * mm,
+        title=title,
+        author="GMAO Iris"
+    )
+    flowables = []
+    for i, story in enumerate(stories):
+        if i:
+            flowables.append(PageBreak())
+        flowables += story
+    doc.build(flowables)
+
+
+def _write_pdf(target: str, title: str, stories: List[list], margins: tuple):
+    # Fichier temporaire renommé une fois complet : jamais de PDF tronqué dans le cache
+    partial = f"{target}.part"
+    _build_pdf(partial, title, stories, margins)
+    os.replace(partial, target)
+
+
+def render_bons_pdf(bons: List[dict], target: str):
+    """Écrit le PDF d'un ou plusieurs bons de travail (un bon par page), dans un processus du pool"""
+    styles = _styles()
+    _write_pdf(target, "Bon de travail - MAINT_FE_004_V02", [_bon_story(bon, styles) for bon in bons], (20, 15))
+
+
+def render_autorisations_pdf(autorisations: List[dict], target: str):
+    """Écrit le PDF d'une ou plusieurs autorisations particulières, dans un processus du pool"""
+    styles = _styles()
+    _write_pdf(
+        target, "Autorisation particulière - MAINT_FE_003_V03",
+        [_autorisation_story(autorisation, styles) for autorisation in autorisations], (10, 12)
+    )
+
+
+# ==================== Cache ====================
+
+class DocumentPdfCache:
+    """PDF rendus, conservés sur disque par document et version"""
+
+    def __init__(self):
+        # Rendus en cours : une seule conversion par fichier même si plusieurs demandes
+        self._pending = {}
+
+    @staticmethod
+    def path(name: str, version) -> Path:
+        version_hash = hashlib.sha1(repr(version).encode()).hexdigest()[:16]
+        return PDF_CACHE_DIR / f"{name}--{version_hash}.pdf"
+
+    async def get(self, name: str, version, render: Callable[[List[dict], str], None], documents: List[dict]) -> Path:
+        """
+        PDF d'un document, rendu si cette version n'est pas encore en cache
+
+        Args:
+            name: Identifiant stable du document (ex: "bon-<id>")
+            version: Version du contenu (updated_at, liste de versions pour un lot...)
+            render: Fonction de rendu (render_bons_pdf, render_autorisations_pdf)
+            documents: Documents à rendre, un par page
+        """
+        path = self.path(name, version)
+        if await aiofiles.os.path.exists(path):
+            return path
+
+        task = self._pending.get(path)
+        if task is None:
+            task = asyncio.create_task(self._render(name, path, render, documents))
+            self._pending[path] = task
+            task.add_done_callback(lambda _: self._pending.pop(path, None))
+        await asyncio.shield(task)
+        return path
+
+    async def _render(self, name: str, path: Path, render, documents: List[dict]):
+        await aiofiles.os.makedirs(PDF_CACHE_DIR, exist_ok=True)
+        await worker_pool.run_in_process(render, documents, str(path))
+
+        # Supprimer les versions précédentes du même document
+        for entry in await aiofiles.os.listdir(PDF_CACHE_DIR):
+            if entry.startswith(f"{name}--") and entry != path.name:
+                try:
+                    await aiofiles.os.remove(PDF_CACHE_DIR / entry)
+                except FileNotFoundError:
+                    pass
+        logger.info(f"📄 PDF généré: {path.name}")
+
+    async def invalidate(self, name: str):
+        """Supprime les PDF d'un document (document supprimé)"""
+        if not await aiofiles.os.path.exists(PDF_CACHE_DIR):
+            return
+        for entry in await aiofiles.os.listdir(PDF_CACHE_DIR):
+            if entry.startswith(f"{name}--"):
+                try:
+                    await aiofiles.os.remove(PDF_CACHE_DIR / entry)
+                except FileNotFoundError:
+                    pass
+
+
+# Instance partagée
+document_pdf_cache = DocumentPdfCache()
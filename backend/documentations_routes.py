@@ -1,16 +1,14 @@
 """
 Routes API pour le module Documentations - Pôles de Service et Documents
 """
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Request
 from fastapi.responses import HTMLResponse
-from fastapi.responses import StreamingResponse
 from typing import List, Optional
 from datetime import datetime, timezone
 from pathlib import Path
-import uuid
+import asyncio
 import logging
 import mimetypes
-from io import BytesIO
 
 from models import (
     PoleDeService,
@@ -30,6 +28,9 @@ from dependencies import get_current_user, get_current_admin_user, get_current_u
 from audit_service import AuditService
 from auth import decode_access_token
 from bon_travail_template_final import generate_bon_travail_html
+from file_responder import send_file
+from blob_store import blob_store, STORAGE_BLOB
+from document_pdf import document_pdf_cache, merge_html_documents, render_bons_pdf
 import os
 
 logger = logging.getLogger(__name__)
@@ -39,42 +40,95 @@ router = APIRouter(prefix="/documentations", tags=["documentations"])
 # Variables globales (injectées depuis server.py)
 db = None
 audit_service = None
+counter_service = None
 
-def init_documentations_routes(database, audit_svc):
-    """Initialise les routes avec la connexion DB et audit service"""
-    global db, audit_service
+def init_documentations_routes(database, audit_svc, counter_svc):
+    """Initialise les routes avec la connexion DB, audit service et le service des numéros"""
+    global db, audit_service, counter_service
     db = database
     audit_service = audit_svc
+    counter_service = counter_svc
 
 
 # ==================== PÔLES DE SERVICE ====================
 
+# Champs des documents et bons affichés dans l'arborescence des pôles
+# (les formulaires et le détail des bons sont chargés à l'ouverture)
+DOCUMENT_SUMMARY_PROJECTION = {
+    "_id": 0, "id": 1, "pole_id": 1, "titre": 1, "type_document": 1, "fichier_url": 1,
+    "fichier_nom": 1, "fichier_type": 1, "fichier_taille": 1, "version": 1, "statut": 1,
+    "tags": 1, "created_at": 1, "updated_at": 1
+}
+BON_SUMMARY_PROJECTION = {
+    "_id": 0, "id": 1, "pole_id": 1, "numero": 1, "titre": 1, "entreprise": 1,
+    "created_at": 1, "updated_at": 1, "created_by": 1
+}
+
+# Contenu de la liste des pôles
+POLES_INCLUDE_FULL = "full"      # documents et bons (résumés) de chaque pôle
+POLES_INCLUDE_COUNTS = "counts"  # nombres de documents et de bons seulement
+POLES_INCLUDE_NONE = "none"      # pôles seuls (contenu chargé par GET /poles/{pole_id})
+
+
+async def count_by_pole(collection, pole_ids: List[str]) -> dict:
+    """Nombre de documents par pôle, en une agrégation"""
+    counts = await collection.aggregate([
+        {"$match": {"pole_id": {"$in": pole_ids}}},
+        {"$group": {"_id": "$pole_id", "count": {"$sum": 1}}}
+    ]).to_list(length=None)
+    return {entry["_id"]: entry["count"] for entry in counts}
+
+
+async def group_by_pole(collection, pole_ids: List[str], projection: dict) -> dict:
+    """Documents des pôles regroupés par pôle, en une requête"""
+    grouped = {pole_id: [] for pole_id in pole_ids}
+    async for item in collection.find({"pole_id": {"$in": pole_ids}}, projection):
+        grouped[item["pole_id"]].append(item)
+    return grouped
+
+
 @router.get("/poles", response_model=List[dict])
-async def get_poles(current_user: dict = Depends(get_current_user)):
-    """Récupérer tous les pôles de service avec leurs documents et bons de travail"""
+async def get_poles(
+    include: str = POLES_INCLUDE_FULL,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Récupérer tous les pôles de service avec leurs documents et bons de travail
+
+    Deux requêtes au total quel que soit le nombre de pôles (une par collection).
+
+    Args:
+        include: "full" (résumés des documents et bons), "counts" (nombres seulement)
+                 ou "none" (pôles seuls, contenu chargé à l'ouverture d'un pôle)
+    """
+    if include not in (POLES_INCLUDE_FULL, POLES_INCLUDE_COUNTS, POLES_INCLUDE_NONE):
+        raise HTTPException(status_code=400, detail="include doit valoir full, counts ou none")
     try:
-        poles = await db.poles_service.find().to_list(length=None)
+        poles = await db.poles_service.find({}, {"_id": 0}).to_list(length=None)
+        if include == POLES_INCLUDE_NONE or not poles:
+            return poles
+        
+        pole_ids = [pole["id"] for pole in poles]
         
-        # Pour chaque pôle, récupérer les documents et bons associés
+        if include == POLES_INCLUDE_COUNTS:
+            documents_counts, bons_counts = await asyncio.gather(
+                count_by_pole(db.documents, pole_ids),
+                count_by_pole(db.bons_travail, pole_ids)
+            )
+            for pole in poles:
+                pole["documents_count"] = documents_counts.get(pole["id"], 0)
+                pole["bons_travail_count"] = bons_counts.get(pole["id"], 0)
+            return poles
+        
+        documents, bons_travail = await asyncio.gather(
+            group_by_pole(db.documents, pole_ids, DOCUMENT_SUMMARY_PROJECTION),
+            group_by_pole(db.bons_travail, pole_ids, BON_SUMMARY_PROJECTION)
+        )
         for pole in poles:
-            if "_id" in pole:
-                del pole["_id"]
-            
-            # Récupérer les documents associés
-            documents = await db.documents.find({"pole_id": pole["id"]}).to_list(length=None)
-            for doc in documents:
-                if "_id" in doc:
-                    del doc["_id"]
-            
-            # Récupérer les bons de travail associés
-            bons_travail = await db.bons_travail.find({"pole_id": pole["id"]}).to_list(length=None)
-            for bon in bons_travail:
-                if "_id" in bon:
-                    del bon["_id"]
-            
-            # Ajouter les documents et bons au pôle
-            pole["documents"] = documents
-            pole["bons_travail"] = bons_travail
+            pole["documents"] = documents[pole["id"]]
+            pole["bons_travail"] = bons_travail[pole["id"]]
+            pole["documents_count"] = len(pole["documents"])
+            pole["bons_travail_count"] = len(pole["bons_travail"])
         
         return poles
     except Exception as e:
@@ -390,7 +444,9 @@ async def delete_document(
             raise HTTPException(status_code=404, detail="Document non trouvé")
         
         # Supprimer le fichier physique si c'est une pièce jointe
-        if doc.get("fichier_url"):
+        if doc.get("fichier_stockage") == STORAGE_BLOB:
+            await blob_store.release(doc.get("fichier_sha256"))
+        elif doc.get("fichier_url"):
             try:
                 file_path = Path(f"/app{doc['fichier_url']}")
                 if file_path.exists():
@@ -424,53 +480,50 @@ async def delete_document(
 @router.post("/documents/{document_id}/upload")
 async def upload_document_file(
     document_id: str,
-    file: UploadFile = File(...),
+    file: UploadFile = File(None),
+    upload_id: Optional[str] = None,
     current_user: dict = Depends(get_current_user)
 ):
-    """Upload un fichier pour un document"""
+    """Upload un fichier pour un document (multipart, ou upload_id pour les gros fichiers envoyés par morceaux)"""
     try:
         doc = await db.documents.find_one({"id": document_id})
         if not doc:
             raise HTTPException(status_code=404, detail="Document non trouvé")
         
-        # Créer le répertoire uploads/documents si nécessaire
-        upload_dir = Path("uploads/documents")
-        upload_dir.mkdir(parents=True, exist_ok=True)
-        
-        # Générer un nom de fichier unique
-        file_ext = Path(file.filename).suffix
-        unique_filename = f"{document_id}_{uuid.uuid4()}{file_ext}"
-        file_path = upload_dir / unique_filename
-        
-        # Sauvegarder le fichier
-        content = await file.read()
-        with open(file_path, "wb") as f:
-            f.write(content)
+        # Sauvegarder le fichier dans le stockage par empreinte (dédupliqué)
+        stored = await blob_store.store_upload(file, upload_id, current_user.get("id"))
+        original_filename = stored["original_filename"]
         
         # Déterminer le type MIME
-        mime_type, _ = mimetypes.guess_type(file.filename)
+        mime_type, _ = mimetypes.guess_type(original_filename)
         
         # Mettre à jour le document avec les infos du fichier
-        file_url = f"/uploads/documents/{unique_filename}"
+        file_url = f"/api/documentations/documents/{document_id}/view"
         await db.documents.update_one(
             {"id": document_id},
             {
                 "$set": {
                     "fichier_url": file_url,
-                    "fichier_nom": file.filename,
+                    "fichier_nom": original_filename,
                     "fichier_type": mime_type or "application/octet-stream",
-                    "fichier_taille": len(content),
+                    "fichier_taille": stored["size"],
+                    "fichier_sha256": stored["sha256"],
+                    "fichier_stockage": stored["storage"],
                     "updated_at": datetime.now(timezone.utc).isoformat(),
                     "updated_by": current_user.get("id")
                 }
             }
         )
         
+        # Le fichier remplacé perd sa référence
+        if doc.get("fichier_stockage") == STORAGE_BLOB:
+            await blob_store.release(doc.get("fichier_sha256"))
+        
         return {
             "success": True,
             "file_url": file_url,
-            "file_name": file.filename,
-            "file_size": len(content),
+            "file_name": original_filename,
+            "file_size": stored["size"],
             "file_type": mime_type
         }
     except HTTPException:
@@ -483,6 +536,7 @@ async def upload_document_file(
 @router.get("/documents/{document_id}/view")
 async def view_document_file(
     document_id: str,
+    request: Request,
     token: str = None,
     current_user: dict = Depends(get_current_user_optional)
 ):
@@ -504,23 +558,26 @@ async def view_document_file(
         if not doc.get("fichier_url"):
             raise HTTPException(status_code=404, detail="Aucun fichier associé")
         
+        # Utiliser inline pour permettre la visualisation dans le navigateur
+        if doc.get("fichier_stockage") == STORAGE_BLOB:
+            return await blob_store.response(
+                request,
+                doc["fichier_sha256"],
+                doc.get("fichier_nom", "document"),
+                doc.get("fichier_type", "application/octet-stream"),
+                inline=True
+            )
+        
         # Le fichier_url commence par /uploads/documents/
         # Le fichier réel est dans /app/backend/uploads/documents/
         file_path = Path(f"/app/backend{doc['fichier_url']}")
-        if not file_path.exists():
-            raise HTTPException(status_code=404, detail="Fichier non trouvé sur le serveur")
-        
-        # Lire le fichier
-        with open(file_path, "rb") as f:
-            content = f.read()
         
-        # Utiliser inline pour permettre la visualisation dans le navigateur
-        return StreamingResponse(
-            BytesIO(content),
-            media_type=doc.get("fichier_type", "application/octet-stream"),
-            headers={
-                "Content-Disposition": f"inline; filename={doc.get('fichier_nom', 'document')}"
-            }
+        return await send_file(
+            request,
+            file_path,
+            doc.get("fichier_nom", "document"),
+            doc.get("fichier_type", "application/octet-stream"),
+            inline=True
         )
     except HTTPException:
         raise
@@ -531,6 +588,7 @@ async def view_document_file(
 @router.get("/documents/{document_id}/download")
 async def download_document_file(
     document_id: str,
+    request: Request,
     current_user: dict = Depends(get_current_user)
 ):
     """Télécharger le fichier d'un document (force le téléchargement)"""
@@ -542,22 +600,23 @@ async def download_document_file(
         if not doc.get("fichier_url"):
             raise HTTPException(status_code=404, detail="Aucun fichier associé")
         
+        if doc.get("fichier_stockage") == STORAGE_BLOB:
+            return await blob_store.response(
+                request,
+                doc["fichier_sha256"],
+                doc.get("fichier_nom", "document"),
+                doc.get("fichier_type", "application/octet-stream")
+            )
+        
         # Le fichier_url commence par /uploads/documents/
         # Le fichier réel est dans /app/backend/uploads/documents/
         file_path = Path(f"/app/backend{doc['fichier_url']}")
-        if not file_path.exists():
-            raise HTTPException(status_code=404, detail="Fichier non trouvé sur le serveur")
-        
-        # Lire le fichier
-        with open(file_path, "rb") as f:
-            content = f.read()
-        
-        return StreamingResponse(
-            BytesIO(content),
-            media_type=doc.get("fichier_type", "application/octet-stream"),
-            headers={
-                "Content-Disposition": f"attachment; filename={doc.get('fichier_nom', 'document')}"
-            }
+        
+        return await send_file(
+            request,
+            file_path,
+            doc.get("fichier_nom", "document"),
+            doc.get("fichier_type", "application/octet-stream")
         )
     except HTTPException:
         raise
@@ -625,6 +684,7 @@ async def create_bon_travail(
         )
         
         bon_dict = bon.model_dump()
+        bon_dict["numero"] = await counter_service.next_value("bons_travail")
         await db.bons_travail.insert_one(bon_dict)
         
         # Audit
@@ -698,6 +758,7 @@ async def delete_bon_travail(
             raise HTTPException(status_code=404, detail="Bon de travail non trouvé")
         
         await db.bons_travail.delete_one({"id": bon_id})
+        await document_pdf_cache.invalidate(f"bon-{bon_id}")
         
         return {"success": True, "message": "Bon de travail supprimé"}
     except HTTPException:
@@ -709,29 +770,49 @@ async def delete_bon_travail(
 
 # ==================== GÉNÉRATION PDF & EMAIL ====================
 
+def check_pdf_access(current_user: Optional[dict], token: Optional[str]):
+    """Les PDF s'ouvrent dans un nouvel onglet : authentification par token en paramètre"""
+    if not current_user and token:
+        payload = decode_access_token(token)
+        if payload is None:
+            raise HTTPException(status_code=401, detail="Token invalide ou expiré")
+    elif not current_user and not token:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+
+def bon_version(bon: dict) -> str:
+    """Version du bon pour le cache des PDF (modifié => nouveau rendu)"""
+    return str(bon.get("updated_at") or bon.get("created_at") or "")
+
+
 @router.get("/bons-travail/{bon_id}/pdf")
 async def generate_bon_pdf(
+    request: Request,
     bon_id: str,
     token: str = None,
+    format: Optional[str] = None,
     current_user: dict = Depends(get_current_user_optional)
 ):
-    """Générer un PDF (HTML) pour un bon de travail - Format MAINT_FE_004_V02"""
+    """
+    PDF d'un bon de travail - Format MAINT_FE_004_V02
+
+    Rendu une seule fois par version du bon puis servi depuis le cache disque.
+    Avec format=html, renvoie le HTML à imprimer par le navigateur.
+    """
     try:
-        # Vérifier l'authentification via token si nécessaire
-        if not current_user and token:
-            payload = decode_access_token(token)
-            if payload is None:
-                raise HTTPException(status_code=401, detail="Token invalide ou expiré")
-        elif not current_user and not token:
-            raise HTTPException(status_code=401, detail="Not authenticated")
+        check_pdf_access(current_user, token)
         
-        bon = await db.bons_travail.find_one({"id": bon_id})
+        bon = await db.bons_travail.find_one({"id": bon_id}, {"_id": 0})
         if not bon:
             raise HTTPException(status_code=404, detail="Bon de travail non trouvé")
         
-        # Générer le HTML avec le template MAINT_FE_004_V02
-        html_content = generate_bon_travail_html(bon)
-        return HTMLResponse(content=html_content)
+        if format == "html":
+            # Générer le HTML avec le template MAINT_FE_004_V02
+            return HTMLResponse(content=generate_bon_travail_html(bon))
+        
+        path = await document_pdf_cache.get(f"bon-{bon_id}", bon_version(bon), render_bons_pdf, [bon])
+        filename = f"bon_travail_{bon.get('numero') or bon_id}.pdf"
+        return await send_file(request, path, filename, "application/pdf", inline=True)
     except HTTPException:
         raise
     except Exception as e:
@@ -739,6 +820,45 @@ async def generate_bon_pdf(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/poles/{pole_id}/bons-travail/pdf")
+async def generate_pole_bons_pdf(
+    request: Request,
+    pole_id: str,
+    token: str = None,
+    format: Optional[str] = None,
+    current_user: dict = Depends(get_current_user_optional)
+):
+    """
+    Tous les bons de travail d'un pôle dans un seul document, un bon par page
+
+    Le lot est mis en cache selon les versions de ses bons : il n'est rendu à nouveau
+    que si un bon est ajouté, modifié ou supprimé.
+    """
+    try:
+        check_pdf_access(current_user, token)
+        
+        pole = await db.poles_service.find_one({"id": pole_id}, {"_id": 0, "nom": 1})
+        if not pole:
+            raise HTTPException(status_code=404, detail="Pôle non trouvé")
+        
+        bons = await db.bons_travail.find({"pole_id": pole_id}, {"_id": 0}).sort("created_at", 1).to_list(length=None)
+        if not bons:
+            raise HTTPException(status_code=404, detail="Aucun bon de travail pour ce pôle")
+        
+        if format == "html":
+            title = f"Bons de travail - {pole.get('nom', pole_id)}"
+            return HTMLResponse(content=merge_html_documents([generate_bon_travail_html(bon) for bon in bons], title))
+        
+        version = [(bon["id"], bon_version(bon)) for bon in bons]
+        path = await document_pdf_cache.get(f"pole-bons-{pole_id}", version, render_bons_pdf, bons)
+        return await send_file(request, path, f"bons_travail_{pole_id}.pdf", "application/pdf", inline=True)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Erreur génération PDF des bons du pôle {pole_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.post("/bons-travail/{bon_id}/email")
 async def send_bon_email(
     bon_id: str,
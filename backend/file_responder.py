@@ -0,0 +1,173 @@
+"""
+Envoi de fichiers stockés sur disque : requêtes Range, ETag / Last-Modified et réponses 304
+"""
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from typing import Optional, Tuple
+from urllib.parse import quote
+import logging
+
+import aiofiles
+import aiofiles.os
+from fastapi import HTTPException, Request
+from starlette.responses import FileResponse, Response
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 256 * 1024
+
+# Les fichiers sont privés (authentification) : le navigateur garde sa copie mais revalide
+# à chaque ouverture, ce qui ne coûte qu'une réponse 304 si le fichier n'a pas changé
+CACHE_CONTROL = "private, no-cache"
+
+
+def content_disposition(filename: str, inline: bool) -> str:
+    """En-tête Content-Disposition compatible avec les noms de fichiers accentués"""
+    disposition = "inline" if inline else "attachment"
+    ascii_name = filename.encode("ascii", "replace").decode("ascii").replace('"', "")
+    if ascii_name == filename:
+        return f'{disposition}; filename="{filename}"'
+    return f"{disposition}; filename=\"{ascii_name}\"; filename*=utf-8''{quote(filename)}"
+
+
+def _not_modified(request: Request, etag: str, mtime: float) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return etag in tags or "*" in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Plage demandée (début, fin incluse) ; None si l'en-tête est ignoré (plusieurs plages,
+    syntaxe invalide dont fin < début : réponse complète, RFC 9110) ; lève 416 si la
+    plage commence après la fin du fichier
+    """
+    unit, _, ranges = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in ranges:
+        return None
+
+    start_text, _, end_text = ranges.strip().partition("-")
+    try:
+        if start_text == "":
+            # Suffixe : les N derniers octets
+            length = int(end_text)
+            if length <= 0:
+                raise ValueError
+            start, end = max(size - length, 0), size - 1
+        else:
+            start = int(start_text)
+            end = int(end_text) if end_text else size - 1
+            if end_text and end < start:
+                raise ValueError
+    except ValueError:
+        return None
+
+    end = min(end, size - 1)
+    if start >= size:
+        raise HTTPException(
+            status_code=416,
+            detail="Plage demandée hors du fichier",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+    return start, end
+
+
+class FileRangeResponse(Response):
+    """Réponse 206 pour une plage d'octets, par sendfile si le serveur le permet"""
+
+    def __init__(self, path: Path, start: int, end: int, size: int, headers: dict, media_type: str):
+        super().__init__(status_code=206, headers=headers, media_type=media_type)
+        self.path = path
+        self.start = start
+        self.count = end - start + 1
+        self.headers["content-range"] = f"bytes {start}-{end}/{size}"
+        self.headers["content-length"] = str(self.count)
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope.get("method") == "HEAD":
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        async with aiofiles.open(self.path, "rb") as f:
+            if "http.response.zerocopysend" in scope.get("extensions", {}):
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": f.fileno(),
+                    "offset": self.start,
+                    "count": self.count,
+                    "more_body": False
+                })
+                return
+
+            await f.seek(self.start)
+            remaining = self.count
+            while remaining > 0:
+                chunk = await f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+async def send_file(
+    request: Request,
+    path,
+    filename: str,
+    media_type: Optional[str] = None,
+    inline: bool = False
+) -> Response:
+    """
+    Réponse pour un fichier sur disque
+
+    - ETag / Last-Modified, et 304 si la copie du navigateur est à jour
+    - Range (une seule plage) : 206 pour permettre la navigation dans les gros PDF
+      et vidéos sans tout télécharger ; If-Range respecté
+    - Fichier complet : FileResponse (envoi par blocs, sendfile si le serveur le permet)
+
+    Args:
+        request: Requête (en-têtes conditionnels et Range)
+        path: Chemin du fichier
+        filename: Nom proposé au navigateur
+        media_type: Type MIME
+        inline: Affichage dans le navigateur plutôt que téléchargement
+    """
+    path = Path(path)
+    try:
+        stat = await aiofiles.os.stat(path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Fichier non trouvé sur le serveur")
+
+    media_type = media_type or "application/octet-stream"
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+        "Cache-Control": CACHE_CONTROL,
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": content_disposition(filename, inline)
+    }
+
+    if _not_modified(request, etag, stat.st_mtime):
+        headers.pop("Content-Disposition")
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and stat.st_size > 0 and (if_range is None or if_range in (etag, headers["Last-Modified"])):
+        byte_range = _parse_range(range_header, stat.st_size)
+        if byte_range is not None:
+            return FileRangeResponse(path, byte_range[0], byte_range[1], stat.st_size, headers, media_type)
+
+    return FileResponse(path, media_type=media_type, headers=headers, stat_result=stat)
@@ -0,0 +1,292 @@
+"""Service des mouvements de stock de l'inventaire"""
+import asyncio
+import math
+import uuid
+from datetime import datetime, timedelta, timezone
+from html import escape
+from typing import Dict, List, Optional
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+import logging
+
+import email_service
+from dependencies import check_permission
+
+logger = logging.getLogger(__name__)
+
+# Types de mouvement enregistrés dans inventory_movements
+MOVEMENT_CONSUMPTION = "CONSOMMATION"
+MOVEMENT_ADJUSTMENT = "AJUSTEMENT"
+MOVEMENT_CREATION = "CREATION"
+
+# États de stock (champ calculé stock_state, indexé)
+STOCK_RUPTURE = "RUPTURE"
+STOCK_BAS = "BAS"
+STOCK_OK = "OK"
+LOW_STOCK_STATES = [STOCK_RUPTURE, STOCK_BAS]
+
+# Expression de mise à jour (pipeline) : l'état est calculé par MongoDB sur les
+# valeurs courantes du document, sans relecture côté application
+STOCK_STATE_UPDATE = [{"$set": {"stock_state": {"$switch": {
+    "branches": [
+        {"case": {"$lte": [{"$ifNull": ["$quantite", 0]}, 0]}, "then": STOCK_RUPTURE},
+        {"case": {"$lte": [{"$ifNull": ["$quantite", 0]}, {"$ifNull": ["$quantiteMin", 0]}]}, "then": STOCK_BAS}
+    ],
+    "default": STOCK_OK
+}}}}]
+
+# Période d'historique des pièces utilisées pour la vitesse de consommation (jours)
+VELOCITY_DAYS = 90
+# Couverture visée par une suggestion de réapprovisionnement (jours de consommation)
+REORDER_COVER_DAYS = 30
+
+
+class InventoryService:
+    """
+    Applique les mouvements de stock et les trace dans inventory_movements.
+
+    Les quantités sont modifiées par $inc (jamais lues puis réécrites), en un seul
+    bulk_write par soumission : deux consommations simultanées du même article ne
+    peuvent plus s'écraser. Chaque mouvement est ajouté au journal inventory_movements,
+    qui n'est jamais modifié ; le stock à une date donnée se déduit du stock actuel
+    moins les mouvements postérieurs.
+    """
+
+    def __init__(self, db: AsyncIOMotorDatabase):
+        self.db = db
+
+    async def ensure_indexes(self):
+        """Index du journal des mouvements et de l'état de stock"""
+        await self.db.inventory_movements.create_index([("inventory_id", 1), ("timestamp", -1)])
+        await self.db.inventory_movements.create_index("work_order_id")
+        await self.db.inventory.create_index("stock_state")
+        await self.db.work_orders.create_index("parts_used.inventory_item_id")
+        # Articles antérieurs au champ stock_state
+        await self.db.inventory.update_many({"stock_state": {"$exists": False}}, STOCK_STATE_UPDATE)
+
+    async def refresh_stock_state(self, item_ids: Optional[List[ObjectId]] = None):
+        """Recalcule stock_state des articles donnés (tous si None) après un mouvement"""
+        query = {"_id": {"$in": item_ids}} if item_ids is not None else {}
+        await self.db.inventory.update_many(query, STOCK_STATE_UPDATE)
+
+    def _movement(
+        self,
+        inventory_id: str,
+        inventory_nom: Optional[str],
+        movement_type: str,
+        quantite: float,
+        current_user: dict,
+        work_order: Optional[dict] = None,
+        timestamp: Optional[datetime] = None
+    ) -> dict:
+        return {
+            "id": str(uuid.uuid4()),
+            "inventory_id": inventory_id,
+            "inventory_nom": inventory_nom,
+            "type": movement_type,
+            "quantite": quantite,
+            "work_order_id": str(work_order["_id"]) if work_order else None,
+            "work_order_numero": work_order.get("numero") if work_order else None,
+            "user_id": current_user.get("id"),
+            "user_name": f"{current_user.get('prenom', '')} {current_user.get('nom', '')}".strip(),
+            "timestamp": timestamp or datetime.now(timezone.utc)
+        }
+
+    async def consume_parts(self, parts: List[dict], work_order: dict, current_user: dict) -> int:
+        """
+        Déduit du stock les pièces d'inventaire utilisées sur un ordre de travail
+
+        Args:
+            parts: Pièces utilisées (format parts_used : inventory_item_id, quantity)
+            work_order: Ordre de travail concerné
+            current_user: Utilisateur ayant saisi les pièces
+
+        Returns:
+            Nombre de pièces déduites du stock
+        """
+        stock_parts = [
+            part for part in parts
+            if part.get("inventory_item_id") and ObjectId.is_valid(part["inventory_item_id"])
+        ]
+        if not stock_parts:
+            return 0
+
+        # Une seule lecture pour écarter les articles supprimés et récupérer les noms
+        items = await self.db.inventory.find(
+            {"_id": {"$in": list({ObjectId(part["inventory_item_id"]) for part in stock_parts})}},
+            {"nom": 1}
+        ).to_list(length=None)
+        names = {str(item["_id"]): item.get("nom") for item in items}
+        stock_parts = [part for part in stock_parts if part["inventory_item_id"] in names]
+        if not stock_parts:
+            return 0
+
+        now = datetime.now(timezone.utc)
+        await self.db.inventory.bulk_write([
+            UpdateOne(
+                {"_id": ObjectId(part["inventory_item_id"])},
+                {"$inc": {"quantite": -part["quantity"]}, "$set": {"derniereModification": datetime.utcnow()}}
+            )
+            for part in stock_parts
+        ], ordered=False)
+        await self.refresh_stock_state(list({ObjectId(part["inventory_item_id"]) for part in stock_parts}))
+
+        await self.db.inventory_movements.insert_many([
+            self._movement(
+                part["inventory_item_id"],
+                names[part["inventory_item_id"]],
+                MOVEMENT_CONSUMPTION,
+                -part["quantity"],
+                current_user,
+                work_order=work_order,
+                timestamp=now
+            )
+            for part in stock_parts
+        ])
+
+        logger.info(f"Stock mis à jour: {len(stock_parts)} pièce(s) déduite(s) pour l'ordre {work_order.get('numero')}")
+        return len(stock_parts)
+
+    async def record_adjustment(
+        self,
+        item: dict,
+        previous_quantity: float,
+        current_user: dict,
+        movement_type: str = MOVEMENT_ADJUSTMENT
+    ):
+        """Trace une modification directe de quantité (création, correction manuelle)"""
+        delta = (item.get("quantite") or 0) - (previous_quantity or 0)
+        if delta == 0:
+            return
+        await self.db.inventory_movements.insert_one(
+            self._movement(str(item["_id"]), item.get("nom"), movement_type, delta, current_user)
+        )
+
+    async def get_movements(self, inventory_id: str, limit: int = 100) -> List[dict]:
+        """Derniers mouvements d'un article (du plus récent au plus ancien)"""
+        movements = await self.db.inventory_movements.find(
+            {"inventory_id": inventory_id},
+            {"_id": 0}
+        ).sort("timestamp", -1).limit(limit).to_list(length=limit)
+        return movements
+
+    async def stock_at(self, item: dict, date: datetime) -> float:
+        """Stock d'un article à une date : stock actuel moins les mouvements postérieurs"""
+        result = await self.db.inventory_movements.aggregate([
+            {"$match": {"inventory_id": str(item["_id"]), "timestamp": {"$gt": date}}},
+            {"$group": {"_id": None, "total": {"$sum": "$quantite"}}}
+        ]).to_list(length=1)
+        later = result[0]["total"] if result else 0
+        return (item.get("quantite") or 0) - later
+
+    async def count_by_state(self) -> Dict[str, int]:
+        """Nombre d'articles en rupture et en niveau bas (index stock_state)"""
+        result = await self.db.inventory.aggregate([
+            {"$match": {"stock_state": {"$in": LOW_STOCK_STATES}}},
+            {"$group": {"_id": "$stock_state", "count": {"$sum": 1}}}
+        ]).to_list(length=None)
+        counts = {entry["_id"]: entry["count"] for entry in result}
+        return {
+            "rupture": counts.get(STOCK_RUPTURE, 0),
+            "niveau_bas": counts.get(STOCK_BAS, 0)
+        }
+
+    async def consumption_velocity(self, item_ids: List[str], days: int = VELOCITY_DAYS) -> Dict[str, float]:
+        """Consommation moyenne par jour de chaque article sur les pièces utilisées des ordres de travail"""
+        if not item_ids:
+            return {}
+        since = datetime.now(timezone.utc) - timedelta(days=days)
+        result = await self.db.work_orders.aggregate([
+            {"$match": {"parts_used.inventory_item_id": {"$in": item_ids}}},
+            {"$unwind": "$parts_used"},
+            {"$match": {
+                "parts_used.inventory_item_id": {"$in": item_ids},
+                "parts_used.timestamp": {"$gte": since}
+            }},
+            {"$group": {"_id": "$parts_used.inventory_item_id", "total": {"$sum": "$parts_used.quantity"}}}
+        ]).to_list(length=None)
+        return {entry["_id"]: (entry["total"] or 0) / days for entry in result}
+
+    async def get_low_stock(self) -> List[dict]:
+        """
+        Articles en rupture ou en niveau bas avec une suggestion de réapprovisionnement
+
+        La quantité suggérée remonte le stock au minimum plus REORDER_COVER_DAYS jours
+        de consommation moyenne (VELOCITY_DAYS derniers jours de pièces utilisées).
+        """
+        items = await self.db.inventory.find(
+            {"stock_state": {"$in": LOW_STOCK_STATES}}
+        ).sort([("stock_state", -1), ("nom", 1)]).to_list(length=None)
+
+        velocities = await self.consumption_velocity([str(item["_id"]) for item in items])
+
+        low_stock = []
+        for item in items:
+            item_id = str(item["_id"])
+            quantite = item.get("quantite") or 0
+            quantite_min = item.get("quantiteMin") or 0
+            velocity = velocities.get(item_id, 0)
+            target = quantite_min + math.ceil(velocity * REORDER_COVER_DAYS)
+            low_stock.append({
+                "id": item_id,
+                "nom": item.get("nom"),
+                "reference": item.get("reference"),
+                "fournisseur": item.get("fournisseur"),
+                "emplacement": item.get("emplacement"),
+                "quantite": quantite,
+                "quantiteMin": quantite_min,
+                "stock_state": item.get("stock_state"),
+                "consommation_jour": round(velocity, 3),
+                "jours_restants": round(max(quantite, 0) / velocity, 1) if velocity > 0 else None,
+                "quantite_suggeree": max(target - quantite, 0)
+            })
+        return low_stock
+
+    async def send_low_stock_digest(self):
+        """Tâche planifiée : envoie le récapitulatif des stocks bas aux gestionnaires de l'inventaire"""
+        try:
+            low_stock = await self.get_low_stock()
+            if not low_stock:
+                logger.info("📦 Aucun article en stock bas, pas de récapitulatif envoyé")
+                return
+
+            users = await self.db.users.find(
+                {"statut": "actif", "email": {"$ne": None}},
+                {"email": 1, "role": 1, "permissions": 1}
+            ).to_list(length=None)
+            recipients = [user["email"] for user in users if check_permission(user, "inventory", "edit")]
+            if not recipients:
+                return
+
+            rows = "".join(
+                f"<tr><td>{escape(str(item['nom'] or ''))}</td><td>{escape(str(item['reference'] or ''))}</td>"
+                f"<td style='text-align:right'>{item['quantite']}</td>"
+                f"<td style='text-align:right'>{item['quantiteMin']}</td>"
+                f"<td style='text-align:right'><strong>{item['quantite_suggeree']}</strong></td>"
+                f"<td>{escape(str(item['fournisseur'] or ''))}</td></tr>"
+                for item in low_stock
+            )
+            ruptures = sum(1 for item in low_stock if item["stock_state"] == STOCK_RUPTURE)
+            subject = f"Stock bas : {len(low_stock)} article(s) dont {ruptures} en rupture"
+            html_content = f"""
+            <html><body style="font-family: Arial, sans-serif;">
+                <h2>Récapitulatif des stocks bas</h2>
+                <p>{len(low_stock)} article(s) sont au niveau minimum ou en dessous, dont {ruptures} en rupture.</p>
+                <table border="1" cellpadding="6" cellspacing="0" style="border-collapse: collapse;">
+                    <tr><th>Article</th><th>Référence</th><th>Stock</th><th>Minimum</th><th>À commander</th><th>Fournisseur</th></tr>
+                    {rows}
+                </table>
+            </body></html>
+            """
+            text_content = "\n".join(
+                f"- {item['nom']} : stock {item['quantite']} / min {item['quantiteMin']}, à commander {item['quantite_suggeree']}"
+                for item in low_stock
+            )
+
+            # send_email est bloquant (smtplib) : envoi hors de la boucle d'événements
+            for email in recipients:
+                await asyncio.to_thread(email_service.send_email, email, subject, html_content, text_content)
+            logger.info(f"📦 Récapitulatif stock bas envoyé à {len(recipients)} destinataire(s)")
+        except Exception as e:
+            logger.error(f"❌ Erreur lors de l'envoi du récapitulatif stock bas: {str(e)}")
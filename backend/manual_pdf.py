@@ -0,0 +1,208 @@
+"""
+Rendu PDF du manuel utilisateur (ReportLab)
+
+render_manual_pdf est exécuté dans le pool de processus partagé : la construction du
+document prend plusieurs secondes et ne doit pas bloquer la boucle d'événements.
+"""
+import os
+import re
+from datetime import datetime, timezone
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def clean_text_for_pdf(text: str) -> str:
+    """Nettoie et formate le texte d'une section pour un paragraphe ReportLab"""
+    # Échapper les caractères spéciaux XML/HTML
+    text = text.replace('&', '&amp;')
+    text = text.replace('<', '&lt;')
+    text = text.replace('>', '&gt;')
+    
+    # Supprimer les emojis et caractères Unicode problématiques
+    text = re.sub(r'[^\x00-\x7F]+', '', text)  # Supprimer Unicode non-ASCII
+    
+    # Convertir markdown gras (** texte **)
+    # Utiliser regex pour remplacer par paires
+    parts = text.split('**')
+    result = []
+    for i, part in enumerate(parts):
+        if i % 2 == 0:
+            result.append(part)  # Texte normal
+        else:
+            result.append(f'<b>{part}</b>')  # Texte en gras
+    
+    return ''.join(result)
+
+
+def render_manual_pdf(manual_content: dict, target: str):
+    """
+    Écrit le PDF du manuel dans target (fichier temporaire renommé une fois complet)
+    
+    Args:
+        manual_content: Contenu filtré du manuel (version, chapters, sections)
+        target: Chemin du fichier PDF
+    """
+    partial = f"{target}.part"
+    _build_pdf(manual_content, partial)
+    os.replace(partial, target)
+
+
+def _build_pdf(manual_content: dict, target: str):
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.units import cm
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak, Table, TableStyle
+    from reportlab.lib.enums import TA_LEFT, TA_CENTER, TA_JUSTIFY
+    from reportlab.lib import colors
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+
+    # Créer le document PDF
+    doc = SimpleDocTemplate(
+        target,
+        pagesize=A4,
+        rightMargin=2*cm,
+        leftMargin=2*cm,
+        topMargin=2*cm,
+        bottomMargin=2*cm,
+        title="Manuel Utilisateur GMAO Iris",
+        author="GMAO Iris"
+    )
+
+    # Styles
+    styles = getSampleStyleSheet()
+
+    # Style pour le titre principal
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=24,
+        textColor=colors.HexColor('#1e40af'),
+        spaceAfter=30,
+        alignment=TA_CENTER,
+        fontName='Helvetica-Bold'
+    )
+
+    # Style pour les chapitres
+    chapter_style = ParagraphStyle(
+        'ChapterTitle',
+        parent=styles['Heading1'],
+        fontSize=18,
+        textColor=colors.HexColor('#1e40af'),
+        spaceAfter=12,
+        spaceBefore=12,
+        fontName='Helvetica-Bold'
+    )
+
+    # Style pour les sections
+    section_style = ParagraphStyle(
+        'SectionTitle',
+        parent=styles['Heading2'],
+        fontSize=14,
+        textColor=colors.HexColor('#2563eb'),
+        spaceAfter=8,
+        spaceBefore=10,
+        fontName='Helvetica-Bold'
+    )
+
+    # Style pour le contenu
+    content_style = ParagraphStyle(
+        'ContentText',
+        parent=styles['BodyText'],
+        fontSize=10,
+        leading=14,
+        alignment=TA_JUSTIFY,
+        spaceAfter=6,
+        fontName='Helvetica'
+    )
+
+    # Construire le contenu du PDF
+    story = []
+
+    # Page de garde
+    story.append(Spacer(1, 3*cm))
+    story.append(Paragraph("Manuel Utilisateur", title_style))
+    story.append(Paragraph("GMAO Iris", title_style))
+    story.append(Spacer(1, 1*cm))
+    story.append(Paragraph(f"Version {manual_content['version']}", styles['Normal']))
+    story.append(Paragraph(f"Généré le {datetime.now(timezone.utc).strftime('%d/%m/%Y à %H:%M')}", styles['Normal']))
+    story.append(PageBreak())
+
+    # Table des matières
+    story.append(Paragraph("Table des Matières", chapter_style))
+    story.append(Spacer(1, 0.5*cm))
+
+    for chapter in manual_content['chapters']:
+        chapter_sections = [s for s in manual_content['sections'] if s['id'] in chapter.get('sections', [])]
+        if chapter_sections:
+            story.append(Paragraph(f"<b>{chapter['title']}</b>", styles['Normal']))
+            for section in chapter_sections:
+                level_badge = ""
+                if section.get('level') == 'beginner':
+                    level_badge = " 🎓"
+                elif section.get('level') == 'advanced':
+                    level_badge = " ⚡"
+                story.append(Paragraph(f"  • {section['title']}{level_badge}", styles['Normal']))
+            story.append(Spacer(1, 0.3*cm))
+
+    story.append(PageBreak())
+
+    # Contenu de chaque chapitre et section
+    for chapter in manual_content['chapters']:
+        # Titre du chapitre
+        story.append(Paragraph(chapter['title'], chapter_style))
+        story.append(Paragraph(chapter.get('description', ''), styles['Italic']))
+        story.append(Spacer(1, 0.5*cm))
+
+        # Sections du chapitre
+        chapter_sections = [s for s in manual_content['sections'] if s['id'] in chapter.get('sections', [])]
+
+        for section in chapter_sections:
+            # Titre de section avec badge niveau
+            section_title = section['title']
+            if section.get('level') == 'beginner':
+                section_title += " 🎓 Débutant"
+            elif section.get('level') == 'advanced':
+                section_title += " ⚡ Avancé"
+
+            story.append(Paragraph(section_title, section_style))
+
+            # Contenu de la section (formatage simple)
+            content = section.get('content', '')
+
+            # Diviser en paragraphes
+            paragraphs = content.split('\n\n')
+            for para in paragraphs:
+                if para.strip():
+                    # Traiter les listes à puces
+                    if para.strip().startswith('•') or para.strip().startswith('-'):
+                        lines = para.split('\n')
+                        for line in lines:
+                            if line.strip():
+                                cleaned_line = clean_text_for_pdf(line.strip())
+                                try:
+                                    story.append(Paragraph(cleaned_line, content_style))
+                                except Exception as e:
+                                    # En cas d'erreur, ajouter le texte brut
+                                    logger.warning(f"Erreur formatage ligne: {str(e)}")
+                                    story.append(Paragraph(line.strip().replace('&', '&amp;'), content_style))
+                    else:
+                        # Paragraphe normal
+                        cleaned_para = clean_text_for_pdf(para.strip())
+                        try:
+                            story.append(Paragraph(cleaned_para, content_style))
+                        except Exception as e:
+                            # En cas d'erreur, ajouter le texte brut
+                            logger.warning(f"Erreur formatage paragraphe: {str(e)}")
+                            story.append(Paragraph(para.strip().replace('&', '&amp;'), content_style))
+
+                    story.append(Spacer(1, 0.2*cm))
+
+            story.append(Spacer(1, 0.5*cm))
+
+        # Saut de page entre chapitres
+        story.append(PageBreak())
+
+    # Générer le PDF
+    doc.build(story)
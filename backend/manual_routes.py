@@ -1,13 +1,26 @@
 """
 Routes pour le manuel utilisateur
 """
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 from typing import Optional, List
 from dependencies import get_current_user, get_current_admin_user, require_permission
 from models import ManualCreate, ManualSearchRequest
+from manual_search import manual_search_index
 from datetime import datetime, timezone
+from pathlib import Path
+import asyncio
+import hashlib
 import uuid
 import logging
+from collections import OrderedDict
+
+import aiofiles.os
+
+import worker_pool
+from file_responder import send_file
+from manual_pdf import render_manual_pdf
 
 # Logger
 logger = logging.getLogger(__name__)
@@ -19,30 +32,83 @@ router = APIRouter()
 from server import db
 
 
-@router.get("/manual/content")
-async def get_manual_content(
+def manual_revision(current_version: dict) -> tuple:
+    """Identifie l'état du manuel : version courante et nombre de modifications depuis"""
+    return current_version.get("id"), current_version.get("revision", 0)
+
+
+async def bump_manual_revision():
+    """À appeler après chaque modification du manuel (invalide index et caches)"""
+    await db.manual_versions.update_one({"is_current": True}, {"$inc": {"revision": 1}})
+    schedule_manual_pdf_prebuild()
+
+
+def section_visible(
+    section: dict,
+    user_role: str,
     role_filter: Optional[str] = None,
     module_filter: Optional[str] = None,
-    level_filter: Optional[str] = None,
-    current_user: dict = Depends(get_current_user)
-):
-    """Récupérer le contenu du manuel filtré selon le rôle et les préférences"""
-    try:
-        # Récupérer la version actuelle
-        current_version = await db.manual_versions.find_one({"is_current": True})
-        if not current_version:
-            # Créer le contenu par défaut si aucun manuel n'existe
-            return await initialize_default_manual(current_user)
-        
+    level_filter: Optional[str] = None
+) -> bool:
+    """Indique si une section est visible pour le rôle de l'utilisateur et les filtres demandés"""
+    if section.get("target_roles") and user_role not in section["target_roles"]:
+        return False
+    if role_filter and role_filter not in section.get("target_roles", []):
+        return False
+    if module_filter and module_filter not in section.get("target_modules", []):
+        return False
+    if level_filter and section.get("level") != level_filter and section.get("level") != "both":
+        return False
+    return True
+
+
+# Manuel assemblé par (révision, rôle, filtres) : le manuel ne change que sur action d'un admin
+_content_cache = {"revision": None, "chapters": [], "sections": [], "views": OrderedDict()}
+
+# Les filtres viennent de la query string : nombre de vues gardées borné (les moins
+# récemment utilisées sont oubliées)
+MANUAL_VIEWS_CACHE_SIZE = 64
+
+# Niveaux de lecture des sections
+MANUAL_LEVELS = ("beginner", "advanced", "both")
+
+
+async def load_manual_content(
+    current_user: dict,
+    role_filter: Optional[str] = None,
+    module_filter: Optional[str] = None,
+    level_filter: Optional[str] = None
+) -> dict:
+    """Contenu du manuel filtré selon le rôle et les préférences (mis en cache par révision)"""
+    # Récupérer la version actuelle
+    current_version = await db.manual_versions.find_one({"is_current": True})
+    if not current_version:
+        # Créer le contenu par défaut si aucun manuel n'existe
+        return await initialize_default_manual(current_user)
+    
+    revision = manual_revision(current_version)
+    if _content_cache["revision"] != revision:
         # Récupérer tous les chapitres et sections
         chapters = await db.manual_chapters.find({}).sort("order", 1).to_list(None)
         sections = await db.manual_sections.find({}).sort("order", 1).to_list(None)
         
-        # Filtrer selon le rôle de l'utilisateur
-        user_role = current_user.get("role", "")
-        
+        # Garder l'ID original (ch-001, sec-001-01) et non l'ID MongoDB
+        for item in chapters + sections:
+            if "id" not in item or not item["id"]:
+                item["id"] = str(item.get("_id"))
+            item.pop("_id", None)
+        
+        _content_cache.update(revision=revision, chapters=chapters, sections=sections, views=OrderedDict())
+    
+    user_role = current_user.get("role", "")
+    key = (user_role, role_filter, module_filter, level_filter)
+    views = _content_cache["views"]
+    content = views.get(key)
+    if content is not None:
+        views.move_to_end(key)
+    else:
         filtered_chapters = []
-        for chapter in chapters:
+        for chapter in _content_cache["chapters"]:
             # Si le chapitre a des rôles cibles et l'utilisateur n'est pas dans la liste, skip
             if chapter.get("target_roles") and user_role not in chapter["target_roles"]:
                 continue
@@ -52,53 +118,53 @@ async def get_manual_content(
                 continue
             if module_filter and module_filter not in chapter.get("target_modules", []):
                 continue
-            
-            # Garder l'ID original (ch-001) et non l'ID MongoDB
-            if "id" not in chapter or not chapter["id"]:
-                chapter["id"] = str(chapter.get("_id"))
-            if "_id" in chapter:
-                del chapter["_id"]
             filtered_chapters.append(chapter)
         
-        filtered_sections = []
-        for section in sections:
-            # Filtrer selon les rôles
-            if section.get("target_roles") and user_role not in section["target_roles"]:
-                continue
-            
-            # Appliquer les filtres
-            if role_filter and role_filter not in section.get("target_roles", []):
-                continue
-            if module_filter and module_filter not in section.get("target_modules", []):
-                continue
-            if level_filter and section.get("level") != level_filter and section.get("level") != "both":
-                continue
-            
-            # Garder l'ID original (sec-001-01) et non l'ID MongoDB
-            if "id" not in section or not section["id"]:
-                section["id"] = str(section.get("_id"))
-            if "_id" in section:
-                del section["_id"]
-            filtered_sections.append(section)
+        filtered_sections = [
+            section for section in _content_cache["sections"]
+            if section_visible(section, user_role, role_filter, module_filter, level_filter)
+        ]
         
         # Filtrer les chapitres qui n'ont plus de sections après filtrage
         section_ids = {s["id"] for s in filtered_sections}
-        final_chapters = []
-        for chapter in filtered_chapters:
-            # Vérifier si le chapitre a au moins une section visible
-            chapter_has_sections = any(
-                sec_id in section_ids 
-                for sec_id in chapter.get("sections", [])
-            )
-            if chapter_has_sections:
-                final_chapters.append(chapter)
+        final_chapters = [
+            chapter for chapter in filtered_chapters
+            if any(sec_id in section_ids for sec_id in chapter.get("sections", []))
+        ]
         
-        return {
+        content = {
             "version": current_version.get("version"),
             "chapters": final_chapters,
             "sections": filtered_sections,
             "last_updated": current_version.get("release_date")
         }
+        views[key] = content
+        if len(views) > MANUAL_VIEWS_CACHE_SIZE:
+            views.popitem(last=False)
+    
+    return content
+
+
+@router.get("/manual/content")
+async def get_manual_content(
+    request: Request,
+    role_filter: Optional[str] = None,
+    module_filter: Optional[str] = None,
+    level_filter: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Récupérer le contenu du manuel filtré selon le rôle et les préférences (ETag / 304)"""
+    try:
+        content = await load_manual_content(current_user, role_filter, module_filter, level_filter)
+        
+        # ETag : révision du manuel et vue demandée
+        view = (_content_cache["revision"], current_user.get("role", ""), role_filter, module_filter, level_filter)
+        etag = '"' + hashlib.sha1(repr(view).encode()).hexdigest() + '"'
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=headers)
+        
+        return JSONResponse(content=jsonable_encoder(content), headers=headers)
         
     except Exception as e:
         logger.error(f"Erreur lors de la récupération du manuel: {str(e)}")
@@ -110,59 +176,36 @@ async def search_manual(
     search_request: ManualSearchRequest,
     current_user: dict = Depends(get_current_user)
 ):
-    """Rechercher dans le manuel"""
+    """Rechercher dans le manuel (index plein texte reconstruit quand le manuel change)"""
     try:
-        query = search_request.query.lower()
-        
-        # Recherche dans les sections
-        sections = await db.manual_sections.find({}).to_list(None)
-        
-        results = []
-        for section in sections:
-            # Calculer le score de pertinence
-            score = 0.0
-            title_lower = section.get("title", "").lower()
-            content_lower = section.get("content", "").lower()
-            keywords = [k.lower() for k in section.get("keywords", [])]
-            
-            # Score basé sur le titre (poids 3)
-            if query in title_lower:
-                score += 3.0
-            
-            # Score basé sur les mots-clés (poids 2)
-            if any(query in kw for kw in keywords):
-                score += 2.0
-            
-            # Score basé sur le contenu (poids 1)
-            if query in content_lower:
-                score += 1.0
-            
-            if score > 0:
-                # Extraire un extrait pertinent
-                content = section.get("content", "")
-                excerpt_start = max(0, content_lower.find(query) - 50)
-                excerpt = content[excerpt_start:excerpt_start + 200]
-                
-                # Trouver le chapitre parent
-                chapter_id = None
-                chapters = await db.manual_chapters.find({}).to_list(None)
-                for chapter in chapters:
-                    if section.get("id") in chapter.get("sections", []):
-                        chapter_id = str(chapter.get("_id", chapter.get("id")))
-                        break
-                
-                results.append({
-                    "section_id": str(section.get("_id", section.get("id"))),
-                    "chapter_id": chapter_id,
-                    "title": section.get("title"),
-                    "excerpt": excerpt,
-                    "relevance_score": score
-                })
-        
-        # Trier par score
-        results.sort(key=lambda x: x["relevance_score"], reverse=True)
-        
-        return {"results": results[:10]}  # Top 10 résultats
+        current_version = await db.manual_versions.find_one({"is_current": True})
+        if not current_version:
+            return {"results": []}
+        
+        revision = manual_revision(current_version)
+        if manual_search_index.revision != revision:
+            chapters = await db.manual_chapters.find({}, {"_id": 0, "id": 1, "sections": 1}).to_list(None)
+            sections = await db.manual_sections.find({}).to_list(None)
+            for section in sections:
+                section["id"] = section.get("id") or str(section.pop("_id"))
+                section.pop("_id", None)
+            manual_search_index.build(sections, chapters, revision)
+            logger.info(f"📚 Index de recherche du manuel reconstruit ({len(sections)} sections)")
+        
+        user_role = current_user.get("role", "")
+        results = manual_search_index.search(
+            search_request.query,
+            lambda section: section_visible(
+                section,
+                user_role,
+                search_request.role_filter,
+                search_request.module_filter,
+                search_request.level_filter
+            ),
+            limit=10
+        )
+        
+        return {"results": results}  # Top 10 résultats
         
     except Exception as e:
         logger.error(f"Erreur lors de la recherche: {str(e)}")
@@ -205,6 +248,10 @@ async def create_or_update_manual(
         for section in manual_data.sections:
             await db.manual_sections.insert_one(section.model_dump())
         
+        # Révision changée une fois les chapitres et sections en place (une lecture faite
+        # pendant le remplacement ne reste pas en cache)
+        await bump_manual_revision()
+        
         logger.info(f"📚 Manuel mis à jour vers version {manual_data.version} par {current_user['email']}")
         
         return {"success": True, "message": f"Manuel mis à jour vers version {manual_data.version}"}
@@ -362,220 +409,96 @@ Cliquez sur un badge pour voir les détails.""",
 
 
 
+# PDF du manuel mis en cache sur disque par (révision, rôle, niveau)
+MANUAL_PDF_DIR = Path(__file__).parent / "cache" / "manual_pdf"
+
+# Délai avant la régénération des PDF après une modification (les modifications d'un
+# admin arrivent souvent en rafale)
+PDF_PREBUILD_DELAY = 30  # secondes
+
+# Constructions en cours (une seule par fichier même si plusieurs utilisateurs téléchargent)
+_pdf_builds = {}
+
+# Vues (rôle, niveau) déjà demandées : régénérées à l'avance quand le manuel change
+_pdf_views = set()
+_pdf_prebuild = None
+
+
+def _manual_pdf_path(revision, user_role: str, level_filter: Optional[str]) -> Path:
+    revision_hash = hashlib.sha1(repr(revision).encode()).hexdigest()[:16]
+    view_hash = hashlib.sha1(repr((user_role, level_filter)).encode()).hexdigest()[:16]
+    return MANUAL_PDF_DIR / f"{revision_hash}-{view_hash}.pdf"
+
+
+async def _build_manual_pdf(content: dict, path: Path):
+    await aiofiles.os.makedirs(MANUAL_PDF_DIR, exist_ok=True)
+    await worker_pool.run_in_process(render_manual_pdf, content, str(path))
+    
+    # Supprimer les PDF des révisions précédentes
+    revision_hash = path.name.split("-")[0]
+    for name in await aiofiles.os.listdir(MANUAL_PDF_DIR):
+        if not name.startswith(revision_hash):
+            try:
+                await aiofiles.os.remove(MANUAL_PDF_DIR / name)
+            except FileNotFoundError:
+                pass
+    logger.info(f"📄 PDF du manuel généré: {path.name}")
+
+
+async def get_manual_pdf(current_user: dict, level_filter: Optional[str] = None) -> Path:
+    """Chemin du PDF du manuel pour le rôle de l'utilisateur, construit si besoin"""
+    content = await load_manual_content(current_user, level_filter=level_filter)
+    user_role = current_user.get("role", "")
+    _pdf_views.add((user_role, level_filter))
+    
+    path = _manual_pdf_path(_content_cache["revision"], user_role, level_filter)
+    if await aiofiles.os.path.exists(path):
+        return path
+    
+    task = _pdf_builds.get(path)
+    if task is None:
+        task = asyncio.create_task(_build_manual_pdf(content, path))
+        _pdf_builds[path] = task
+        task.add_done_callback(lambda _: _pdf_builds.pop(path, None))
+    await asyncio.shield(task)
+    return path
+
+
+async def _prebuild_manual_pdfs():
+    await asyncio.sleep(PDF_PREBUILD_DELAY)
+    for user_role, level_filter in list(_pdf_views):
+        try:
+            await get_manual_pdf({"role": user_role}, level_filter)
+        except Exception as e:
+            logger.error(f"❌ Erreur lors de la génération du PDF du manuel: {str(e)}")
+
+
+def schedule_manual_pdf_prebuild():
+    """Relance la génération des PDF déjà demandés, après PDF_PREBUILD_DELAY sans autre modification"""
+    global _pdf_prebuild
+    if _pdf_prebuild is not None and not _pdf_prebuild.done():
+        _pdf_prebuild.cancel()
+    if _pdf_views:
+        _pdf_prebuild = asyncio.create_task(_prebuild_manual_pdfs())
+
+
 @router.get("/manual/export-pdf")
 async def export_manual_pdf(
+    request: Request,
     level_filter: Optional[str] = None,
     current_user: dict = Depends(get_current_user)
 ):
-    """Exporter le manuel en PDF"""
+    """Exporter le manuel en PDF (généré dans le pool de processus et mis en cache par révision)"""
+    # Chaque niveau produit un PDF gardé sur disque et régénéré à chaque modification
+    if level_filter and level_filter not in MANUAL_LEVELS:
+        raise HTTPException(status_code=400, detail="Niveau invalide")
     try:
-        from reportlab.lib.pagesizes import A4
-        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-        from reportlab.lib.units import cm
-        from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak, Table, TableStyle
-        from reportlab.lib.enums import TA_LEFT, TA_CENTER, TA_JUSTIFY
-        from reportlab.lib import colors
-        from reportlab.pdfbase import pdfmetrics
-        from reportlab.pdfbase.ttfonts import TTFont
-        from io import BytesIO
-        from fastapi.responses import StreamingResponse
-        
-        # Récupérer le contenu du manuel
-        manual_content = await get_manual_content(
-            role_filter=None,
-            module_filter=None,
-            level_filter=level_filter,
-            current_user=current_user
-        )
-        
-        # Créer le buffer PDF en mémoire
-        buffer = BytesIO()
-        
-        # Créer le document PDF
-        doc = SimpleDocTemplate(
-            buffer,
-            pagesize=A4,
-            rightMargin=2*cm,
-            leftMargin=2*cm,
-            topMargin=2*cm,
-            bottomMargin=2*cm,
-            title="Manuel Utilisateur GMAO Iris",
-            author="GMAO Iris"
-        )
-        
-        # Styles
-        styles = getSampleStyleSheet()
-        
-        # Style pour le titre principal
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=24,
-            textColor=colors.HexColor('#1e40af'),
-            spaceAfter=30,
-            alignment=TA_CENTER,
-            fontName='Helvetica-Bold'
-        )
-        
-        # Style pour les chapitres
-        chapter_style = ParagraphStyle(
-            'ChapterTitle',
-            parent=styles['Heading1'],
-            fontSize=18,
-            textColor=colors.HexColor('#1e40af'),
-            spaceAfter=12,
-            spaceBefore=12,
-            fontName='Helvetica-Bold'
-        )
-        
-        # Style pour les sections
-        section_style = ParagraphStyle(
-            'SectionTitle',
-            parent=styles['Heading2'],
-            fontSize=14,
-            textColor=colors.HexColor('#2563eb'),
-            spaceAfter=8,
-            spaceBefore=10,
-            fontName='Helvetica-Bold'
-        )
-        
-        # Style pour le contenu
-        content_style = ParagraphStyle(
-            'ContentText',
-            parent=styles['BodyText'],
-            fontSize=10,
-            leading=14,
-            alignment=TA_JUSTIFY,
-            spaceAfter=6,
-            fontName='Helvetica'
-        )
-        
-        # Construire le contenu du PDF
-        story = []
-        
-        # Page de garde
-        story.append(Spacer(1, 3*cm))
-        story.append(Paragraph("Manuel Utilisateur", title_style))
-        story.append(Paragraph("GMAO Iris", title_style))
-        story.append(Spacer(1, 1*cm))
-        story.append(Paragraph(f"Version {manual_content['version']}", styles['Normal']))
-        story.append(Paragraph(f"Généré le {datetime.now(timezone.utc).strftime('%d/%m/%Y à %H:%M')}", styles['Normal']))
-        story.append(PageBreak())
-        
-        # Table des matières
-        story.append(Paragraph("Table des Matières", chapter_style))
-        story.append(Spacer(1, 0.5*cm))
-        
-        for chapter in manual_content['chapters']:
-            chapter_sections = [s for s in manual_content['sections'] if s['id'] in chapter.get('sections', [])]
-            if chapter_sections:
-                story.append(Paragraph(f"<b>{chapter['title']}</b>", styles['Normal']))
-                for section in chapter_sections:
-                    level_badge = ""
-                    if section.get('level') == 'beginner':
-                        level_badge = " 🎓"
-                    elif section.get('level') == 'advanced':
-                        level_badge = " ⚡"
-                    story.append(Paragraph(f"  • {section['title']}{level_badge}", styles['Normal']))
-                story.append(Spacer(1, 0.3*cm))
-        
-        story.append(PageBreak())
-        
-        # Contenu de chaque chapitre et section
-        for chapter in manual_content['chapters']:
-            # Titre du chapitre
-            story.append(Paragraph(chapter['title'], chapter_style))
-            story.append(Paragraph(chapter.get('description', ''), styles['Italic']))
-            story.append(Spacer(1, 0.5*cm))
-            
-            # Sections du chapitre
-            chapter_sections = [s for s in manual_content['sections'] if s['id'] in chapter.get('sections', [])]
-            
-            for section in chapter_sections:
-                # Titre de section avec badge niveau
-                section_title = section['title']
-                if section.get('level') == 'beginner':
-                    section_title += " 🎓 Débutant"
-                elif section.get('level') == 'advanced':
-                    section_title += " ⚡ Avancé"
-                
-                story.append(Paragraph(section_title, section_style))
-                
-                # Contenu de la section (formatage simple)
-                content = section.get('content', '')
-                
-                # Fonction pour nettoyer et formater le texte pour PDF
-                def clean_text_for_pdf(text):
-                    # Échapper les caractères spéciaux XML/HTML
-                    text = text.replace('&', '&amp;')
-                    text = text.replace('<', '&lt;')
-                    text = text.replace('>', '&gt;')
-                    
-                    # Supprimer les emojis et caractères Unicode problématiques
-                    import re
-                    text = re.sub(r'[^\x00-\x7F]+', '', text)  # Supprimer Unicode non-ASCII
-                    
-                    # Convertir markdown gras (** texte **)
-                    # Utiliser regex pour remplacer par paires
-                    parts = text.split('**')
-                    result = []
-                    for i, part in enumerate(parts):
-                        if i % 2 == 0:
-                            result.append(part)  # Texte normal
-                        else:
-                            result.append(f'<b>{part}</b>')  # Texte en gras
-                    
-                    return ''.join(result)
-                
-                # Diviser en paragraphes
-                paragraphs = content.split('\n\n')
-                for para in paragraphs:
-                    if para.strip():
-                        # Traiter les listes à puces
-                        if para.strip().startswith('•') or para.strip().startswith('-'):
-                            lines = para.split('\n')
-                            for line in lines:
-                                if line.strip():
-                                    cleaned_line = clean_text_for_pdf(line.strip())
-                                    try:
-                                        story.append(Paragraph(cleaned_line, content_style))
-                                    except Exception as e:
-                                        # En cas d'erreur, ajouter le texte brut
-                                        logger.warning(f"Erreur formatage ligne: {str(e)}")
-                                        story.append(Paragraph(line.strip().replace('&', '&amp;'), content_style))
-                        else:
-                            # Paragraphe normal
-                            cleaned_para = clean_text_for_pdf(para.strip())
-                            try:
-                                story.append(Paragraph(cleaned_para, content_style))
-                            except Exception as e:
-                                # En cas d'erreur, ajouter le texte brut
-                                logger.warning(f"Erreur formatage paragraphe: {str(e)}")
-                                story.append(Paragraph(para.strip().replace('&', '&amp;'), content_style))
-                        
-                        story.append(Spacer(1, 0.2*cm))
-                
-                story.append(Spacer(1, 0.5*cm))
-            
-            # Saut de page entre chapitres
-            story.append(PageBreak())
-        
-        # Générer le PDF
-        doc.build(story)
-        
-        # Préparer la réponse
-        buffer.seek(0)
-        
+        path = await get_manual_pdf(current_user, level_filter)
         filename = f"manuel_gmao_iris_{datetime.now(timezone.utc).strftime('%Y%m%d')}.pdf"
+        return await send_file(request, path, filename, "application/pdf")
         
-        return StreamingResponse(
-            buffer,
-            media_type="application/pdf",
-            headers={
-                "Content-Disposition": f"attachment; filename={filename}"
-            }
-        )
-        
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Erreur lors de l'export PDF: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Erreur lors de la génération du PDF: {str(e)}")
@@ -634,6 +557,7 @@ async def update_manual_section(
             "details": update_data
         })
         
+        await bump_manual_revision()
         logger.info(f"Section {section_id} mise à jour par {current_user.get('email')}")
         
         return {"message": "Section mise à jour avec succès", "section_id": section_id}
@@ -709,6 +633,7 @@ async def create_manual_section(
             "details": {"chapter_id": chapter_id, "title": title}
         })
         
+        await bump_manual_revision()
         logger.info(f"Section {section_id} créée par {current_user.get('email')}")
         
         return {"message": "Section créée avec succès", "section_id": section_id, "section": section}
@@ -758,6 +683,7 @@ async def delete_manual_section(
             "details": {"title": section.get("title")}
         })
         
+        await bump_manual_revision()
         logger.info(f"Section {section_id} supprimée par {current_user.get('email')}")
         
         return {"message": "Section supprimée avec succès"}
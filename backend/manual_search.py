@@ -0,0 +1,189 @@
+"""
+Index de recherche plein texte du manuel utilisateur
+
+Index inversé en mémoire, reconstruit quand le manuel change (révision du manuel) :
+- normalisation (minuscules, accents supprimés) et racinisation légère du français,
+  pour que « équipements » trouve « equipement » ;
+- classement BM25, le titre et les mots-clés pesant plus que le contenu ;
+- extrait du contenu autour des termes trouvés, avec mise en évidence.
+"""
+import bisect
+import html
+import math
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from typing import Callable, Dict, List, Tuple
+
+TOKEN_REGEX = re.compile(r"\w+", re.UNICODE)
+
+# Poids des champs dans la fréquence des termes d'une section
+FIELD_WEIGHTS = {"title": 3.0, "keywords": 2.0, "content": 1.0}
+
+# Paramètres BM25
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+EXCERPT_LENGTH = 200
+
+STOPWORDS = {
+    "a", "au", "aux", "avec", "ce", "ces", "dans", "de", "des", "du", "en", "et", "il", "la",
+    "le", "les", "leur", "lui", "ma", "mais", "me", "mes", "mon", "ne", "ni", "nos", "notre",
+    "nous", "on", "ou", "par", "pas", "pour", "qu", "que", "qui", "sa", "se", "ses", "son",
+    "sur", "ta", "te", "tes", "ton", "tu", "un", "une", "vos", "votre", "vous", "l", "d", "s",
+    "c", "j", "m", "n", "t", "y", "est", "sont"
+}
+
+# Suffixes retirés par la racinisation (du plus long au plus court)
+SUFFIXES = (
+    "issements", "issement", "ements", "ement", "ations", "ation", "ateurs", "ateur",
+    "atrices", "atrice", "ances", "ance", "ences", "ence", "ites", "ite", "euses", "euse",
+    "ments", "ment", "ives", "ive", "ifs", "if", "eaux", "eau", "aux", "al", "es", "er",
+    "ee", "e", "s", "x"
+)
+
+# Longueur minimale conservée après suppression d'un suffixe
+MIN_STEM = 3
+
+
+def fold(text: str) -> str:
+    """Minuscules sans accents"""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def stem(word: str) -> str:
+    """Racinisation légère du français (pluriels, féminins et suffixes courants)"""
+    for suffix in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= MIN_STEM:
+            return word[:-len(suffix)]
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    """Termes indexés d'un texte"""
+    return [stem(token) for token in TOKEN_REGEX.findall(fold(text)) if token not in STOPWORDS]
+
+
+def _excerpt(content: str, terms: set) -> Tuple[str, str]:
+    """Extrait autour du premier terme trouvé (texte brut et version HTML avec <mark>)"""
+    matches = [
+        m for m in TOKEN_REGEX.finditer(content)
+        if stem(fold(m.group())) in terms
+    ]
+    start = max(0, matches[0].start() - 50) if matches else 0
+    end = start + EXCERPT_LENGTH
+    excerpt = content[start:end]
+
+    parts = []
+    position = start
+    for m in matches:
+        if m.start() < start:
+            continue
+        if m.end() > end:
+            break
+        parts.append(html.escape(content[position:m.start()]))
+        parts.append(f"<mark>{html.escape(m.group())}</mark>")
+        position = m.end()
+    parts.append(html.escape(content[position:end]))
+    return excerpt, "".join(parts)
+
+
+class ManualSearchIndex:
+    """Index inversé des sections du manuel"""
+
+    def __init__(self):
+        self.revision = None
+        self.sections: Dict[str, dict] = {}
+        self.section_chapter: Dict[str, str] = {}
+        self.postings: Dict[str, Dict[str, float]] = {}
+        self.vocabulary: List[str] = []
+        self.lengths: Dict[str, float] = {}
+        self.average_length = 0.0
+
+    def build(self, sections: List[dict], chapters: List[dict], revision):
+        """(Re)construit l'index pour une révision du manuel"""
+        postings = defaultdict(dict)
+        lengths = {}
+        for section in sections:
+            frequencies = Counter()
+            for field, weight in FIELD_WEIGHTS.items():
+                value = section.get(field) or ""
+                if isinstance(value, list):
+                    value = " ".join(value)
+                for term in tokenize(value):
+                    frequencies[term] += weight
+            for term, frequency in frequencies.items():
+                postings[term][section["id"]] = frequency
+            lengths[section["id"]] = sum(frequencies.values())
+
+        self.sections = {section["id"]: section for section in sections}
+        self.section_chapter = {
+            section_id: chapter["id"]
+            for chapter in chapters
+            for section_id in chapter.get("sections", [])
+        }
+        self.postings = dict(postings)
+        self.vocabulary = sorted(postings)
+        self.lengths = lengths
+        self.average_length = (sum(lengths.values()) / len(lengths)) if lengths else 0.0
+        self.revision = revision
+
+    def _expand(self, term: str) -> List[str]:
+        """Termes de l'index commençant par term (dernier mot en cours de saisie)"""
+        start = bisect.bisect_left(self.vocabulary, term)
+        expanded = []
+        for candidate in self.vocabulary[start:]:
+            if not candidate.startswith(term):
+                break
+            expanded.append(candidate)
+        return expanded
+
+    def search(self, query: str, visible: Callable[[dict], bool], limit: int = 10) -> List[dict]:
+        """
+        Sections correspondant à la requête, par pertinence décroissante
+
+        Args:
+            query: Texte recherché
+            visible: Filtre des sections accessibles (rôle, module, niveau)
+            limit: Nombre maximal de résultats
+        """
+        terms = tokenize(query)
+        if not terms or not self.sections:
+            return []
+
+        # Le dernier mot peut être incomplet : on l'étend aux termes qui le prolongent
+        query_terms = set(terms[:-1]) | set(self._expand(terms[-1]) or [terms[-1]])
+
+        count = len(self.sections)
+        scores = defaultdict(float)
+        for term in query_terms:
+            documents = self.postings.get(term)
+            if not documents:
+                continue
+            idf = math.log(1 + (count - len(documents) + 0.5) / (len(documents) + 0.5))
+            for section_id, frequency in documents.items():
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[section_id] / (self.average_length or 1))
+                scores[section_id] += idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+
+        results = []
+        for section_id, score in sorted(scores.items(), key=lambda item: item[1], reverse=True):
+            section = self.sections[section_id]
+            if not visible(section):
+                continue
+            excerpt, excerpt_html = _excerpt(section.get("content", ""), query_terms)
+            results.append({
+                "section_id": section_id,
+                "chapter_id": self.section_chapter.get(section_id),
+                "title": section.get("title"),
+                "excerpt": excerpt,
+                "excerpt_html": excerpt_html,
+                "relevance_score": round(score, 4)
+            })
+            if len(results) >= limit:
+                break
+        return results
+
+
+# Index partagé par les requêtes du processus
+manual_search_index = ManualSearchIndex()
@@ -1014,6 +1014,15 @@ class MeterReadingUpdate(BaseModel):
     prix_unitaire: Optional[float] = None
     abonnement_mensuel: Optional[float] = None
 
+class MeterReadingBulkItem(BaseModel):
+    """Ligne d'un import en masse de relevés (JSON, NDJSON ou CSV)"""
+    meter_id: str
+    date_releve: datetime
+    valeur: float
+    notes: Optional[str] = None
+    prix_unitaire: Optional[float] = None
+    abonnement_mensuel: Optional[float] = None
+
 
 
 # Intervention Request (Demande d'intervention) Models
@@ -1487,6 +1496,7 @@ class BonDeTravail(BaseModel):
     updated_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
     created_by: Optional[str] = None
     titre: Optional[str] = None  # Titre du bon de travail
+    numero: Optional[int] = None  # N° du bon de travail (auto-généré)
 
 
 # ==================== AUTORISATION PARTICULIERE ====================
@@ -2086,3 +2096,12 @@ class ManualExportRequest(BaseModel):
     include_images: bool = True
     include_toc: bool = True
 
+
+
+# ==================== UPLOADS PAR MORCEAUX ====================
+
+class UploadSessionCreate(BaseModel):
+    """Démarrage d'un upload par morceaux (gros PDF, vidéos)"""
+    filename: str
+    size: int  # Taille totale annoncée en octets
+    mime_type: Optional[str] = None
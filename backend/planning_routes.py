@@ -0,0 +1,184 @@
+"""
+Routes API pour la prévision du planning (maintenances préventives et contrôles à venir)
+"""
+from fastapi import APIRouter, Depends, HTTPException
+from typing import Optional
+from datetime import datetime, timedelta
+from bson import ObjectId
+import logging
+
+from dependencies import require_permission, check_permission
+from recurrence import pm_frequency_step, periodicite_step, occurrences_between
+from surveillance_routes import parse_control_date, today_utc
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/planning", tags=["planning"])
+
+# Variables globales (seront injectées depuis server.py)
+db = None
+
+def init_planning_routes(database):
+    """Initialise les routes avec la connexion DB"""
+    global db
+    db = database
+
+
+# Horizon maximal d'une prévision (jours)
+MAX_FORECAST_DAYS = 366
+
+
+def week_start(date: datetime) -> str:
+    """Lundi de la semaine de la date (ISO), clé de regroupement par semaine"""
+    return (date - timedelta(days=date.weekday())).strftime("%Y-%m-%d")
+
+
+async def load_user_names(user_ids) -> dict:
+    """Noms affichables des techniciens, en une requête"""
+    object_ids = [ObjectId(uid) for uid in user_ids if uid and ObjectId.is_valid(uid)]
+    if not object_ids:
+        return {}
+    users = await db.users.find(
+        {"_id": {"$in": object_ids}},
+        {"nom": 1, "prenom": 1}
+    ).to_list(length=None)
+    return {
+        str(user["_id"]): f"{user.get('prenom', '')} {user.get('nom', '')}".strip()
+        for user in users
+    }
+
+
+async def preventive_occurrences(start: datetime, end: datetime, technicien_id: Optional[str]) -> list:
+    """Occurrences des maintenances préventives actives entre start et end"""
+    query = {"statut": "ACTIF", "prochaineMaintenance": {"$lte": end}}
+    if technicien_id:
+        query["assigne_a_id"] = technicien_id
+
+    pm_list = await db.preventive_maintenances.find(
+        query,
+        {"titre": 1, "equipement_id": 1, "frequence": 1, "prochaineMaintenance": 1, "ancrageMaintenance": 1, "assigne_a_id": 1, "duree": 1}
+    ).to_list(length=None)
+
+    occurrences = []
+    for pm in pm_list:
+        step = pm_frequency_step(pm.get("frequence"))
+        # Série ancrée sur la date d'origine, à partir de la prochaine échéance
+        anchor = pm.get("ancrageMaintenance") or pm["prochaineMaintenance"]
+        for date in occurrences_between(anchor, step, max(start, pm["prochaineMaintenance"]), end):
+            occurrences.append({
+                "source": "preventive",
+                "id": str(pm["_id"]),
+                "titre": pm.get("titre"),
+                "equipement_id": pm.get("equipement_id"),
+                "date": date,
+                "technicien_id": pm.get("assigne_a_id"),
+                "technicien": None,
+                "duree": pm.get("duree") or 0
+            })
+    return occurrences
+
+
+async def surveillance_occurrences(start: datetime, end: datetime) -> list:
+    """Occurrences des contrôles du plan de surveillance entre start et end"""
+    items = await db.surveillance_items.find(
+        {"prochain_controle_date": {"$lte": end}},
+        {"id": 1, "classe_type": 1, "batiment": 1, "periodicite": 1, "executant": 1, "prochain_controle_date": 1}
+    ).to_list(length=None)
+
+    occurrences = []
+    for item in items:
+        anchor = parse_control_date(item.get("prochain_controle_date"))
+        if anchor is None:
+            continue
+        step = periodicite_step(item.get("periodicite"))
+        for date in occurrences_between(anchor, step, start, end):
+            occurrences.append({
+                "source": "surveillance",
+                "id": item.get("id"),
+                "titre": f"{item.get('classe_type', '')} - {item.get('batiment', '')}",
+                "equipement_id": None,
+                "date": date,
+                "technicien_id": None,
+                "technicien": item.get("executant") or None,
+                "duree": 0
+            })
+    return occurrences
+
+
+@router.get("/forecast")
+async def get_planning_forecast(
+    date_debut: Optional[str] = None,
+    jours: int = 90,
+    technicien_id: Optional[str] = None,
+    inclure_surveillance: bool = True,
+    current_user: dict = Depends(require_permission("planning", "view"))
+):
+    """
+    Prévision des maintenances préventives et contrôles à venir
+
+    Développe chaque maintenance active (et chaque contrôle du plan de surveillance si
+    l'utilisateur y a accès) sur la période, puis totalise la charge par technicien et
+    par semaine (semaine identifiée par la date de son lundi).
+    """
+    try:
+        start = parse_control_date(date_debut) if date_debut else today_utc()
+        if start is None:
+            raise HTTPException(status_code=400, detail="date_debut invalide (format attendu: AAAA-MM-JJ)")
+        if jours < 1 or jours > MAX_FORECAST_DAYS:
+            raise HTTPException(status_code=400, detail=f"jours doit être compris entre 1 et {MAX_FORECAST_DAYS}")
+        end = start + timedelta(days=jours) - timedelta(microseconds=1)
+
+        occurrences = await preventive_occurrences(start, end, technicien_id)
+        if inclure_surveillance and not technicien_id and check_permission(current_user, "surveillance", "view"):
+            occurrences.extend(await surveillance_occurrences(start, end))
+
+        names = await load_user_names({occ["technicien_id"] for occ in occurrences})
+
+        workload = {}
+        per_technician = {}
+        for occ in occurrences:
+            if occ["technicien_id"]:
+                occ["technicien"] = names.get(occ["technicien_id"], occ["technicien_id"])
+            technicien = occ["technicien"] or "Non assigné"
+            key = (occ["technicien_id"], technicien)
+            semaine = week_start(occ["date"])
+
+            week_entry = workload.setdefault((key, semaine), {
+                "technicien_id": occ["technicien_id"],
+                "technicien": technicien,
+                "semaine": semaine,
+                "nombre": 0,
+                "heures": 0
+            })
+            week_entry["nombre"] += 1
+            week_entry["heures"] += occ["duree"]
+
+            tech_entry = per_technician.setdefault(key, {
+                "technicien_id": occ["technicien_id"],
+                "technicien": technicien,
+                "nombre": 0,
+                "heures": 0
+            })
+            tech_entry["nombre"] += 1
+            tech_entry["heures"] += occ["duree"]
+
+        occurrences.sort(key=lambda occ: occ["date"])
+        for occ in occurrences:
+            occ["date"] = occ["date"].strftime("%Y-%m-%d")
+
+        return {
+            "date_debut": start.strftime("%Y-%m-%d"),
+            "date_fin": end.strftime("%Y-%m-%d"),
+            "occurrences": occurrences,
+            "charge": sorted(workload.values(), key=lambda entry: (entry["semaine"], entry["technicien"])),
+            "par_technicien": sorted(per_technician.values(), key=lambda entry: -entry["heures"]),
+            "total": {
+                "nombre": len(occurrences),
+                "heures": sum(entry["heures"] for entry in per_technician.values())
+            }
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Erreur prévision planning: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,11 +1,14 @@
 """
 Routes API pour les Presqu'accidents (Near Miss)
 """
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Request
 from typing import List, Optional
-from datetime import datetime, timezone, timedelta
+from datetime import datetime, timezone
 from pathlib import Path
-import uuid
+from pymongo import UpdateOne
+import math
+import re
+import statistics
 import logging
 
 from models import (
@@ -20,6 +23,9 @@ from models import (
 )
 from dependencies import get_current_user, get_current_admin_user
 from audit_service import AuditService
+import upload_service
+from csv_import import read_import_file, insert_chunks, import_result, report_path
+from file_responder import send_file
 
 logger = logging.getLogger(__name__)
 
@@ -28,12 +34,72 @@ router = APIRouter(prefix="/presqu-accident", tags=["presqu-accident"])
 # Variables globales (seront injectées depuis server.py)
 db = None
 audit_service = None
+badge_service = None
 
-def init_presqu_accident_routes(database, audit_svc):
-    """Initialise les routes avec la connexion DB et audit service"""
-    global db, audit_service
+def init_presqu_accident_routes(database, audit_svc, badge_svc):
+    """Initialise les routes avec la connexion DB, l'audit service et le service des badges"""
+    global db, audit_service, badge_service
     db = database
     audit_service = audit_svc
+    badge_service = badge_svc
+    badge_service.register("presqu_accident", "presquaccident", compute_badge_counts)
+
+
+# ==================== Dates typées ====================
+
+# Champs dates ISO (chaînes, conservées pour l'API) et leur copie typée indexée
+DATE_FIELDS = {
+    "date_incident": "date_incident_date",
+    "date_cloture": "date_cloture_date",
+    "date_echeance_action": "date_echeance_action_date",
+}
+
+CLOSED_STATUSES = [PresquAccidentStatus.TERMINE.value, PresquAccidentStatus.ARCHIVE.value]
+
+
+def today_utc() -> datetime:
+    """Date du jour (UTC) à minuit, au format naïf utilisé par MongoDB"""
+    return datetime.now(timezone.utc).replace(tzinfo=None, hour=0, minute=0, second=0, microsecond=0)
+
+
+def parse_iso_day(value) -> Optional[datetime]:
+    """Convertit une date ISO (chaîne) en datetime à minuit, None si absente ou invalide"""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+    return datetime(parsed.year, parsed.month, parsed.day)
+
+
+def typed_date_fields(values: dict) -> dict:
+    """Copies typées des champs dates présents dans values"""
+    return {
+        typed: parse_iso_day(values.get(field))
+        for field, typed in DATE_FIELDS.items()
+        if field in values
+    }
+
+
+async def ensure_presqu_accident_indexes():
+    """Crée les index des presqu'accidents et renseigne les dates typées manquantes"""
+    await db.presqu_accident_items.create_index("id")
+    await db.presqu_accident_items.create_index([("status", 1), ("date_echeance_action_date", 1)])
+    await db.presqu_accident_items.create_index("date_incident_date")
+    
+    # Migration des items créés avant l'ajout des dates typées
+    updates = []
+    async for item in db.presqu_accident_items.find(
+        {"date_incident_date": {"$exists": False}},
+        {"_id": 1, **{field: 1 for field in DATE_FIELDS}}
+    ):
+        fields = typed_date_fields({field: item.get(field) for field in DATE_FIELDS})
+        updates.append(UpdateOne({"_id": item["_id"]}, {"$set": fields}))
+    
+    if updates:
+        await db.presqu_accident_items.bulk_write(updates, ordered=False)
+        logger.info(f"✅ Dates typées renseignées pour {len(updates)} presqu'accident(s)")
 
 
 # ==================== CRUD Routes ====================
@@ -57,7 +123,7 @@ async def get_presqu_accident_items(
         if severite:
             query["severite"] = severite
         if lieu:
-            query["lieu"] = {"$regex": lieu, "$options": "i"}
+            query["lieu"] = {"$regex": re.escape(lieu), "$options": "i"}
         
         items = await db.presqu_accident_items.find(query).to_list(length=None)
         
@@ -109,7 +175,9 @@ async def create_presqu_accident_item(
         )
         
         item_dict = item.model_dump()
+        item_dict.update(typed_date_fields(item_dict))
         await db.presqu_accident_items.insert_one(item_dict)
+        badge_service.invalidate("presqu_accident")
         
         # Audit
         await audit_service.log_action(
@@ -157,11 +225,14 @@ async def update_presqu_accident_item(
         if update_data.get("status") == PresquAccidentStatus.TERMINE.value and not existing.get("date_cloture"):
             update_data["date_cloture"] = datetime.now(timezone.utc).isoformat()
         
+        update_data.update(typed_date_fields(update_data))
+        
         # Mettre à jour
         await db.presqu_accident_items.update_one(
             {"id": item_id},
             {"$set": update_data}
         )
+        badge_service.invalidate("presqu_accident")
         
         # Récupérer l'item mis à jour
         updated_item = await db.presqu_accident_items.find_one({"id": item_id})
@@ -200,6 +271,7 @@ async def delete_presqu_accident_item(
             raise HTTPException(status_code=404, detail="Presqu'accident non trouvé")
         
         await db.presqu_accident_items.delete_one({"id": item_id})
+        badge_service.invalidate("presqu_accident")
         
         # Audit
         await audit_service.log_action(
@@ -268,17 +340,124 @@ async def get_presqu_accident_stats(current_user: dict = Depends(get_current_use
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def treatment_breakdown(rows: List[dict], keys: Optional[List[str]] = None) -> dict:
+    """Met en forme les groupes {total, termine, pourcentage} renvoyés par l'agrégation"""
+    result = {}
+    if keys:
+        result = {key: {"total": 0, "termine": 0, "pourcentage": 0} for key in keys}
+    for row in rows:
+        if keys is not None and row["_id"] not in result:
+            continue
+        result[row["_id"]] = {
+            "total": row["total"],
+            "termine": row["termine"],
+            "pourcentage": round((row["termine"] / row["total"] * 100) if row["total"] else 0, 1)
+        }
+    return result
+
+
+def month_keys(end: datetime, count: int = 12) -> List[str]:
+    """Clés YYYY-MM des `count` mois se terminant au mois de `end`"""
+    keys = []
+    year, month = end.year, end.month
+    for _ in range(count):
+        keys.append(f"{year:04d}-{month:02d}")
+        month -= 1
+        if month == 0:
+            month, year = 12, year - 1
+    return sorted(keys)
+
+
 @router.get("/rapport-stats")
-async def get_rapport_stats(current_user: dict = Depends(get_current_user)):
+async def get_rapport_stats(
+    date_debut: Optional[str] = None,
+    date_fin: Optional[str] = None,
+    lieu: Optional[str] = None,
+    service: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
     """
     Récupérer les statistiques complètes pour la page Rapport
     Inclut tous les KPIs : taux de traitement par service, sévérité, lieu, etc.
+    
+    Filtres optionnels : période d'incident (date_debut / date_fin, ISO), lieu (site) et service.
+    Le délai de traitement est donné en moyenne, médiane et 90e centile (jours).
     """
     try:
-        items = await db.presqu_accident_items.find().to_list(length=None)
-        
-        total = len(items)
-        if total == 0:
+        match = {}
+        start = parse_iso_day(date_debut)
+        end = parse_iso_day(date_fin)
+        if start or end:
+            match["date_incident_date"] = {}
+            if start:
+                match["date_incident_date"]["$gte"] = start
+            if end:
+                match["date_incident_date"]["$lte"] = end
+        if lieu:
+            match["lieu"] = {"$regex": re.escape(lieu), "$options": "i"}
+        if service:
+            match["service"] = service
+        
+        today = today_utc()
+        months = month_keys(end or today)
+        first_month = datetime.strptime(months[0], "%Y-%m")
+        is_termine = {"$eq": ["$status", PresquAccidentStatus.TERMINE.value]}
+        count_termine = {"$sum": {"$cond": [is_termine, 1, 0]}}
+        
+        def group_by(key):
+            return {"$group": {"_id": key, "total": {"$sum": 1}, "termine": count_termine}}
+        
+        pipeline = [
+            {"$match": match},
+            {"$facet": {
+                "global": [{
+                    "$group": {
+                        "_id": None,
+                        "total": {"$sum": 1},
+                        "a_traiter": {"$sum": {"$cond": [{"$eq": ["$status", PresquAccidentStatus.A_TRAITER.value]}, 1, 0]}},
+                        "en_cours": {"$sum": {"$cond": [{"$eq": ["$status", PresquAccidentStatus.EN_COURS.value]}, 1, 0]}},
+                        "termine": count_termine,
+                        "archive": {"$sum": {"$cond": [{"$eq": ["$status", PresquAccidentStatus.ARCHIVE.value]}, 1, 0]}},
+                        # Actions avec échéance dépassée et non terminées
+                        "en_retard": {"$sum": {"$cond": [{"$and": [
+                            {"$not": [{"$in": ["$status", CLOSED_STATUSES]}]},
+                            {"$ne": [{"$ifNull": ["$date_echeance_action_date", None]}, None]},
+                            {"$lt": ["$date_echeance_action_date", today]}
+                        ]}, 1, 0]}}
+                    }
+                }],
+                # Délais de traitement (jours) des items terminés, triés pour les centiles
+                "delais": [
+                    {"$match": {
+                        "status": PresquAccidentStatus.TERMINE.value,
+                        "date_incident_date": {"$ne": None},
+                        "date_cloture_date": {"$ne": None}
+                    }},
+                    {"$project": {"_id": 0, "jours": {"$divide": [
+                        {"$subtract": ["$date_cloture_date", "$date_incident_date"]}, 86400000
+                    ]}}},
+                    {"$sort": {"jours": 1}},
+                    {"$group": {"_id": None, "valeurs": {"$push": "$jours"}}}
+                ],
+                "by_service": [group_by("$service")],
+                "by_severite": [group_by("$severite")],
+                "by_lieu": [
+                    group_by({"$ifNull": ["$lieu", "Non spécifié"]}),
+                    {"$sort": {"total": -1}},
+                    {"$limit": 10}
+                ],
+                "by_month": [
+                    {"$match": {"date_incident_date": {"$gte": first_month}}},
+                    {"$group": {
+                        "_id": {"$dateToString": {"format": "%Y-%m", "date": "$date_incident_date"}},
+                        "total": {"$sum": 1}
+                    }}
+                ]
+            }}
+        ]
+        facets = (await db.presqu_accident_items.aggregate(pipeline).to_list(length=1))[0]
+        
+        if not facets["global"]:
             return {
                 "global": {
                     "total": 0,
@@ -288,6 +467,8 @@ async def get_rapport_stats(current_user: dict = Depends(get_current_user)):
                     "archive": 0,
                     "pourcentage_traitement": 0,
                     "delai_moyen_traitement": 0,
+                    "delai_median_traitement": 0,
+                    "delai_p90_traitement": 0,
                     "en_retard": 0
                 },
                 "by_service": {},
@@ -296,147 +477,69 @@ async def get_rapport_stats(current_user: dict = Depends(get_current_user)):
                 "by_month": {}
             }
         
-        today = datetime.now(timezone.utc).date()
+        counts = facets["global"][0]
+        total = counts["total"]
         
-        # Statistiques globales
-        a_traiter = [i for i in items if i.get("status") == PresquAccidentStatus.A_TRAITER.value]
-        en_cours = [i for i in items if i.get("status") == PresquAccidentStatus.EN_COURS.value]
-        termine = [i for i in items if i.get("status") == PresquAccidentStatus.TERMINE.value]
-        archive = [i for i in items if i.get("status") == PresquAccidentStatus.ARCHIVE.value]
-        
-        # Calculer le délai moyen de traitement (en jours)
-        delais = []
-        for item in termine:
-            if item.get("date_incident") and item.get("date_cloture"):
-                try:
-                    date_incident = datetime.fromisoformat(item["date_incident"]).date()
-                    date_cloture = datetime.fromisoformat(item["date_cloture"]).date()
-                    delais.append((date_cloture - date_incident).days)
-                except:
-                    pass
+        delais = facets["delais"][0]["valeurs"] if facets["delais"] else []
         delai_moyen = round(sum(delais) / len(delais)) if delais else 0
+        delai_median = round(statistics.median(delais)) if delais else 0
+        # 90e centile (méthode du rang le plus proche)
+        delai_p90 = round(delais[math.ceil(0.9 * len(delais)) - 1]) if delais else 0
         
-        # Compter les items en retard (actions avec échéance dépassée et non terminés)
-        en_retard = 0
-        for item in items:
-            if item.get("status") not in [PresquAccidentStatus.TERMINE.value, PresquAccidentStatus.ARCHIVE.value]:
-                if item.get("date_echeance_action"):
-                    try:
-                        echeance = datetime.fromisoformat(item["date_echeance_action"]).date()
-                        if echeance < today:
-                            en_retard += 1
-                    except:
-                        pass
-        
-        # Par service
-        by_service = {}
-        for svc in PresquAccidentService:
-            svc_items = [i for i in items if i.get("service") == svc.value]
-            svc_termine = len([i for i in svc_items if i.get("status") == PresquAccidentStatus.TERMINE.value])
-            by_service[svc.value] = {
-                "total": len(svc_items),
-                "termine": svc_termine,
-                "pourcentage": round((svc_termine / len(svc_items) * 100) if svc_items else 0, 1)
-            }
-        
-        # Par sévérité
-        by_severite = {}
-        for sev in PresquAccidentSeverity:
-            sev_items = [i for i in items if i.get("severite") == sev.value]
-            sev_termine = len([i for i in sev_items if i.get("status") == PresquAccidentStatus.TERMINE.value])
-            by_severite[sev.value] = {
-                "total": len(sev_items),
-                "termine": sev_termine,
-                "pourcentage": round((sev_termine / len(sev_items) * 100) if sev_items else 0, 1)
-            }
-        
-        # Par lieu (top 10)
-        by_lieu = {}
-        lieux = set([i.get("lieu", "Non spécifié") for i in items])
-        for lieu in lieux:
-            lieu_items = [i for i in items if i.get("lieu") == lieu]
-            lieu_termine = len([i for i in lieu_items if i.get("status") == PresquAccidentStatus.TERMINE.value])
-            by_lieu[lieu] = {
-                "total": len(lieu_items),
-                "termine": lieu_termine,
-                "pourcentage": round((lieu_termine / len(lieu_items) * 100) if lieu_items else 0, 1)
-            }
-        
-        # Par mois (12 derniers mois)
-        by_month = {}
-        for i in range(12):
-            month_start = (datetime.now(timezone.utc) - timedelta(days=30*i)).replace(day=1)
-            month_key = month_start.strftime("%Y-%m")
-            month_items = []
-            for item in items:
-                if item.get("date_incident"):
-                    try:
-                        incident_date = datetime.fromisoformat(item["date_incident"])
-                        if incident_date.strftime("%Y-%m") == month_key:
-                            month_items.append(item)
-                    except:
-                        pass
-            by_month[month_key] = len(month_items)
+        by_month = {key: 0 for key in months}
+        for row in facets["by_month"]:
+            if row["_id"] in by_month:
+                by_month[row["_id"]] = row["total"]
         
         return {
             "global": {
                 "total": total,
-                "a_traiter": len(a_traiter),
-                "en_cours": len(en_cours),
-                "termine": len(termine),
-                "archive": len(archive),
-                "pourcentage_traitement": round((len(termine) / total * 100), 1),
+                "a_traiter": counts["a_traiter"],
+                "en_cours": counts["en_cours"],
+                "termine": counts["termine"],
+                "archive": counts["archive"],
+                "pourcentage_traitement": round((counts["termine"] / total * 100), 1),
                 "delai_moyen_traitement": delai_moyen,
-                "en_retard": en_retard
+                "delai_median_traitement": delai_median,
+                "delai_p90_traitement": delai_p90,
+                "en_retard": counts["en_retard"]
             },
-            "by_service": by_service,
-            "by_severite": by_severite,
-            "by_lieu": dict(sorted(by_lieu.items(), key=lambda x: x[1]["total"], reverse=True)[:10]),
-            "by_month": dict(sorted(by_month.items()))
+            "by_service": treatment_breakdown(facets["by_service"], [svc.value for svc in PresquAccidentService]),
+            "by_severite": treatment_breakdown(facets["by_severite"], [sev.value for sev in PresquAccidentSeverity]),
+            "by_lieu": treatment_breakdown(facets["by_lieu"]),
+            "by_month": by_month
         }
     except Exception as e:
         logger.error(f"Erreur récupération rapport stats: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.get("/badge-stats")
-async def get_badge_stats(current_user: dict = Depends(get_current_user)):
+async def compute_badge_counts() -> dict:
     """
-    Récupérer les statistiques pour le badge de notification du header
+    Compteurs du badge presqu'accident (recalculés par le service des badges)
     - Nombre de presqu'accidents à traiter
     - Nombre d'actions en retard
     """
+    a_traiter = await db.presqu_accident_items.count_documents(
+        {"status": PresquAccidentStatus.A_TRAITER.value}
+    )
+    
+    en_retard = await db.presqu_accident_items.count_documents({
+        "status": {"$nin": CLOSED_STATUSES},
+        "date_echeance_action_date": {"$lt": today_utc()}
+    })
+    
+    return {
+        "a_traiter": a_traiter,
+        "en_retard": en_retard
+    }
+
+
+@router.get("/badge-stats")
+async def get_badge_stats(current_user: dict = Depends(get_current_user)):
+    """Récupérer les statistiques pour le badge de notification du header (valeurs en cache)"""
     try:
-        items = await db.presqu_accident_items.find().to_list(length=None)
-        
-        total = len(items)
-        if total == 0:
-            return {
-                "a_traiter": 0,
-                "en_retard": 0
-            }
-        
-        # Compter les items à traiter
-        a_traiter = len([i for i in items if i.get("status") == PresquAccidentStatus.A_TRAITER.value])
-        
-        # Compter les items en retard
-        en_retard = 0
-        today = datetime.now(timezone.utc).date()
-        
-        for item in items:
-            if item.get("status") not in [PresquAccidentStatus.TERMINE.value, PresquAccidentStatus.ARCHIVE.value]:
-                if item.get("date_echeance_action"):
-                    try:
-                        echeance = datetime.fromisoformat(item["date_echeance_action"]).date()
-                        if echeance < today:
-                            en_retard += 1
-                    except:
-                        pass
-        
-        return {
-            "a_traiter": a_traiter,
-            "en_retard": en_retard
-        }
+        return await badge_service.get("presqu_accident")
     except Exception as e:
         logger.error(f"Erreur récupération badge stats: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -511,19 +614,11 @@ async def upload_piece_jointe(
         if not item:
             raise HTTPException(status_code=404, detail="Presqu'accident non trouvé")
         
-        # Créer le répertoire uploads/presqu_accident si nécessaire
-        upload_dir = Path("uploads/presqu_accident")
-        upload_dir.mkdir(parents=True, exist_ok=True)
-        
-        # Générer un nom de fichier unique
-        file_ext = Path(file.filename).suffix
-        unique_filename = f"{item_id}_{uuid.uuid4()}{file_ext}"
-        file_path = upload_dir / unique_filename
-        
-        # Sauvegarder le fichier
-        with open(file_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
+        # Sauvegarder le fichier par blocs dans uploads/presqu_accident
+        stored = await upload_service.receive_upload(
+            file, None, current_user.get("id"), Path("uploads/presqu_accident"), prefix=f"{item_id}_"
+        )
+        unique_filename = stored["filename"]
         
         # Mettre à jour l'item avec l'URL du fichier
         file_url = f"/uploads/presqu_accident/{unique_filename}"
@@ -558,58 +653,62 @@ async def import_presqu_accident_data(
     file: UploadFile = File(...),
     current_user: dict = Depends(get_current_admin_user)
 ):
-    """Importer des données depuis un fichier CSV/Excel"""
+    """
+    Importer des données depuis un fichier CSV/Excel
+    
+    Les colonnes sont validées en entier puis les lignes valides insérées par lots ;
+    les lignes refusées sont listées dans un rapport d'erreurs téléchargeable.
+    """
     try:
-        import pandas as pd
-        from io import BytesIO
+        frame = await read_import_file(file)
+        
+        # Mapper et valider les colonnes
+        columns = {
+            "titre": frame.text("titre", ""),
+            "description": frame.text("description", ""),
+            "date_incident": frame.date("date_incident", required=True),
+            "lieu": frame.text("lieu", ""),
+            "service": frame.choice("service", [s.value for s in PresquAccidentService], "AUTRE"),
+            "personnes_impliquees": frame.text("personnes_impliquees"),
+            "declarant": frame.text("declarant"),
+            "contexte_cause": frame.text("contexte_cause"),
+            "severite": frame.choice("severite", [s.value for s in PresquAccidentSeverity], "MOYEN"),
+            "actions_proposees": frame.text("actions_proposees"),
+            "commentaire": frame.text("commentaire"),
+            "created_by": current_user.get("id"),
+            "updated_by": current_user.get("id")
+        }
         
-        content = await file.read()
-        
-        # Lire le fichier selon l'extension
-        if file.filename.endswith('.csv'):
-            df = pd.read_csv(BytesIO(content))
-        elif file.filename.endswith(('.xlsx', '.xls')):
-            df = pd.read_excel(BytesIO(content))
-        else:
-            raise HTTPException(status_code=400, detail="Format de fichier non supporté")
-        
-        # Mapper les colonnes
-        imported_count = 0
-        errors = []
-        
-        for index, row in df.iterrows():
-            try:
-                item = PresquAccidentItem(
-                    titre=str(row.get('titre', '')),
-                    description=str(row.get('description', '')),
-                    date_incident=str(row.get('date_incident', '')),
-                    lieu=str(row.get('lieu', '')),
-                    service=str(row.get('service', 'AUTRE')),
-                    personnes_impliquees=str(row.get('personnes_impliquees', '')) if pd.notna(row.get('personnes_impliquees')) else None,
-                    declarant=str(row.get('declarant', '')) if pd.notna(row.get('declarant')) else None,
-                    contexte_cause=str(row.get('contexte_cause', '')) if pd.notna(row.get('contexte_cause')) else None,
-                    severite=str(row.get('severite', 'MOYEN')),
-                    actions_proposees=str(row.get('actions_proposees', '')) if pd.notna(row.get('actions_proposees')) else None,
-                    commentaire=str(row.get('commentaire', '')) if pd.notna(row.get('commentaire')) else None,
-                    created_by=current_user.get("id"),
-                    updated_by=current_user.get("id")
-                )
-                
-                await db.presqu_accident_items.insert_one(item.model_dump())
-                imported_count += 1
-            except Exception as e:
-                errors.append(f"Ligne {index + 2}: {str(e)}")
+        documents = []
+        for ligne, values in frame.valid_rows(columns):
+            # Valeurs déjà validées : le modèle ne fait qu'ajouter les valeurs par défaut
+            item_dict = PresquAccidentItem.model_construct(**values).model_dump(warnings=False)
+            item_dict.update(typed_date_fields(item_dict))
+            documents.append((ligne, item_dict))
         
-        return {
-            "success": True,
-            "imported_count": imported_count,
-            "errors": errors[:10]  # Limiter à 10 erreurs
-        }
+        imported_count = await insert_chunks(db.presqu_accident_items, documents, frame)
+        
+        if imported_count:
+            badge_service.invalidate("presqu_accident")
+        
+        return await import_result(frame, imported_count, "/api/presqu-accident/import/reports/{report_id}")
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Erreur import données: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/import/reports/{report_id}")
+async def download_import_report(
+    request: Request,
+    report_id: str,
+    current_user: dict = Depends(get_current_admin_user)
+):
+    """Télécharger le rapport d'erreurs complet d'un import"""
+    return await send_file(request, report_path(report_id), "erreurs_import_presqu_accidents.csv", "text/csv")
+
+
 @router.get("/export/template")
 async def export_template(current_user: dict = Depends(get_current_user)):
     """Télécharger un template CSV pour l'import"""
@@ -0,0 +1,187 @@
+"""
+Vignettes des pièces jointes (photos et première page des PDF)
+
+Les vignettes sont calculées dans le pool de processus partagé (le décodage d'une photo de
+plusieurs mégapixels ou le rendu d'un PDF ne bloque pas la boucle d'événements) dès
+l'upload, puis conservées sur disque sous uploads/thumbnails. Elles sont indexées par
+l'empreinte SHA-256 du fichier : une vignette ne change jamais et peut être gardée en
+cache par le navigateur sans revalidation.
+"""
+import asyncio
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional
+import logging
+
+import aiofiles.os
+from fastapi import Request
+from starlette.responses import FileResponse, Response
+
+import worker_pool
+from blob_store import blob_store
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_DIR = Path(__file__).parent / "uploads" / "thumbnails"
+
+# Taille maximale (la vignette garde les proportions du fichier d'origine)
+THUMBNAIL_SIZE = (400, 400)
+THUMBNAIL_QUALITY = 80
+THUMBNAIL_MEDIA_TYPE = "image/jpeg"
+
+# Vignette indexée par empreinte : contenu immuable, gardé un an par le navigateur
+THUMBNAIL_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+# Délai avant un nouvel essai pour un fichier dont la vignette a échoué (secondes)
+FAILED_RETRY_DELAY = 3600
+
+# Rendu des PDF par poppler (pdftoppm) s'il est installé sur le serveur
+PDFTOPPM = shutil.which("pdftoppm")
+
+
+def is_previewable(mime_type: Optional[str]) -> bool:
+    """Indique si une vignette peut être produite pour ce type de fichier"""
+    if not mime_type:
+        return False
+    if mime_type == "application/pdf":
+        return PDFTOPPM is not None
+    return mime_type.startswith("image/") and mime_type != "image/svg+xml"
+
+
+def _render_thumbnail(source: str, target: str, mime_type: str) -> bool:
+    """
+    Produit la vignette JPEG d'un fichier (exécuté dans un processus du pool)
+
+    Returns:
+        True si la vignette a été écrite
+    """
+    from PIL import Image, ImageOps
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if mime_type == "application/pdf":
+            # Première page seulement, déjà réduite par poppler
+            prefix = os.path.join(tmp, "page")
+            subprocess.run(
+                [PDFTOPPM, "-f", "1", "-l", "1", "-singlefile", "-jpeg",
+                 "-scale-to", str(max(THUMBNAIL_SIZE) * 2), source, prefix],
+                check=True, timeout=60, capture_output=True
+            )
+            source = f"{prefix}.jpg"
+
+        with Image.open(source) as image:
+            # draft() laisse le décodeur JPEG réduire l'image au chargement
+            image.draft("RGB", THUMBNAIL_SIZE)
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail(THUMBNAIL_SIZE)
+            if image.mode in ("RGBA", "LA", "P"):
+                image = image.convert("RGBA")
+                background = Image.new("RGB", image.size, "white")
+                background.paste(image, mask=image.getchannel("A"))
+                image = background
+            elif image.mode != "RGB":
+                image = image.convert("RGB")
+
+            partial = f"{target}.part"
+            image.save(partial, "JPEG", quality=THUMBNAIL_QUALITY, optimize=True)
+            os.replace(partial, target)
+    return True
+
+
+class PreviewService:
+    """Production et cache des vignettes de pièces jointes"""
+
+    def __init__(self):
+        # Vignettes en cours de calcul : une seule tâche par fichier même si plusieurs
+        # clients la demandent en même temps
+        self._pending = {}
+        # Fichiers dont la vignette a échoué (image corrompue, pool saturé...) et date de
+        # l'échec : nouvel essai après FAILED_RETRY_DELAY
+        self._failed = {}
+
+    @staticmethod
+    def thumbnail_path(key: str) -> Path:
+        return THUMBNAIL_DIR / key[:2] / f"{key}.jpg"
+
+    async def get_thumbnail(
+        self,
+        key: str,
+        mime_type: Optional[str],
+        sha256: Optional[str] = None,
+        path: Optional[Path] = None
+    ) -> Optional[Path]:
+        """
+        Chemin de la vignette d'un fichier, calculée si besoin
+
+        Args:
+            key: Identifiant de la vignette (empreinte, ou nom du fichier pour les anciens uploads)
+            mime_type: Type MIME du fichier
+            sha256: Empreinte d'un fichier du stockage par contenu
+            path: Chemin d'un fichier stocké hors du stockage par contenu
+
+        Returns:
+            Chemin de la vignette, ou None si le fichier n'a pas de vignette
+        """
+        if not is_previewable(mime_type) or self._recently_failed(key):
+            return None
+
+        target = self.thumbnail_path(key)
+        if await aiofiles.os.path.exists(target):
+            return target
+
+        return await asyncio.shield(self._task(key, mime_type, sha256, path))
+
+    def schedule(self, key: str, mime_type: Optional[str], sha256: Optional[str] = None, path: Optional[Path] = None):
+        """Lance le calcul de la vignette en arrière-plan (appelé après un upload)"""
+        if is_previewable(mime_type) and not self._recently_failed(key):
+            self._task(key, mime_type, sha256, path)
+
+    def _recently_failed(self, key: str) -> bool:
+        failed_at = self._failed.get(key)
+        if failed_at is None:
+            return False
+        if time.monotonic() - failed_at < FAILED_RETRY_DELAY:
+            return True
+        self._failed.pop(key, None)
+        return False
+
+    def _task(self, key: str, mime_type: str, sha256: Optional[str], path: Optional[Path]) -> asyncio.Task:
+        """Tâche de calcul de la vignette, gardée dans _pending jusqu'à sa fin"""
+        task = self._pending.get(key)
+        if task is None:
+            task = asyncio.create_task(self._build(key, self.thumbnail_path(key), mime_type, sha256, path))
+            self._pending[key] = task
+            task.add_done_callback(lambda _: self._pending.pop(key, None))
+        return task
+
+    async def _build(self, key: str, target: Path, mime_type: str, sha256: Optional[str], path: Optional[Path]) -> Optional[Path]:
+        try:
+            if await aiofiles.os.path.exists(target):
+                return target
+            await aiofiles.os.makedirs(target.parent, exist_ok=True)
+            if sha256:
+                async with blob_store.local_file(sha256) as source:
+                    await worker_pool.run_in_process(_render_thumbnail, str(source), str(target), mime_type)
+            else:
+                await worker_pool.run_in_process(_render_thumbnail, str(path), str(target), mime_type)
+            return target
+        except Exception as e:
+            self._failed[key] = time.monotonic()
+            logger.warning(f"⚠️ Vignette impossible pour {key[:12]}: {str(e)}")
+            return None
+
+    @staticmethod
+    def response(request: Request, path: Path, key: str) -> Response:
+        """Réponse HTTP d'une vignette (mise en cache longue, 304 si déjà en cache)"""
+        etag = f'"{key}"'
+        headers = {"ETag": etag, "Cache-Control": THUMBNAIL_CACHE_CONTROL}
+        if etag in (request.headers.get("if-none-match") or ""):
+            return Response(status_code=304, headers=headers)
+        return FileResponse(path, media_type=THUMBNAIL_MEDIA_TYPE, headers=headers)
+
+
+# Instance partagée
+preview_service = PreviewService()
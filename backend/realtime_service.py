@@ -0,0 +1,130 @@
+"""Diffusion en temps réel des changements d'entités (Server-Sent Events)"""
+import asyncio
+import json
+import time
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Optional, Dict, Set
+import logging
+
+from dependencies import check_permission
+
+logger = logging.getLogger(__name__)
+
+# Module de permission requis pour recevoir les événements de chaque type d'entité
+ENTITY_MODULES = {
+    "work_order": "workOrders",
+    "intervention_request": "interventionRequests",
+    "surveillance": "surveillance",
+    "demande_arret": "planningMprev",
+}
+
+
+class _Subscriber:
+    def __init__(self, user: dict, queue_size: int):
+        self.user = user
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+
+
+class RealtimeService:
+    """
+    Diffuse les événements de modification aux navigateurs connectés.
+
+    Les routes d'écriture appellent publish() ; chaque connexion SSE ne reçoit que
+    les événements des modules que l'utilisateur a le droit de consulter
+    (check_permission). Un client trop lent perd ses plus anciens événements
+    plutôt que de bloquer les écritures.
+    """
+
+    def __init__(self, queue_size: int = 100, heartbeat: int = 25):
+        self.queue_size = queue_size
+        self.heartbeat = heartbeat
+        self._subscribers: Set[_Subscriber] = set()
+
+    @property
+    def connection_count(self) -> int:
+        return len(self._subscribers)
+
+    def publish(
+        self,
+        entity_type: str,
+        action: str,
+        entity_id: Optional[str] = None,
+        data: Optional[Dict] = None
+    ):
+        """
+        Publie un événement de changement (non bloquant)
+
+        Args:
+            entity_type: Type d'entité (clé de ENTITY_MODULES)
+            action: created, updated ou deleted
+            entity_id: ID de l'entité (optionnel)
+            data: Informations complémentaires légères (optionnel)
+        """
+        module = ENTITY_MODULES.get(entity_type)
+        event = {
+            "entity_type": entity_type,
+            "action": action,
+            "entity_id": entity_id,
+            "data": data or {},
+            "timestamp": datetime.now(timezone.utc).isoformat()
+        }
+
+        for subscriber in list(self._subscribers):
+            if module and not check_permission(subscriber.user, module, "view"):
+                continue
+            if subscriber.queue.full():
+                try:
+                    subscriber.queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    pass
+            subscriber.queue.put_nowait(event)
+
+    async def stream(self, user: dict, request, refresh_user: Optional[Callable[[], Awaitable[Optional[dict]]]] = None):
+        """
+        Générateur SSE pour une connexion ; se termine quand le client se déconnecte
+
+        Args:
+            user: Utilisateur authentifié à l'ouverture du flux
+            request: Requête HTTP (détection de la déconnexion)
+            refresh_user: Relit l'utilisateur une fois par heartbeat (None si le token a expiré
+                ou si le compte n'existe plus) : les permissions retirées et les sessions
+                expirées s'appliquent sans attendre la fin de la connexion
+        """
+        subscriber = _Subscriber(user, self.queue_size)
+        self._subscribers.add(subscriber)
+        logger.info(f"Connexion temps réel ouverte: {user.get('email')} ({self.connection_count} active(s))")
+
+        try:
+            checked_at = time.monotonic()
+            yield "retry: 5000\n\n"
+            while True:
+                # Au moins une vérification par heartbeat, même si les événements s'enchaînent
+                if refresh_user is not None and time.monotonic() - checked_at >= self.heartbeat:
+                    fresh_user = await refresh_user()
+                    if fresh_user is None:
+                        logger.info(f"Connexion temps réel fermée (session expirée): {user.get('email')}")
+                        break
+                    subscriber.user = fresh_user
+                    checked_at = time.monotonic()
+
+                try:
+                    event = await asyncio.wait_for(subscriber.queue.get(), timeout=self.heartbeat)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    # Commentaire SSE pour garder la connexion ouverte derrière les proxies
+                    yield ": ping\n\n"
+                    continue
+
+                # Événement mis en file avant un retrait de permission
+                module = ENTITY_MODULES.get(event["entity_type"])
+                if module and not check_permission(subscriber.user, module, "view"):
+                    continue
+                yield f"event: change\ndata: {json.dumps(event, default=str)}\n\n"
+        finally:
+            self._subscribers.discard(subscriber)
+            logger.info(f"Connexion temps réel fermée: {user.get('email')} ({self.connection_count} active(s))")
+
+
+# Instance partagée : les modules de routes publient, le endpoint /events/stream diffuse
+realtime_service = RealtimeService()
@@ -0,0 +1,160 @@
+"""
+Calcul des récurrences (maintenances préventives et contrôles du plan de surveillance)
+
+Une périodicité est ramenée à un pas (mois, jours). Les occurrences sont toujours
+calculées depuis la date d'ancrage (ancre + k pas) et non de proche en proche :
+un contrôle du 31 tombe le 28/29 février puis revient au 31 mars au lieu de
+glisser définitivement au 28.
+"""
+import calendar
+import re
+from datetime import datetime, timedelta
+from typing import List, Tuple
+
+# Pas (mois, jours) par fréquence de maintenance préventive
+# (valeurs de l'enum Frequency et anciennes valeurs encore présentes en base)
+PM_FREQUENCY_STEPS = {
+    "QUOTIDIENNE": (0, 1),
+    "QUOTIDIEN": (0, 1),
+    "HEBDOMADAIRE": (0, 7),
+    "MENSUEL": (1, 0),
+    "MENSUELLE": (1, 0),
+    "TRIMESTRIEL": (3, 0),
+    "TRIMESTRIELLE": (3, 0),
+    "SEMESTRIEL": (6, 0),
+    "SEMESTRIELLE": (6, 0),
+    "ANNUEL": (12, 0),
+    "ANNUELLE": (12, 0),
+}
+
+# Pas par défaut quand la périodicité n'est pas reconnue (comportement historique)
+DEFAULT_STEP = (0, 30)
+
+# Ex: "6 mois", "1 an", "3 ans", "2 semaines", "15 jours"
+PERIODICITE_REGEX = re.compile(r"(\d+)\s*(mois|an|année|annee|semaine|jour)", re.IGNORECASE)
+
+# Ex: "2 fois par an", "4 fois par mois"
+FREQUENCE_REGEX = re.compile(r"(\d+)\s*fois\s*par\s*(mois|an|année|annee|semaine|jour)", re.IGNORECASE)
+
+# Durée de chaque unité : (mois, jours)
+UNIT_STEPS = {
+    "mois": (1, 30),
+    "an": (12, 365),
+    "année": (12, 365),
+    "annee": (12, 365),
+    "semaine": (0, 7),
+    "jour": (0, 1),
+}
+
+PERIODICITE_KEYWORDS = [
+    ("quotidien", (0, 1)),
+    ("hebdo", (0, 7)),
+    ("trimestriel", (3, 0)),
+    ("semestriel", (6, 0)),
+    ("mensuel", (1, 0)),
+    ("annuel", (12, 0)),
+]
+
+
+def add_months(date: datetime, months: int) -> datetime:
+    """Ajoute des mois en ramenant le jour au dernier jour du mois si nécessaire"""
+    month_index = date.month - 1 + months
+    year = date.year + month_index // 12
+    month = month_index % 12 + 1
+    day = min(date.day, calendar.monthrange(year, month)[1])
+    return date.replace(year=year, month=month, day=day)
+
+
+def pm_frequency_step(frequence: str) -> Tuple[int, int]:
+    """Pas (mois, jours) d'une fréquence de maintenance préventive"""
+    return PM_FREQUENCY_STEPS.get(str(frequence or "").upper(), DEFAULT_STEP)
+
+
+def periodicite_step(periodicite: str) -> Tuple[int, int]:
+    """Pas (mois, jours) d'une périodicité libre du plan de surveillance"""
+    text = str(periodicite or "").lower()
+
+    match = FREQUENCE_REGEX.search(text)
+    if match:
+        count = int(match.group(1))
+        months, days = UNIT_STEPS[match.group(2)]
+        if count <= 0:
+            return DEFAULT_STEP
+        # Répartir en mois entiers quand c'est possible (2 fois par an -> tous les 6 mois)
+        if months and months % count == 0:
+            return (months // count, 0)
+        return (0, max(days // count, 1))
+
+    match = PERIODICITE_REGEX.search(text)
+    if match:
+        count = int(match.group(1))
+        if count <= 0:
+            return DEFAULT_STEP
+        months, days = UNIT_STEPS[match.group(2)]
+        if months:
+            return (months * count, 0)
+        return (0, days * count)
+
+    for keyword, step in PERIODICITE_KEYWORDS:
+        if keyword in text:
+            return step
+
+    return DEFAULT_STEP
+
+
+def _checked_step(step: Tuple[int, int]) -> Tuple[int, int]:
+    """Un pas nul ou négatif ne ferait jamais avancer la série : pas par défaut"""
+    months, days = step
+    if months > 0 or (months == 0 and days > 0):
+        return step
+    return DEFAULT_STEP
+
+
+def step_from(anchor: datetime, step: Tuple[int, int], count: int) -> datetime:
+    """Date de la count-ième occurrence après l'ancre"""
+    months, days = _checked_step(step)
+    if months:
+        return add_months(anchor, months * count)
+    return anchor + timedelta(days=days * count)
+
+
+def occurrence_rank(anchor: datetime, step: Tuple[int, int], date: datetime) -> int:
+    """Rang de la première occurrence de la série tombant le date ou après"""
+    if anchor >= date:
+        return 0
+
+    # Estimation du premier rang >= date, corrigée d'un pas si besoin
+    months, days = _checked_step(step)
+    if months:
+        elapsed = (date.year - anchor.year) * 12 + date.month - anchor.month
+        rank = max(elapsed // months, 0)
+    else:
+        rank = max((date - anchor).days // days, 0)
+    while step_from(anchor, step, rank) < date:
+        rank += 1
+    return rank
+
+
+def occurrences_between(
+    anchor: datetime,
+    step: Tuple[int, int],
+    start: datetime,
+    end: datetime
+) -> List[datetime]:
+    """
+    Toutes les occurrences de la série ancrée sur anchor comprises entre start et end (inclus)
+
+    Le premier rang utile est calculé directement, sans parcourir les occurrences
+    antérieures à start.
+    """
+    if anchor > end:
+        return []
+
+    dates = []
+    count = occurrence_rank(anchor, step, start)
+    date = step_from(anchor, step, count)
+    while date <= end:
+        dates.append(date)
+        count += 1
+        date = step_from(anchor, step, count)
+    return dates
@@ -4,20 +4,24 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.exceptions import RequestValidationError
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
+from starlette.background import BackgroundTask
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
 import logging
-import aiofiles
 import uuid
 import mimetypes
 import pandas as pd
 import io
+import json
+import asyncio
+import tempfile
 import secrets
 import string
 from pathlib import Path
 from datetime import datetime, timedelta, timezone
 from bson import ObjectId
-import pytz
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 
@@ -25,9 +29,20 @@ from apscheduler.triggers.cron import CronTrigger
 from models import *
 from auth import get_password_hash, verify_password, create_access_token, decode_access_token
 import dependencies
-from dependencies import get_current_user, get_current_admin_user, check_permission, require_permission
+from dependencies import get_current_user, get_current_admin_user, get_user_from_token, check_permission, require_permission
 import email_service
-from audit_service import AuditService
+from audit_service import AuditService, COUNT_EXACT, COUNT_ESTIMATED, COUNT_NONE
+from audit_archive import AUDIT_RETENTION_MONTHS
+from badge_service import BadgeService
+from counter_service import CounterService
+from inventory_service import InventoryService, MOVEMENT_ADJUSTMENT, MOVEMENT_CREATION
+from realtime_service import realtime_service
+from recurrence import pm_frequency_step, step_from, occurrence_rank, occurrences_between
+import upload_service
+from file_responder import send_file
+from blob_store import blob_store, STORAGE_BLOB
+from preview_service import preview_service, is_previewable
+import worker_pool
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -43,6 +58,18 @@ dependencies.set_database(db)
 # Initialize audit service
 audit_service = AuditService(db)
 
+# Initialize content-addressed attachment storage
+blob_store.init(db)
+
+# Initialize sequential number counters
+counter_service = CounterService(db)
+
+# Initialize inventory stock movements
+inventory_service = InventoryService(db)
+
+# Initialize header badge counters
+badge_service = BadgeService()
+
 # Create the main app
 app = FastAPI(title="GMAO Atlas API", version="1.0.0")
 
@@ -68,81 +95,147 @@ api_router = APIRouter(prefix="/api")
 # Initialiser le scheduler pour les tâches automatiques
 scheduler = AsyncIOScheduler()
 
+# Nombre maximal d'occurrences rattrapées par maintenance (évite une boucle sans fin sur une date aberrante)
+PM_MAX_CATCH_UP = 366
+
+def build_pm_work_order(pm: dict, equipement: Optional[dict], occurrence: datetime, now: datetime) -> dict:
+    """Construit le bon de travail d'une occurrence de maintenance préventive
+
+    Le numéro et la clé pm_occurrence sont dérivés de la maintenance et de la date
+    d'échéance : une deuxième exécution produit les mêmes valeurs et l'index unique
+    sur pm_occurrence rejette le doublon.
+    """
+    pm_id = str(pm["_id"])
+    return {
+        "_id": ObjectId(),
+        "id": str(uuid.uuid4()),
+        "numero": f"PM-{occurrence.strftime('%Y%m%d')}-{pm_id.upper()}",
+        "pm_id": pm_id,
+        "pm_occurrence": f"{pm_id}:{occurrence.strftime('%Y-%m-%d')}",
+        "titre": f"Maintenance préventive: {pm['titre']}",
+        "description": f"Maintenance automatique générée depuis la planification préventive '{pm['titre']}'",
+        "type": "PREVENTIF",
+        "priorite": "NORMALE",
+        "statut": "OUVERT",
+        "equipement_id": pm["equipement_id"],
+        "emplacement_id": equipement.get("emplacement_id") if equipement else None,
+        "assigne_a_id": pm.get("assigne_a_id"),
+        "tempsEstime": pm.get("duree"),
+        "dateLimite": max(occurrence, now) + timedelta(days=7),
+        "dateCreation": now,
+        "createdBy": "system-auto",
+        "comments": [],
+        "attachments": [],
+        "historique": []
+    }
+
 # Fonction pour vérifier et créer automatiquement les bons de travail pour les maintenances échues
-async def auto_check_preventive_maintenance():
-    """Fonction exécutée automatiquement chaque jour pour vérifier les maintenances échues"""
+async def auto_check_preventive_maintenance() -> dict:
+    """Fonction exécutée automatiquement chaque jour pour vérifier les maintenances échues
+
+    Les maintenances échues sont lues avec leur équipement en une agrégation, toutes
+    les occurrences manquées depuis la dernière exécution sont générées, puis les bons
+    sont insérés en un insert_many et les prochaines dates appliquées en un bulk_write.
+    Une nouvelle exécution le même jour ne crée aucun doublon.
+    """
+    created_count = 0
+    updated_count = 0
+    errors = []
+
     try:
         logger.info("🔄 Vérification automatique des maintenances préventives échues...")
-        
-        today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-        
-        # Trouver toutes les maintenances actives dont la date est aujourd'hui ou passée
-        pm_list = await db.preventive_maintenances.find({
-            "statut": "ACTIF",
-            "prochaineMaintenance": {"$lte": today + timedelta(days=1)}
-        }).to_list(length=None)
-        
-        created_count = 0
-        updated_count = 0
-        errors = []
-        
+
+        now = datetime.utcnow()
+        today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        horizon = today + timedelta(days=1)
+
+        # Maintenances actives échues et leur équipement en une seule requête
+        pm_list = await db.preventive_maintenances.aggregate([
+            {"$match": {"statut": "ACTIF", "prochaineMaintenance": {"$lte": horizon}}},
+            {"$lookup": {
+                "from": "equipments",
+                "let": {"equipement_id": "$equipement_id"},
+                "pipeline": [
+                    {"$match": {"$expr": {"$eq": [
+                        "$_id",
+                        {"$convert": {"input": "$$equipement_id", "to": "objectId", "onError": None, "onNull": None}}
+                    ]}}},
+                    {"$project": {"emplacement_id": 1}}
+                ],
+                "as": "equipement"
+            }}
+        ]).to_list(length=None)
+
+        work_orders = []
+        pm_updates = {}
+
         for pm in pm_list:
             try:
-                # Récupérer l'équipement
-                equipement = await db.equipments.find_one({"_id": ObjectId(pm["equipement_id"])})
-                
-                # Créer le bon de travail
-                wo_id = str(uuid.uuid4())
-                work_order = {
-                    "_id": ObjectId(),
-                    "id": wo_id,
-                    "numero": f"PM-{datetime.utcnow().strftime('%Y%m%d')}-{secrets.token_hex(3).upper()}",
-                    "titre": f"Maintenance préventive: {pm['titre']}",
-                    "description": f"Maintenance automatique générée depuis la planification préventive '{pm['titre']}'",
-                    "type": "PREVENTIF",
-                    "priorite": "NORMALE",
-                    "statut": "OUVERT",
-                    "equipement_id": pm["equipement_id"],
-                    "emplacement_id": equipement.get("emplacement_id") if equipement else None,
-                    "assigne_a_id": pm.get("assigne_a_id"),
-                    "tempsEstime": pm.get("duree"),
-                    "dateLimite": datetime.utcnow() + timedelta(days=7),
-                    "dateCreation": datetime.utcnow(),
-                    "createdBy": "system-auto",
-                    "comments": [],
-                    "attachments": [],
-                    "historique": []
-                }
-                
-                await db.work_orders.insert_one(work_order)
-                created_count += 1
-                logger.info(f"✅ Bon de travail créé: {work_order['numero']} pour PM '{pm['titre']}'")
-                
-                # Calculer la prochaine date de maintenance
-                next_date = calculate_next_maintenance_date(pm["prochaineMaintenance"], pm["frequence"])
-                
-                # Mettre à jour la maintenance préventive
-                await db.preventive_maintenances.update_one(
-                    {"_id": pm["_id"]},
-                    {
-                        "$set": {
-                            "prochaineMaintenance": next_date,
-                            "derniereMaintenance": datetime.utcnow()
-                        }
-                    }
+                equipement = pm["equipement"][0] if pm.get("equipement") else None
+
+                # Rattraper chaque occurrence manquée jusqu'à aujourd'hui. Les dates sont
+                # calculées depuis l'ancre d'origine et non depuis la dernière échéance, qui
+                # peut avoir été ramenée en fin de mois (31 -> 28 février -> 31 mars)
+                due = pm["prochaineMaintenance"]
+                anchor = pm.get("ancrageMaintenance") or due
+                step = pm_frequency_step(pm["frequence"])
+                first = occurrence_rank(anchor, step, due)
+                occurrences = occurrences_between(anchor, step, due, horizon)[:PM_MAX_CATCH_UP]
+                occurrence = step_from(anchor, step, first + len(occurrences))
+
+                work_orders.extend(build_pm_work_order(pm, equipement, occ, now) for occ in occurrences)
+
+                # Le filtre sur l'ancienne date rend la mise à jour sans effet si une autre
+                # exécution a déjà fait avancer la maintenance
+                pm_updates[str(pm["_id"])] = UpdateOne(
+                    {"_id": pm["_id"], "prochaineMaintenance": pm["prochaineMaintenance"]},
+                    {"$set": {"prochaineMaintenance": occurrence, "ancrageMaintenance": anchor, "derniereMaintenance": now}}
                 )
-                updated_count += 1
-                logger.info(f"✅ Prochaine maintenance mise à jour: {next_date.strftime('%Y-%m-%d')} (fréquence: {pm['frequence']})")
-                
+
+                if len(occurrences) > 1:
+                    logger.info(f"⏪ {len(occurrences)} occurrences rattrapées pour PM '{pm['titre']}'")
+
             except Exception as e:
                 error_msg = f"Erreur pour PM '{pm.get('titre', 'Unknown')}': {str(e)}"
                 errors.append(error_msg)
                 logger.error(f"❌ {error_msg}")
-        
+
+        if work_orders:
+            try:
+                result = await db.work_orders.insert_many(work_orders, ordered=False)
+                created_count = len(result.inserted_ids)
+            except BulkWriteError as e:
+                # Les doublons (occurrence déjà générée) sont ignorés, les autres erreurs remontées
+                created_count = e.details.get("nInserted", 0)
+                failed_occurrences = set()
+                for write_error in e.details.get("writeErrors", []):
+                    if write_error.get("code") != 11000:
+                        failed_occurrences.add(work_orders[write_error["index"]]["pm_occurrence"])
+                        errors.append(f"Erreur insertion bon de travail: {write_error.get('errmsg')}")
+
+                # Une maintenance dont un bon n'a pas pu être créé garde son échéance :
+                # l'occurrence manquante sera reprise à la prochaine vérification
+                for pm_occurrence in failed_occurrences:
+                    pm_updates.pop(pm_occurrence.split(":", 1)[0], None)
+
+        if pm_updates:
+            result = await db.preventive_maintenances.bulk_write(list(pm_updates.values()), ordered=False)
+            updated_count = result.modified_count
+
+        if created_count:
+            realtime_service.publish("work_order", "created", data={"count": created_count, "source": "preventive"})
+
         logger.info(f"✅ Vérification terminée: {created_count} bons créés, {updated_count} maintenances mises à jour, {len(errors)} erreurs")
-        
+
     except Exception as e:
         logger.error(f"❌ Erreur lors de la vérification automatique des maintenances: {str(e)}")
+        errors.append(str(e))
+
+    return {
+        "workOrdersCreated": created_count,
+        "maintenancesUpdated": updated_count,
+        "errors": errors
+    }
 
 # Configure logging
 logging.basicConfig(
@@ -889,8 +982,7 @@ async def get_work_order(wo_id: str, current_user: dict = Depends(require_permis
 async def create_work_order(wo_create: WorkOrderCreate, current_user: dict = Depends(require_permission("workOrders", "edit"))):
     """Créer un nouvel ordre de travail"""
     # Generate numero
-    count = await db.work_orders.count_documents({})
-    numero = str(5800 + count + 1)
+    numero = str(await counter_service.next_value("work_orders"))
     
     wo_dict = wo_create.model_dump()
     wo_dict["numero"] = numero
@@ -904,6 +996,7 @@ async def create_work_order(wo_create: WorkOrderCreate, current_user: dict = Dep
     wo_dict["_id"] = ObjectId()
     
     await db.work_orders.insert_one(wo_dict)
+    realtime_service.publish("work_order", "created", str(wo_dict["_id"]), {"numero": numero})
     
     # Log dans l'audit
     await audit_service.log_action(
@@ -989,6 +1082,7 @@ async def update_work_order(wo_id: str, wo_update: WorkOrderUpdate, current_user
             {"_id": ObjectId(wo_id)},
             {"$set": update_data}
         )
+        realtime_service.publish("work_order", "updated", wo_id)
         
         # Log dans l'audit
         changes_desc = ", ".join([f"{k}: {v}" for k, v in update_data.items()])
@@ -1044,6 +1138,7 @@ async def add_time_to_work_order(wo_id: str, time_data: AddTimeSpent, current_us
             {"_id": ObjectId(wo_id)},
             {"$set": {"tempsReel": new_time}}
         )
+        realtime_service.publish("work_order", "updated", wo_id)
         
         # Log dans l'audit
         await audit_service.log_action(
@@ -1086,6 +1181,10 @@ async def delete_work_order(wo_id: str, current_user: dict = Depends(require_per
             raise HTTPException(status_code=404, detail="Ordre de travail non trouvé")
         
         result = await db.work_orders.delete_one({"_id": ObjectId(wo_id)})
+        await blob_store.release(*[
+            att.get("sha256") for att in wo.get("attachments") or [] if att.get("storage") == STORAGE_BLOB
+        ])
+        realtime_service.publish("work_order", "deleted", wo_id)
         
         # Log dans l'audit
         await audit_service.log_action(
@@ -1113,37 +1212,29 @@ MAX_FILE_SIZE = 25 * 1024 * 1024  # 25MB
 @api_router.post("/work-orders/{wo_id}/attachments")
 async def upload_attachment(
     wo_id: str,
-    file: UploadFile = File(...),
+    file: UploadFile = File(None),
+    upload_id: Optional[str] = None,
     current_user: dict = Depends(require_permission("workOrders", "edit"))
 ):
-    """Uploader une pièce jointe (max 25MB)"""
+    """Uploader une pièce jointe (max 25MB) : fichier multipart ou upload_id d'un upload par morceaux"""
     try:
         # Vérifier que l'ordre de travail existe
         wo = await db.work_orders.find_one({"_id": ObjectId(wo_id)})
         if not wo:
             raise HTTPException(status_code=404, detail="Ordre de travail non trouvé")
         
-        # Vérifier la taille du fichier
-        content = await file.read()
-        if len(content) > MAX_FILE_SIZE:
-            raise HTTPException(status_code=400, detail="Fichier trop volumineux (max 25MB)")
-        
-        # Générer un nom de fichier unique
-        file_ext = Path(file.filename).suffix
-        unique_filename = f"{uuid.uuid4()}{file_ext}"
-        file_path = UPLOAD_DIR / unique_filename
-        
-        # Sauvegarder le fichier
-        async with aiofiles.open(file_path, 'wb') as f:
-            await f.write(content)
+        # Enregistrer le fichier (stockage par empreinte, dédupliqué)
+        stored = await blob_store.store_upload(file, upload_id, current_user["id"], max_size=MAX_FILE_SIZE)
         
         # Créer l'entrée attachment
         attachment = {
             "_id": ObjectId(),
-            "filename": unique_filename,
-            "original_filename": file.filename,
-            "size": len(content),
-            "mime_type": file.content_type or mimetypes.guess_type(file.filename)[0] or "application/octet-stream",
+            "filename": stored["filename"],
+            "original_filename": stored["original_filename"],
+            "size": stored["size"],
+            "sha256": stored["sha256"],
+            "storage": stored["storage"],
+            "mime_type": stored["mime_type"] or mimetypes.guess_type(stored["original_filename"])[0] or "application/octet-stream",
             "uploaded_at": datetime.utcnow()
         }
         
@@ -1152,6 +1243,8 @@ async def upload_attachment(
             {"_id": ObjectId(wo_id)},
             {"$push": {"attachments": attachment}}
         )
+        preview_service.schedule(stored["sha256"], attachment["mime_type"], sha256=stored["sha256"])
+        realtime_service.publish("work_order", "updated", wo_id)
         
         attachment_response = {
             "id": str(attachment["_id"]),
@@ -1160,7 +1253,8 @@ async def upload_attachment(
             "size": attachment["size"],
             "mime_type": attachment["mime_type"],
             "uploaded_at": attachment["uploaded_at"],
-            "url": f"/api/work-orders/{wo_id}/attachments/{str(attachment['_id'])}"
+            "url": f"/api/work-orders/{wo_id}/attachments/{str(attachment['_id'])}",
+            "thumbnail_url": thumbnail_url(str(attachment["_id"]), attachment["mime_type"])
         }
         
         return attachment_response
@@ -1187,7 +1281,8 @@ async def get_attachments(wo_id: str, current_user: dict = Depends(require_permi
                 "size": att["size"],
                 "mime_type": att["mime_type"],
                 "uploaded_at": att["uploaded_at"],
-                "url": f"/api/work-orders/{wo_id}/attachments/{str(att['_id'])}"
+                "url": f"/api/work-orders/{wo_id}/attachments/{str(att['_id'])}",
+                "thumbnail_url": thumbnail_url(str(att["_id"]), att["mime_type"])
             })
         
         return result
@@ -1200,6 +1295,7 @@ async def get_attachments(wo_id: str, current_user: dict = Depends(require_permi
 async def download_attachment(
     wo_id: str,
     attachment_id: str,
+    request: Request,
     current_user: dict = Depends(require_permission("workOrders", "view"))
 ):
     """Télécharger une pièce jointe"""
@@ -1218,14 +1314,14 @@ async def download_attachment(
         if not attachment:
             raise HTTPException(status_code=404, detail="Pièce jointe non trouvée")
         
-        file_path = UPLOAD_DIR / attachment["filename"]
-        if not file_path.exists():
-            raise HTTPException(status_code=404, detail="Fichier non trouvé sur le serveur")
+        if attachment.get("storage") == STORAGE_BLOB:
+            return await blob_store.response(request, attachment["sha256"], attachment["original_filename"], attachment["mime_type"])
         
-        return FileResponse(
-            path=file_path,
-            filename=attachment["original_filename"],
-            media_type=attachment["mime_type"]
+        return await send_file(
+            request,
+            UPLOAD_DIR / attachment["filename"],
+            attachment["original_filename"],
+            attachment["mime_type"]
         )
     except HTTPException:
         raise
@@ -1254,16 +1350,20 @@ async def delete_attachment(
         if not attachment:
             raise HTTPException(status_code=404, detail="Pièce jointe non trouvée")
         
-        # Supprimer le fichier physique
-        file_path = UPLOAD_DIR / attachment["filename"]
-        if file_path.exists():
-            file_path.unlink()
+        # Supprimer le fichier physique (ou retirer la référence au fichier partagé)
+        if attachment.get("storage") == STORAGE_BLOB:
+            await blob_store.release(attachment["sha256"])
+        else:
+            file_path = UPLOAD_DIR / attachment["filename"]
+            if file_path.exists():
+                file_path.unlink()
         
         # Retirer de la base de données
         await db.work_orders.update_one(
             {"_id": ObjectId(wo_id)},
             {"$pull": {"attachments": {"_id": ObjectId(attachment_id)}}}
         )
+        realtime_service.publish("work_order", "updated", wo_id)
         
         return {"message": "Pièce jointe supprimée"}
     except HTTPException:
@@ -1271,6 +1371,71 @@ async def delete_attachment(
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+def thumbnail_url(attachment_id: str, mime_type: Optional[str]) -> Optional[str]:
+    """URL de la vignette d'une pièce jointe (None si le type de fichier n'en a pas)"""
+    return f"/api/attachments/{attachment_id}/thumbnail" if is_previewable(mime_type) else None
+
+async def find_attachment_for_preview(attachment_id: str, current_user: dict):
+    """
+    Retrouve une pièce jointe par son id dans tous les modules que l'utilisateur peut consulter
+    
+    Returns:
+        (attachment, chemin des anciens fichiers stockés hors du stockage par contenu)
+    """
+    if ObjectId.is_valid(attachment_id) and check_permission(current_user, "workOrders", "view"):
+        wo = await db.work_orders.find_one(
+            {"attachments._id": ObjectId(attachment_id)},
+            {"attachments.$": 1}
+        )
+        if wo:
+            att = wo["attachments"][0]
+            return att, UPLOAD_DIR / att["filename"]
+    
+    for collection, module in (("improvements", "improvements"), ("improvement_requests", "improvementRequests")):
+        if not check_permission(current_user, module, "view"):
+            continue
+        entity = await db[collection].find_one({"attachments.id": attachment_id}, {"attachments.$": 1})
+        if entity:
+            att = entity["attachments"][0]
+            return att, UPLOAD_DIR.parent / collection / att["filename"]
+    
+    if not check_permission(current_user, "surveillance", "view"):
+        raise HTTPException(status_code=404, detail="Pièce jointe non trouvée")
+    
+    entry = await db.surveillance_history.find_one({"fichiers.id": attachment_id}, {"fichiers.$": 1})
+    if entry:
+        fichier = entry["fichiers"][0]
+        att = {
+            "filename": Path(fichier["chemin"]).name if fichier.get("chemin") else None,
+            "mime_type": fichier.get("type"),
+            "sha256": fichier.get("sha256"),
+            "storage": fichier.get("storage")
+        }
+        return att, Path(fichier["chemin"]) if fichier.get("chemin") else None
+    
+    raise HTTPException(status_code=404, detail="Pièce jointe non trouvée")
+
+@api_router.get("/attachments/{attachment_id}/thumbnail")
+async def get_attachment_thumbnail(
+    attachment_id: str,
+    request: Request,
+    current_user: dict = Depends(get_current_user)
+):
+    """Vignette d'une pièce jointe (photo réduite ou première page d'un PDF), mise en cache par le navigateur"""
+    attachment, legacy_path = await find_attachment_for_preview(attachment_id, current_user)
+    
+    if attachment.get("storage") == STORAGE_BLOB:
+        key = attachment["sha256"]
+        path = await preview_service.get_thumbnail(key, attachment.get("mime_type"), sha256=key)
+    else:
+        # Ancien fichier : vignette indexée par le nom unique du fichier sur disque
+        key = attachment.get("sha256") or attachment.get("filename")
+        path = await preview_service.get_thumbnail(key, attachment.get("mime_type"), path=legacy_path) if key else None
+    
+    if path is None:
+        raise HTTPException(status_code=404, detail="Aucune vignette pour cette pièce jointe")
+    return preview_service.response(request, path, key)
+
 # ==================== EQUIPMENTS ROUTES ====================
 @api_router.get("/equipments", response_model=List[Equipment])
 async def get_equipments(current_user: dict = Depends(get_current_user)):
@@ -1865,6 +2030,9 @@ async def create_inventory_item(inv_create: InventoryCreate, current_user: dict
     inv_dict["_id"] = ObjectId()
     
     await db.inventory.insert_one(inv_dict)
+    await inventory_service.record_adjustment(inv_dict, 0, current_user, MOVEMENT_CREATION)
+    await inventory_service.refresh_stock_state([inv_dict["_id"]])
+    badge_service.invalidate("inventory")
     
     return Inventory(**serialize_doc(inv_dict))
 
@@ -1875,12 +2043,17 @@ async def update_inventory_item(inv_id: str, inv_update: InventoryUpdate, curren
         update_data = {k: v for k, v in inv_update.model_dump().items() if v is not None}
         update_data["derniereModification"] = datetime.utcnow()
         
-        await db.inventory.update_one(
+        # Document avant modification pour tracer l'écart de quantité
+        previous = await db.inventory.find_one_and_update(
             {"_id": ObjectId(inv_id)},
             {"$set": update_data}
         )
+        await inventory_service.refresh_stock_state([ObjectId(inv_id)])
+        badge_service.invalidate("inventory")
         
         inv = await db.inventory.find_one({"_id": ObjectId(inv_id)})
+        if previous and "quantite" in update_data:
+            await inventory_service.record_adjustment(inv, previous.get("quantite"), current_user)
         return Inventory(**serialize_doc(inv))
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -1892,37 +2065,70 @@ async def delete_inventory_item(inv_id: str, current_user: dict = Depends(requir
         result = await db.inventory.delete_one({"_id": ObjectId(inv_id)})
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Article non trouvé")
+        badge_service.invalidate("inventory")
         return {"message": "Article supprimé"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+async def compute_inventory_badge_counts() -> dict:
+    """Compteurs du badge inventaire : articles en rupture et en niveau bas (index stock_state)"""
+    return await inventory_service.count_by_state()
+
+badge_service.register("inventory", "inventory", compute_inventory_badge_counts)
+
 @api_router.get("/inventory/stats")
 async def get_inventory_stats(current_user: dict = Depends(require_permission("inventory", "view"))):
     """Récupère les statistiques de l'inventaire (rupture et niveau bas)"""
     try:
-        inventory = await db.inventory.find().to_list(1000)
-        
-        rupture = 0
-        niveau_bas = 0
-        
-        for item in inventory:
-            quantite = item.get("quantite", 0)
-            quantite_min = item.get("quantiteMin", 0)
-            
-            if quantite <= 0:
-                rupture += 1
-            elif quantite <= quantite_min:
-                niveau_bas += 1
-        
-        return {
-            "rupture": rupture,
-            "niveau_bas": niveau_bas
-        }
+        return await badge_service.get("inventory")
     except Exception as e:
         logging.error(f"Erreur lors du calcul des stats inventaire: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@api_router.get("/inventory/low-stock")
+async def get_low_stock(current_user: dict = Depends(require_permission("inventory", "view"))):
+    """Articles en rupture ou sous le minimum, avec la quantité suggérée à commander"""
+    try:
+        return await inventory_service.get_low_stock()
+    except Exception as e:
+        logger.error(f"Erreur lors du calcul des stocks bas: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@api_router.get("/inventory/{inv_id}/movements")
+async def get_inventory_movements(
+    inv_id: str,
+    limit: int = 100,
+    current_user: dict = Depends(require_permission("inventory", "view"))
+):
+    """Journal des mouvements de stock d'un article (du plus récent au plus ancien)"""
+    return await inventory_service.get_movements(inv_id, min(max(limit, 1), 1000))
+
+@api_router.get("/inventory/{inv_id}/stock-at")
+async def get_inventory_stock_at(
+    inv_id: str,
+    date: str,
+    current_user: dict = Depends(require_permission("inventory", "view"))
+):
+    """Stock d'un article à une date donnée (ISO), reconstitué depuis le journal des mouvements"""
+    try:
+        at = datetime.fromisoformat(date)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Date invalide (format ISO attendu)")
+    if at.tzinfo is None:
+        at = at.replace(tzinfo=timezone.utc)
+
+    item = await db.inventory.find_one({"_id": ObjectId(inv_id)}) if ObjectId.is_valid(inv_id) else None
+    if not item:
+        raise HTTPException(status_code=404, detail="Article non trouvé")
+
+    return {
+        "inventory_id": inv_id,
+        "date": at.isoformat(),
+        "quantite": await inventory_service.stock_at(item, at)
+    }
+
+
 # ==================== PREVENTIVE MAINTENANCE ROUTES ====================
 @api_router.get("/preventive-maintenance", response_model=List[PreventiveMaintenance])
 async def get_preventive_maintenance(current_user: dict = Depends(require_permission("preventiveMaintenance", "view"))):
@@ -1958,15 +2164,36 @@ async def create_preventive_maintenance(pm_create: PreventiveMaintenanceCreate,
     
     return PreventiveMaintenance(**pm)
 
+def stored_value(value):
+    """Valeur telle que MongoDB la conserve (dates en UTC naïf, à la milliseconde)"""
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value.replace(microsecond=value.microsecond // 1000 * 1000)
+    return value
+
 @api_router.put("/preventive-maintenance/{pm_id}", response_model=PreventiveMaintenance)
 async def update_preventive_maintenance(pm_id: str, pm_update: PreventiveMaintenanceUpdate, current_user: dict = Depends(require_permission("preventiveMaintenance", "edit"))):
     """Modifier une maintenance préventive"""
     try:
         update_data = {k: v for k, v in pm_update.model_dump().items() if v is not None}
+        update = {"$set": update_data}
+        
+        # Une nouvelle échéance ou fréquence devient l'ancre de la série. Le formulaire
+        # renvoie toujours les deux champs : comparer aux valeurs enregistrées
+        current = await db.preventive_maintenances.find_one(
+            {"_id": ObjectId(pm_id)},
+            {"prochaineMaintenance": 1, "frequence": 1}
+        )
+        if current and any(
+            field in update_data and stored_value(update_data[field]) != stored_value(current.get(field))
+            for field in ("prochaineMaintenance", "frequence")
+        ):
+            update["$unset"] = {"ancrageMaintenance": ""}
         
         await db.preventive_maintenances.update_one(
             {"_id": ObjectId(pm_id)},
-            {"$set": update_data}
+            update
         )
         
         pm = await db.preventive_maintenances.find_one({"_id": ObjectId(pm_id)})
@@ -1993,34 +2220,16 @@ async def delete_preventive_maintenance(pm_id: str, current_user: dict = Depends
         raise HTTPException(status_code=400, detail=str(e))
 
 def calculate_next_maintenance_date(current_date: datetime, frequency: str) -> datetime:
-    """Calcule la prochaine date de maintenance selon la fréquence"""
-    if frequency == "QUOTIDIENNE":
-        return current_date + timedelta(days=1)
-    elif frequency == "HEBDOMADAIRE":
-        return current_date + timedelta(weeks=1)
-    elif frequency == "MENSUELLE":
-        # Ajouter un mois
-        month = current_date.month
-        year = current_date.year
-        if month == 12:
-            month = 1
-            year += 1
-        else:
-            month += 1
-        return current_date.replace(year=year, month=month)
-    elif frequency == "ANNUELLE":
-        return current_date.replace(year=current_date.year + 1)
-    else:
-        # Par défaut, mensuelle
-        return current_date + timedelta(days=30)
+    """Calcule la prochaine date de maintenance selon la fréquence (fin de mois gérée)"""
+    return step_from(current_date, pm_frequency_step(frequency), 1)
 
 @api_router.post("/preventive-maintenance/check-and-execute")
 async def check_and_execute_due_maintenances(current_user: dict = Depends(get_current_admin_user)):
     """Vérifie et exécute MANUELLEMENT les maintenances échues (admin uniquement)"""
     try:
         logger.info(f"🔄 Vérification MANUELLE déclenchée par {current_user.get('email', 'Unknown')}")
-        await auto_check_preventive_maintenance()
-        return {"success": True, "message": "Vérification manuelle effectuée - Consultez les logs pour les détails"}
+        result = await auto_check_preventive_maintenance()
+        return {"success": True, "message": "Vérification manuelle effectuée", **result}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -2028,74 +2237,8 @@ async def check_and_execute_due_maintenances(current_user: dict = Depends(get_cu
 async def check_and_execute_due_maintenances_old(current_user: dict = Depends(get_current_admin_user)):
     """Version détaillée pour debug (admin uniquement)"""
     try:
-        today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-        
-        # Trouver toutes les maintenances actives dont la date est aujourd'hui ou passée
-        pm_list = await db.preventive_maintenances.find({
-            "statut": "ACTIF",
-            "prochaineMaintenance": {"$lte": today + timedelta(days=1)}
-        }).to_list(length=None)
-        
-        created_count = 0
-        updated_count = 0
-        errors = []
-        
-        for pm in pm_list:
-            try:
-                # Récupérer l'équipement
-                equipement = await db.equipments.find_one({"_id": ObjectId(pm["equipement_id"])})
-                
-                # Créer le bon de travail
-                wo_id = str(uuid.uuid4())
-                work_order = {
-                    "_id": ObjectId(),
-                    "id": wo_id,
-                    "numero": f"PM-{datetime.utcnow().strftime('%Y%m%d')}-{secrets.token_hex(3).upper()}",
-                    "titre": f"Maintenance préventive: {pm['titre']}",
-                    "description": f"Maintenance automatique générée depuis la planification préventive",
-                    "type": "PREVENTIF",
-                    "priorite": "NORMALE",
-                    "statut": "OUVERT",
-                    "equipement_id": pm["equipement_id"],
-                    "emplacement_id": equipement.get("emplacement_id") if equipement else None,
-                    "assigne_a_id": pm.get("assigne_a_id"),
-                    "tempsEstime": pm.get("duree"),
-                    "dateLimite": datetime.utcnow() + timedelta(days=7),
-                    "dateCreation": datetime.utcnow(),
-                    "createdBy": "system",
-                    "comments": [],
-                    "attachments": [],
-                    "historique": []
-                }
-                
-                await db.work_orders.insert_one(work_order)
-                created_count += 1
-                
-                # Calculer la prochaine date de maintenance
-                next_date = calculate_next_maintenance_date(pm["prochaineMaintenance"], pm["frequence"])
-                
-                # Mettre à jour la maintenance préventive
-                await db.preventive_maintenances.update_one(
-                    {"_id": pm["_id"]},
-                    {
-                        "$set": {
-                            "prochaineMaintenance": next_date,
-                            "derniereMaintenance": datetime.utcnow()
-                        }
-                    }
-                )
-                updated_count += 1
-                
-            except Exception as e:
-                errors.append(f"Erreur pour PM {pm.get('titre', 'Unknown')}: {str(e)}")
-        
-        return {
-            "success": True,
-            "workOrdersCreated": created_count,
-            "maintenancesUpdated": updated_count,
-            "errors": errors
-        }
-        
+        result = await auto_check_preventive_maintenance()
+        return {"success": True, **result}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -3593,6 +3736,13 @@ EXPORT_MODULES = {
     "purchase-history": "purchase_history"
 }
 
+# Modules importables diffusés sur le flux temps réel (type d'entité de realtime_service)
+IMPORT_REALTIME_ENTITIES = {
+    "work-orders": "work_order",
+    "intervention-requests": "intervention_request",
+    "surveillance-items": "surveillance",
+}
+
 @api_router.get("/export/{module}")
 async def export_data(
     module: str,
@@ -4222,6 +4372,18 @@ async def import_data(
                             if "actif" not in cleaned_item:
                                 cleaned_item["actif"] = True
                         
+                        elif current_module == "inventory":
+                            # Quantités numériques (journal des mouvements et état de stock)
+                            for num_field in ["quantite", "quantiteMin"]:
+                                if num_field in cleaned_item:
+                                    try:
+                                        value = cleaned_item[num_field]
+                                        if isinstance(value, str):
+                                            value = value.replace(',', '.').replace(' ', '')
+                                        cleaned_item[num_field] = int(float(value))
+                                    except:
+                                        cleaned_item[num_field] = 0
+                        
                         elif current_module == "meters":
                             # Champs obligatoires pour compteurs
                             if "actif" not in cleaned_item:
@@ -4251,12 +4413,14 @@ async def import_data(
                                     cleaned_item
                                 )
                                 module_stats["updated"] += 1
+                                movement = ({**cleaned_item, "_id": existing["_id"]}, existing.get("quantite"), MOVEMENT_ADJUSTMENT)
                             else:
                                 cleaned_item["_id"] = ObjectId(item_id)
                                 # Ajouter le champ id
                                 cleaned_item["id"] = item_id
                                 await db[collection_name].insert_one(cleaned_item)
                                 module_stats["inserted"] += 1
+                                movement = (cleaned_item, 0, MOVEMENT_CREATION)
                         except:
                             # Si l'ID n'est pas valide, insérer comme nouveau
                             if "_id" in cleaned_item:
@@ -4271,6 +4435,7 @@ async def import_data(
                             
                             await db[collection_name].insert_one(cleaned_item)
                             module_stats["inserted"] += 1
+                            movement = (cleaned_item, 0, MOVEMENT_CREATION)
                     else:
                         # Mode add
                         if "_id" in cleaned_item:
@@ -4285,6 +4450,12 @@ async def import_data(
                         
                         await db[collection_name].insert_one(cleaned_item)
                         module_stats["inserted"] += 1
+                        movement = (cleaned_item, 0, MOVEMENT_CREATION)
+                    
+                    # Tracer la quantité importée dans le journal des mouvements de stock
+                    if current_module == "inventory":
+                        stock_item, previous_quantity, movement_type = movement
+                        await inventory_service.record_adjustment(stock_item, previous_quantity, current_user, movement_type)
                 
                 except Exception as e:
                     module_stats["skipped"] += 1
@@ -4302,6 +4473,17 @@ async def import_data(
             
             logger.info(f"✅ Module '{current_module}' traité: {module_stats['inserted']} ajoutés, {module_stats['updated']} mis à jour, {module_stats['skipped']} ignorés")
         
+        # Les imports écrivent directement en base : recalculer l'état des stocks et tous les badges
+        if "inventory" in overall_stats["modules"]:
+            await inventory_service.refresh_stock_state()
+        badge_service.invalidate()
+        
+        # Prévenir les pages qui ne rafraîchissent ces données que par le flux temps réel
+        for imported_module, entity_type in IMPORT_REALTIME_ENTITIES.items():
+            stats = overall_stats["modules"].get(imported_module)
+            if stats and stats["inserted"] + stats["updated"]:
+                realtime_service.publish(entity_type, "updated", data={"imported_count": stats["inserted"] + stats["updated"]})
+        
         return overall_stats
     
     except HTTPException:
@@ -4391,12 +4573,21 @@ async def get_audit_logs(
     entity_type: Optional[str] = None,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
+    cursor: Optional[str] = None,
+    count: str = COUNT_ESTIMATED,
+    include_archives: bool = False,
     current_user: dict = Depends(get_current_admin_user)
 ):
     """
     Récupère les logs d'audit (admin uniquement)
     Supporte les filtres: user_id, action, entity_type, start_date, end_date
+    
+    Pagination : passer next_cursor de la réponse précédente dans cursor (skip reste accepté).
+    count : "estimated" (défaut), "exact" ou "none" pour ne pas calculer le total.
+    include_archives : continue dans les archives mensuelles des logs anciens.
     """
+    if count not in (COUNT_EXACT, COUNT_ESTIMATED, COUNT_NONE):
+        raise HTTPException(status_code=400, detail=f"Mode de comptage invalide: {count}")
     try:
         # Convertir les strings en enums si fournis
         action_enum = ActionType(action) if action else None
@@ -4413,16 +4604,23 @@ async def get_audit_logs(
             action=action_enum,
             entity_type=entity_type_enum,
             start_date=start_dt,
-            end_date=end_dt
+            end_date=end_dt,
+            cursor=cursor,
+            count=count,
+            include_archives=include_archives
         )
         
         return {
             "logs": logs,
             "total": total,
+            "total_estimated": count == COUNT_ESTIMATED,
             "skip": skip,
-            "limit": limit
+            "limit": limit,
+            "next_cursor": AuditService.encode_cursor(logs[-1]) if len(logs) == limit else None
         }
         
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Erreur lors de la récupération des logs d'audit: {e}")
         raise HTTPException(
@@ -4430,6 +4628,18 @@ async def get_audit_logs(
             detail="Erreur lors de la récupération des logs d'audit"
         )
 
+@api_router.get("/audit-logs/archives")
+async def get_audit_log_archives(current_user: dict = Depends(get_current_admin_user)):
+    """Archives mensuelles du journal d'audit (admin uniquement)"""
+    archives = await audit_service.archive.list_archives()
+    return {
+        "retention_months": AUDIT_RETENTION_MONTHS,
+        "archives": [
+            {"filename": archive["_id"], **{k: v for k, v in archive.items() if k != "_id"}}
+            for archive in archives
+        ]
+    }
+
 @api_router.get("/audit-logs/entity/{entity_type}/{entity_id}")
 async def get_entity_audit_history(
     entity_type: str,
@@ -4461,6 +4671,26 @@ async def get_entity_audit_history(
             detail="Erreur lors de la récupération de l'historique"
         )
 
+AUDIT_EXPORT_COLUMNS = ["Date/Heure", "Utilisateur", "Email", "Action", "Type", "Entité", "Détails"]
+
+def audit_logs_frame(logs: list) -> pd.DataFrame:
+    """Lignes d'export d'un lot de logs (horodatages convertis en heure de Paris sur toute la colonne)"""
+    batch = pd.DataFrame(logs)
+    timestamps = pd.to_datetime(batch["timestamp"], utc=True).dt.tz_convert("Europe/Paris")
+    return pd.DataFrame({
+        "Date/Heure": timestamps.dt.strftime("%d/%m/%Y %H:%M:%S"),
+        "Utilisateur": batch["user_name"],
+        "Email": batch["user_email"],
+        "Action": batch["action"],
+        "Type": batch["entity_type"],
+        "Entité": batch.get("entity_name", pd.Series(index=batch.index, dtype=object)).fillna(""),
+        "Détails": batch.get("details", pd.Series(index=batch.index, dtype=object)).fillna("")
+    }, columns=AUDIT_EXPORT_COLUMNS)
+
+def write_audit_xlsx_rows(sheet, frame: pd.DataFrame):
+    for row in frame.itertuples(index=False, name=None):
+        sheet.append(row)
+
 @api_router.get("/audit-logs/export")
 async def export_audit_logs(
     format: str = "csv",
@@ -4469,79 +4699,77 @@ async def export_audit_logs(
     entity_type: Optional[str] = None,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
+    include_archives: bool = False,
     current_user: dict = Depends(get_current_admin_user)
 ):
     """
     Exporte les logs d'audit en CSV ou Excel (admin uniquement)
+    
+    Export sans limite de volume : les logs sont lus par lots depuis la base (et les
+    archives si include_archives) et écrits au fil de l'eau, en mémoire constante.
     """
     try:
-        # Récupérer tous les logs avec filtres
         action_enum = ActionType(action) if action else None
         entity_type_enum = EntityType(entity_type) if entity_type else None
         start_dt = datetime.fromisoformat(start_date) if start_date else None
         end_dt = datetime.fromisoformat(end_date) if end_date else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    batches = audit_service.iter_log_batches(
+        user_id=user_id,
+        action=action_enum,
+        entity_type=entity_type_enum,
+        start_date=start_dt,
+        end_date=end_dt,
+        include_archives=include_archives
+    )
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    
+    if format.lower() == "csv":
+        async def csv_chunks():
+            # En-tête avec BOM : Excel reconnaît l'UTF-8
+            yield ("\ufeff" + ",".join(AUDIT_EXPORT_COLUMNS) + "\n").encode("utf-8")
+            try:
+                async for logs in batches:
+                    yield audit_logs_frame(logs).to_csv(index=False, header=False).encode("utf-8")
+            except Exception as e:
+                logger.error(f"Erreur lors de l'export des logs: {e}")
+                raise
         
-        logs, _ = await audit_service.get_logs(
-            skip=0,
-            limit=10000,  # Limite haute pour export
-            user_id=user_id,
-            action=action_enum,
-            entity_type=entity_type_enum,
-            start_date=start_dt,
-            end_date=end_dt
+        return StreamingResponse(
+            csv_chunks(),
+            media_type="text/csv",
+            headers={"Content-Disposition": f"attachment; filename=audit_logs_{stamp}.csv"}
         )
+    
+    # Excel : classeur en écriture seule (les lignes sont écrites au fil de l'eau dans
+    # un fichier temporaire), envoyé une fois fermé
+    tmp_path = None
+    try:
+        from openpyxl import Workbook
         
-        # Préparer les données pour l'export
-        paris_tz = pytz.timezone('Europe/Paris')
-        export_data = []
-        for log in logs:
-            # Convertir UTC vers Europe/Paris
-            timestamp_utc = log["timestamp"]
-            if timestamp_utc.tzinfo is None:
-                timestamp_utc = pytz.utc.localize(timestamp_utc)
-            timestamp_paris = timestamp_utc.astimezone(paris_tz)
-            
-            export_data.append({
-                "Date/Heure": timestamp_paris.strftime("%d/%m/%Y %H:%M:%S"),
-                "Utilisateur": log["user_name"],
-                "Email": log["user_email"],
-                "Action": log["action"],
-                "Type": log["entity_type"],
-                "Entité": log.get("entity_name", ""),
-                "Détails": log.get("details", "")
-            })
-        
-        df = pd.DataFrame(export_data)
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet("Audit Logs")
+        sheet.append(AUDIT_EXPORT_COLUMNS)
+        async for logs in batches:
+            await asyncio.to_thread(write_audit_xlsx_rows, sheet, audit_logs_frame(logs))
         
-        # Créer le fichier selon le format demandé
-        if format.lower() == "csv":
-            output = io.StringIO()
-            df.to_csv(output, index=False, encoding='utf-8-sig')
-            output.seek(0)
-            
-            return Response(
-                content=output.getvalue(),
-                media_type="text/csv",
-                headers={
-                    "Content-Disposition": f"attachment; filename=audit_logs_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-                }
-            )
-        else:  # Excel
-            output = io.BytesIO()
-            with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                df.to_excel(writer, index=False, sheet_name='Audit Logs')
-            output.seek(0)
-            
-            return Response(
-                content=output.getvalue(),
-                media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                headers={
-                    "Content-Disposition": f"attachment; filename=audit_logs_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-                }
-            )
+        fd, tmp_path = tempfile.mkstemp(suffix=".xlsx")
+        os.close(fd)
+        await asyncio.to_thread(workbook.save, tmp_path)
         
+        return FileResponse(
+            tmp_path,
+            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            filename=f"audit_logs_{stamp}.xlsx",
+            background=BackgroundTask(os.remove, tmp_path)
+        )
     except Exception as e:
         logger.error(f"Erreur lors de l'export des logs: {e}")
+        # Ne pas laisser de classeur partiel dans le répertoire temporaire
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
         raise HTTPException(
             status_code=500,
             detail="Erreur lors de l'export des logs"
@@ -4593,17 +4821,10 @@ async def add_work_order_comment(
                 part_data["custom_source"] = part.custom_source
             
             parts_used_list.append(part_data)
-            
-            # Si c'est une pièce d'inventaire, déduire du stock
-            if part.inventory_item_id:
-                inventory_item = await db.inventory.find_one({"_id": ObjectId(part.inventory_item_id)})
-                if inventory_item:
-                    new_quantity = inventory_item["quantite"] - part.quantity
-                    await db.inventory.update_one(
-                        {"_id": ObjectId(part.inventory_item_id)},
-                        {"$set": {"quantite": new_quantity}}
-                    )
-                    logger.info(f"Stock mis à jour: {part.inventory_item_name} - {part.quantity} unité(s) déduite(s)")
+        
+        # Déduire du stock les pièces d'inventaire (un seul bulk_write $inc + journal des mouvements)
+        if await inventory_service.consume_parts(parts_used_list, work_order, current_user):
+            badge_service.invalidate("inventory")
         
         # Mettre à jour l'ordre de travail
         if parts_used_list:
@@ -4623,6 +4844,7 @@ async def add_work_order_comment(
                 {"_id": ObjectId(work_order_id)},
                 {"$push": {"comments": new_comment}}
             )
+        realtime_service.publish("work_order", "updated", work_order_id)
         
         # Log dans l'audit
         details_text = f"Commentaire ajouté: {comment.text[:50]}..."
@@ -4687,23 +4909,17 @@ async def add_work_order_parts(
                 part_data["custom_source"] = part.custom_source
             
             parts_used_list.append(part_data)
-            
-            # Si c'est une pièce d'inventaire, déduire du stock
-            if part.inventory_item_id:
-                inventory_item = await db.inventory.find_one({"_id": ObjectId(part.inventory_item_id)})
-                if inventory_item:
-                    new_quantity = inventory_item["quantite"] - part.quantity
-                    await db.inventory.update_one(
-                        {"_id": ObjectId(part.inventory_item_id)},
-                        {"$set": {"quantite": new_quantity}}
-                    )
-                    logger.info(f"Stock mis à jour: {part.inventory_item_name} - {part.quantity} unité(s) déduite(s)")
+        
+        # Déduire du stock les pièces d'inventaire (un seul bulk_write $inc + journal des mouvements)
+        if await inventory_service.consume_parts(parts_used_list, work_order, current_user):
+            badge_service.invalidate("inventory")
         
         # Ajouter les pièces à l'ordre de travail (SANS commentaire)
         await db.work_orders.update_one(
             {"_id": ObjectId(work_order_id)},
             {"$push": {"parts_used": {"$each": parts_used_list}}}
         )
+        realtime_service.publish("work_order", "updated", work_order_id)
         
         # Log dans l'audit
         await audit_service.log_action(
@@ -4874,6 +5090,189 @@ async def delete_meter(meter_id: str, current_user: dict = Depends(require_permi
 
 # ==================== METER READINGS (RELEVÉS) ENDPOINTS ====================
 
+def compute_reading_consumption(reading: dict, previous: Optional[dict], meter: dict):
+    """Calcule la consommation et le coût d'un relevé à partir du relevé précédent"""
+    if previous:
+        consommation = reading["valeur"] - previous["valeur"]
+        reading["consommation"] = max(0, consommation)  # Éviter les valeurs négatives
+        
+        # Calculer le coût si prix unitaire disponible
+        prix = reading.get("prix_unitaire") or meter.get("prix_unitaire")
+        if prix and reading["consommation"]:
+            reading["cout"] = reading["consommation"] * prix
+        else:
+            reading["cout"] = None
+    else:
+        reading["consommation"] = 0
+        reading["cout"] = 0
+
+# Colonnes numériques d'un lot de relevés CSV (virgule décimale convertie pour les fichiers en ';')
+BULK_READING_DECIMAL_COLUMNS = ["valeur", "prix_unitaire", "abonnement_mensuel"]
+
+def parse_bulk_readings_payload(content: bytes, content_type: str, filename: str = "") -> List[dict]:
+    """Décode un lot de relevés au format JSON (tableau), NDJSON ou CSV"""
+    content_type = (content_type or "").lower()
+    filename = (filename or "").lower()
+    
+    if "csv" in content_type or filename.endswith(".csv"):
+        # Séparateur détecté sur l'en-tête (exports SCADA en ',' ou ';')
+        header = content.decode("utf-8-sig", errors="replace").split("\n", 1)[0]
+        sep = ";" if header.count(";") > header.count(",") else ","
+        df = pd.read_csv(io.BytesIO(content), sep=sep, dtype=str, encoding="utf-8-sig")
+        df.columns = [str(c).strip() for c in df.columns]
+        if sep == ";":
+            # Exports français : virgule décimale et espaces de milliers (ex: "1 234,5")
+            for column in BULK_READING_DECIMAL_COLUMNS:
+                if column in df:
+                    df[column] = df[column].str.replace(r"[\s\u00a0]", "", regex=True).str.replace(",", ".", regex=False)
+        df = df.astype(object).where(pd.notna(df), None)
+        return [
+            {k: v for k, v in row.items() if v is not None and str(v).strip() != ""}
+            for row in df.to_dict(orient="records")
+        ]
+    
+    text = content.decode("utf-8-sig")
+    if "ndjson" in content_type or "jsonl" in content_type or filename.endswith((".ndjson", ".jsonl")):
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+    
+    payload = json.loads(text) if text.strip() else []
+    if isinstance(payload, dict):
+        payload = payload.get("readings", [])
+    if not isinstance(payload, list):
+        raise ValueError("Le corps doit être un tableau de relevés")
+    return payload
+
+@api_router.post("/meters/readings/bulk")
+async def create_readings_bulk(
+    request: Request,
+    meter_id: Optional[str] = None,
+    current_user: dict = Depends(require_permission("meters", "edit"))
+):
+    """Importer en masse des relevés pour plusieurs compteurs (JSON, NDJSON ou CSV)
+    
+    Les relevés sont triés par date pour chaque compteur. Un relevé inséré avant
+    des relevés existants entraîne le recalcul de leur consommation et de leur coût.
+    Le paramètre meter_id sert de compteur par défaut pour les lignes qui n'en précisent pas.
+    """
+    try:
+        content_type = request.headers.get("content-type", "")
+        if content_type.startswith("multipart/form-data"):
+            form = await request.form()
+            upload = form.get("file")
+            if upload is None:
+                raise HTTPException(status_code=400, detail="Fichier manquant")
+            rows = parse_bulk_readings_payload(await upload.read(), upload.content_type, upload.filename)
+        else:
+            rows = parse_bulk_readings_payload(await request.body(), content_type)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Format de lot invalide: {str(e)}")
+    
+    stats = {"total": len(rows), "inserted": 0, "recomputed": 0, "skipped": 0, "meters": 0, "errors": []}
+    
+    # Valider toutes les lignes et les regrouper par compteur
+    by_meter = {}
+    for line, row in enumerate(rows, start=1):
+        try:
+            if meter_id and not row.get("meter_id"):
+                row["meter_id"] = meter_id
+            item = MeterReadingBulkItem(**row)
+        except Exception as e:
+            stats["skipped"] += 1
+            stats["errors"].append(f"Ligne {line}: {str(e)[:200]}")
+            continue
+        
+        # Les dates Mongo sont relues en UTC naïf : normaliser pour pouvoir trier
+        date_releve = item.date_releve
+        if date_releve.tzinfo is not None:
+            date_releve = date_releve.astimezone(timezone.utc).replace(tzinfo=None)
+        by_meter.setdefault(item.meter_id, []).append((line, date_releve, item))
+    
+    if not by_meter:
+        return stats
+    
+    meters = {
+        m["id"]: m
+        async for m in db.meters.find({"id": {"$in": list(by_meter.keys())}})
+    }
+    
+    now = datetime.utcnow()
+    created_by_name = f"{current_user.get('prenom', '')} {current_user.get('nom', '')}"
+    new_docs = []
+    updates = []
+    
+    for mid, entries in by_meter.items():
+        meter = meters.get(mid)
+        if not meter:
+            stats["skipped"] += len(entries)
+            stats["errors"].extend(f"Ligne {line}: compteur {mid} non trouvé" for line, _, _ in entries)
+            continue
+        stats["meters"] += 1
+        
+        entries.sort(key=lambda e: e[1])
+        first_date = entries[0][1]
+        
+        # Relevé précédant le lot et relevés existants à recalculer (vide si le lot est chronologique)
+        previous = await db.meter_readings.find_one(
+            {"meter_id": mid, "date_releve": {"$lt": first_date}},
+            sort=[("date_releve", -1)]
+        )
+        existing = await db.meter_readings.find(
+            {"meter_id": mid, "date_releve": {"$gte": first_date}}
+        ).sort("date_releve", 1).to_list(length=None)
+        
+        batch_docs = []
+        for _, date_releve, item in entries:
+            reading_data = item.model_dump()
+            reading_data["date_releve"] = date_releve
+            reading_data["id"] = str(uuid.uuid4())
+            reading_data["created_by"] = current_user["id"]
+            reading_data["created_by_name"] = created_by_name
+            reading_data["meter_nom"] = meter["nom"]
+            reading_data["date_creation"] = now
+            batch_docs.append(reading_data)
+        
+        # Fusion chronologique : à date égale, le relevé existant reste en premier
+        timeline = sorted(
+            [(doc["date_releve"], 0, doc) for doc in existing] + [(doc["date_releve"], 1, doc) for doc in batch_docs],
+            key=lambda t: (t[0], t[1])
+        )
+        
+        prev = previous
+        for _, is_new, doc in timeline:
+            if is_new:
+                compute_reading_consumption(doc, prev, meter)
+                if not doc.get("prix_unitaire"):
+                    doc["prix_unitaire"] = meter.get("prix_unitaire")
+                if not doc.get("abonnement_mensuel"):
+                    doc["abonnement_mensuel"] = meter.get("abonnement_mensuel")
+            else:
+                before = (doc.get("consommation"), doc.get("cout"))
+                compute_reading_consumption(doc, prev, meter)
+                if (doc["consommation"], doc["cout"]) != before:
+                    updates.append(UpdateOne(
+                        {"_id": doc["_id"]},
+                        {"$set": {"consommation": doc["consommation"], "cout": doc["cout"]}}
+                    ))
+            prev = doc
+        
+        new_docs.extend(batch_docs)
+    
+    try:
+        if new_docs:
+            result = await db.meter_readings.insert_many(new_docs, ordered=False)
+            stats["inserted"] = len(result.inserted_ids)
+        if updates:
+            result = await db.meter_readings.bulk_write(updates, ordered=False)
+            stats["recomputed"] = result.modified_count
+    except Exception as e:
+        logger.error(f"Erreur import en masse des relevés: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    logger.info(f"✅ Import relevés: {stats['inserted']} ajoutés, {stats['recomputed']} recalculés, {stats['skipped']} ignorés")
+    return stats
+
 @api_router.post("/meters/{meter_id}/readings", response_model=MeterReading, status_code=201)
 async def create_reading(
     meter_id: str,
@@ -4902,18 +5301,8 @@ async def create_reading(
         reading_data["meter_nom"] = meter["nom"]
         reading_data["date_creation"] = datetime.utcnow()
         
-        # Calculer la consommation
-        if last_reading:
-            consommation = reading_data["valeur"] - last_reading["valeur"]
-            reading_data["consommation"] = max(0, consommation)  # Éviter les valeurs négatives
-            
-            # Calculer le coût si prix unitaire disponible
-            prix = reading_data.get("prix_unitaire") or meter.get("prix_unitaire")
-            if prix and reading_data["consommation"]:
-                reading_data["cout"] = reading_data["consommation"] * prix
-        else:
-            reading_data["consommation"] = 0
-            reading_data["cout"] = 0
+        # Calculer la consommation et le coût
+        compute_reading_consumption(reading_data, last_reading, meter)
         
         # Si pas de prix spécifié, utiliser celui du compteur
         if not reading_data.get("prix_unitaire"):
@@ -5063,6 +5452,13 @@ async def delete_reading(reading_id: str, current_user: dict = Depends(require_p
 
 # ==================== INTERVENTION REQUESTS (DEMANDES D'INTERVENTION) ENDPOINTS ====================
 
+async def compute_intervention_badge_counts() -> dict:
+    """Compteur du badge demandes d'intervention : demandes non converties en ordre de travail"""
+    en_attente = await db.intervention_requests.count_documents({"work_order_id": None})
+    return {"en_attente": en_attente}
+
+badge_service.register("intervention_requests", "interventionRequests", compute_intervention_badge_counts)
+
 @api_router.post("/intervention-requests", response_model=InterventionRequest, status_code=201)
 async def create_intervention_request(
     request: InterventionRequestCreate,
@@ -5094,6 +5490,8 @@ async def create_intervention_request(
                 request_data["emplacement"] = {"id": location["id"], "nom": location["nom"]}
         
         await db.intervention_requests.insert_one(request_data)
+        badge_service.invalidate("intervention_requests")
+        realtime_service.publish("intervention_request", "created", request_id)
         
         # Audit log
         await audit_service.log_action(
@@ -5164,6 +5562,7 @@ async def update_intervention_request(
             update_data["emplacement"] = None
     
     await db.intervention_requests.update_one({"id": request_id}, {"$set": update_data})
+    realtime_service.publish("intervention_request", "updated", request_id)
     
     # Récupérer la demande mise à jour
     updated_req = await db.intervention_requests.find_one({"id": request_id})
@@ -5190,6 +5589,8 @@ async def delete_intervention_request(request_id: str, current_user: dict = Depe
         raise HTTPException(status_code=404, detail="Demande non trouvée")
     
     await db.intervention_requests.delete_one({"id": request_id})
+    badge_service.invalidate("intervention_requests")
+    realtime_service.publish("intervention_request", "deleted", request_id)
     
     # Audit log
     await audit_service.log_action(
@@ -5231,8 +5632,7 @@ async def convert_to_work_order(
         work_order_id = str(uuid.uuid4())
         
         # Générer le numéro d'ordre (comme pour les créations normales)
-        count = await db.work_orders.count_documents({})
-        numero = str(5800 + count + 1)
+        numero = str(await counter_service.next_value("work_orders"))
         
         # Utiliser la date limite fournie ou celle de la demande
         date_limite_ordre = None
@@ -5288,9 +5688,11 @@ async def convert_to_work_order(
                 "converted_by": current_user["id"]
             }}
         )
+        badge_service.invalidate("intervention_requests")
         
-        # Émettre un événement pour rafraîchir les notifications
-        # Note: Dans une vraie application, on utiliserait des WebSockets
+        # Notifier les navigateurs connectés (flux /api/events/stream)
+        realtime_service.publish("work_order", "created", work_order_id, {"numero": numero})
+        realtime_service.publish("intervention_request", "updated", request_id, {"work_order_id": work_order_id})
         
         return {
             "message": "Demande convertie en ordre de travail avec succès",
@@ -5487,8 +5889,7 @@ async def convert_to_improvement(
             raise HTTPException(status_code=400, detail="Cette demande a déjà été convertie")
         
         improvement_id = str(uuid.uuid4())
-        count = await db.improvements.count_documents({})
-        numero = str(7000 + count + 1)
+        numero = str(await counter_service.next_value("improvements"))
         
         date_limite_imp = None
         if date_limite:
@@ -5565,11 +5966,66 @@ async def convert_to_improvement(
         logger.error(f"Erreur conversion demande: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Pièces jointes génériques (demandes d'amélioration, améliorations) : documents identifiés par "id"
+async def upload_attachment_generic(entity_id: str, file: Optional[UploadFile], collection: str, current_user: dict, upload_id: Optional[str] = None):
+    """Enregistre une pièce jointe (stockage par empreinte) et l'ajoute à attachments"""
+    try:
+        stored = await blob_store.store_upload(file, upload_id, current_user["id"], max_size=MAX_FILE_SIZE)
+        
+        attachment = {
+            "id": str(uuid.uuid4()),
+            "filename": stored["filename"],
+            "original_filename": stored["original_filename"],
+            "size": stored["size"],
+            "sha256": stored["sha256"],
+            "storage": stored["storage"],
+            "mime_type": stored["mime_type"] or mimetypes.guess_type(stored["original_filename"])[0] or "application/octet-stream",
+            "uploaded_at": datetime.utcnow(),
+            "uploaded_by": current_user.get("id")
+        }
+        
+        await db[collection].update_one(
+            {"id": entity_id},
+            {"$push": {"attachments": attachment}}
+        )
+        preview_service.schedule(stored["sha256"], attachment["mime_type"], sha256=stored["sha256"])
+        
+        return {**attachment, "thumbnail_url": thumbnail_url(attachment["id"], attachment["mime_type"])}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Erreur upload pièce jointe ({collection}): {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def download_attachment_generic(request: Request, entity_id: str, attachment_ref: str, collection: str):
+    """Renvoie une pièce jointe identifiée par son id ou son nom de fichier"""
+    entity = await db[collection].find_one({"id": entity_id}, {"attachments": 1})
+    if not entity:
+        raise HTTPException(status_code=404, detail="Élément non trouvé")
+    
+    attachment = next(
+        (att for att in entity.get("attachments") or [] if attachment_ref in (att.get("id"), att.get("filename"))),
+        None
+    )
+    if not attachment:
+        raise HTTPException(status_code=404, detail="Pièce jointe non trouvée")
+    
+    if attachment.get("storage") == STORAGE_BLOB:
+        return await blob_store.response(request, attachment["sha256"], attachment["original_filename"], attachment["mime_type"])
+    
+    return await send_file(
+        request,
+        UPLOAD_DIR.parent / collection / attachment["filename"],
+        attachment["original_filename"],
+        attachment["mime_type"]
+    )
+
 # Attachments et Comments pour Improvement Requests
 @api_router.post("/improvement-requests/{request_id}/attachments")
 async def upload_improvement_request_attachment(
     request_id: str,
-    file: UploadFile = File(...),
+    file: UploadFile = File(None),
+    upload_id: Optional[str] = None,
     current_user: dict = Depends(require_permission("improvementRequests", "edit"))
 ):
     """Upload fichier pour une demande d'amélioration"""
@@ -5577,12 +6033,12 @@ async def upload_improvement_request_attachment(
     if not req:
         raise HTTPException(status_code=404, detail="Demande non trouvée")
     
-    return await upload_attachment_generic(request_id, file, "improvement_requests", current_user)
+    return await upload_attachment_generic(request_id, file, "improvement_requests", current_user, upload_id)
 
 @api_router.get("/improvement-requests/{request_id}/attachments/{filename}")
-async def download_improvement_request_attachment(request_id: str, filename: str, current_user: dict = Depends(require_permission("improvementRequests", "view"))):
+async def download_improvement_request_attachment(request_id: str, filename: str, request: Request, current_user: dict = Depends(require_permission("improvementRequests", "view"))):
     """Télécharger un fichier d'une demande d'amélioration"""
-    return await download_attachment_generic(request_id, filename, "improvement_requests")
+    return await download_attachment_generic(request, request_id, filename, "improvement_requests")
 
 @api_router.post("/improvement-requests/{request_id}/comments")
 async def add_improvement_request_comment(
@@ -5623,7 +6079,8 @@ async def get_improvement_request_comments(request_id: str, current_user: dict =
 @api_router.post("/improvements/{imp_id}/attachments")
 async def upload_improvement_attachment(
     imp_id: str,
-    file: UploadFile = File(...),
+    file: UploadFile = File(None),
+    upload_id: Optional[str] = None,
     current_user: dict = Depends(require_permission("improvements", "edit"))
 ):
     """Upload fichier pour une amélioration"""
@@ -5631,12 +6088,12 @@ async def upload_improvement_attachment(
     if not imp:
         raise HTTPException(status_code=404, detail="Amélioration non trouvée")
     
-    return await upload_attachment_generic(imp_id, file, "improvements", current_user)
+    return await upload_attachment_generic(imp_id, file, "improvements", current_user, upload_id)
 
 @api_router.get("/improvements/{imp_id}/attachments/{filename}")
-async def download_improvement_attachment(imp_id: str, filename: str, current_user: dict = Depends(require_permission("improvements", "view"))):
+async def download_improvement_attachment(imp_id: str, filename: str, request: Request, current_user: dict = Depends(require_permission("improvements", "view"))):
     """Télécharger un fichier d'une amélioration"""
-    return await download_attachment_generic(imp_id, filename, "improvements")
+    return await download_attachment_generic(request, imp_id, filename, "improvements")
 
 # Comments pour Improvements
 @api_router.post("/improvements/{imp_id}/comments")
@@ -5761,8 +6218,7 @@ async def get_improvement(imp_id: str, current_user: dict = Depends(require_perm
 @api_router.post("/improvements", response_model=Improvement)
 async def create_improvement(imp_create: ImprovementCreate, current_user: dict = Depends(require_permission("improvements", "edit"))):
     """Créer une nouvelle amélioration"""
-    count = await db.improvements.count_documents({})
-    numero = str(7000 + count + 1)
+    numero = str(await counter_service.next_value("improvements"))
     
     improvement_id = str(uuid.uuid4())
     improvement_data = imp_create.model_dump()
@@ -6103,23 +6559,32 @@ async def get_current_version():
 
 
 # Import surveillance routes
-from surveillance_routes import router as surveillance_router, init_surveillance_routes
+from surveillance_routes import router as surveillance_router, init_surveillance_routes, ensure_surveillance_indexes, rollover_due_controls
 
 # Initialize surveillance routes with database and audit service
-init_surveillance_routes(db, audit_service)
+init_surveillance_routes(db, audit_service, badge_service)
 
 # Include surveillance routes
 api_router.include_router(surveillance_router)
 
 # Import presqu'accident routes
-from presqu_accident_routes import router as presqu_accident_router, init_presqu_accident_routes
+from presqu_accident_routes import router as presqu_accident_router, init_presqu_accident_routes, ensure_presqu_accident_indexes
 
 # Initialize presqu'accident routes with database and audit service
-init_presqu_accident_routes(db, audit_service)
+init_presqu_accident_routes(db, audit_service, badge_service)
 
 # Include presqu'accident routes
 api_router.include_router(presqu_accident_router)
 
+# Import planning forecast routes
+from planning_routes import router as planning_router, init_planning_routes
+
+# Initialize planning routes with database
+init_planning_routes(db)
+
+# Include planning routes
+api_router.include_router(planning_router)
+
 # Import documentations routes
 from documentations_routes import router as documentations_router, init_documentations_routes
 from ssh_routes import router as ssh_router
@@ -6129,7 +6594,7 @@ from tailscale_routes import router as tailscale_router
 from autorisation_routes import router as autorisation_router
 
 # Initialize documentations routes with database and audit service
-init_documentations_routes(db, audit_service)
+init_documentations_routes(db, audit_service, counter_service)
 
 # Include documentations routes
 api_router.include_router(documentations_router)
@@ -6147,9 +6612,92 @@ api_router.include_router(demande_arret_router)
 from manual_routes import router as manual_router
 api_router.include_router(manual_router)
 
+# Uploads par morceaux (gros fichiers, reprise après coupure)
+from upload_routes import router as upload_router
+api_router.include_router(upload_router)
+
+# ==================== ÉVÉNEMENTS TEMPS RÉEL ====================
+
+@api_router.get("/events/stream")
+async def stream_events(request: Request, token: str):
+    """
+    Flux Server-Sent Events des changements (ordres de travail, demandes d'intervention,
+    surveillance, demandes d'arrêt), filtré selon les permissions de l'utilisateur.
+    
+    EventSource ne permet pas d'en-tête Authorization : le token JWT est passé en paramètre.
+    """
+    user = await get_user_from_token(token)
+    if user is None:
+        raise HTTPException(status_code=401, detail="Token invalide ou expiré")
+    
+    return StreamingResponse(
+        realtime_service.stream(user, request, lambda: get_user_from_token(token)),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # Désactiver le buffering nginx
+        }
+    )
+
+# ==================== BADGES DU HEADER ====================
+
+# Échéances dépassées par module de permission : (collection, champ d'échéance, filtre des
+# éléments encore ouverts). Une échéance du jour compte déjà comme dépassée.
+OVERDUE_SOURCES = {
+    "workOrders": ("work_orders", "dateLimite", {"statut": {"$nin": ["TERMINE", "ANNULE"]}}),
+    "improvements": ("improvements", "dateLimite", {"statut": {"$nin": ["TERMINE", "ANNULE"]}}),
+    "interventionRequests": ("intervention_requests", "date_limite_desiree", {"statut": {"$nin": ["TERMINE", "ANNULE"]}}),
+    "improvementRequests": ("improvement_requests", "date_limite_desiree", {"statut": {"$nin": ["TERMINE", "ANNULE"]}}),
+    "preventiveMaintenance": ("preventive_maintenances", "prochaineMaintenance", {"statut": "ACTIF"}),
+}
+
+# Les routes d'écriture de ces modules n'invalident pas les compteurs : durée de vie courte
+OVERDUE_BADGE_MAX_AGE = 60  # secondes
+
+
+def overdue_badge_counter(collection: str, field: str, open_filter: dict):
+    """Fonction de calcul du nombre d'échéances dépassées d'une collection"""
+    async def compute() -> dict:
+        tomorrow = datetime.now(timezone.utc).replace(tzinfo=None, hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+        count = await db[collection].count_documents({**open_filter, field: {"$lt": tomorrow}})
+        return {"count": count}
+    return compute
+
+for overdue_module, overdue_source in OVERDUE_SOURCES.items():
+    badge_service.register(
+        f"overdue_{overdue_module}", overdue_module, overdue_badge_counter(*overdue_source), OVERDUE_BADGE_MAX_AGE
+    )
+
+@api_router.get("/badges")
+async def get_badges(current_user: dict = Depends(get_current_user)):
+    """Tous les compteurs des badges du header en un seul appel (valeurs en cache, filtrées par permission)"""
+    return await badge_service.get_for_user(current_user)
+
 # Include the router in the main app (MUST be after all endpoint definitions)
 app.include_router(api_router)
 
+@app.on_event("startup")
+async def ensure_indexes():
+    """Crée les index MongoDB utilisés par les requêtes fréquentes"""
+    try:
+        await db.meter_readings.create_index([("meter_id", 1), ("date_releve", 1)])
+        await db.intervention_requests.create_index("work_order_id")
+        await db.documents.create_index("pole_id")
+        await db.bons_travail.create_index("pole_id")
+        await db.work_orders.create_index(
+            "pm_occurrence",
+            unique=True,
+            partialFilterExpression={"pm_occurrence": {"$exists": True}}
+        )
+        await ensure_surveillance_indexes()
+        await ensure_presqu_accident_indexes()
+        await inventory_service.ensure_indexes()
+        await blob_store.ensure_indexes()
+        await audit_service.ensure_indexes()
+        logger.info("✅ Index MongoDB vérifiés")
+    except Exception as e:
+        logger.error(f"❌ Erreur lors de la création des index: {str(e)}")
+
 @app.on_event("startup")
 async def startup_scheduler():
     """Démarre le scheduler au démarrage de l'application"""
@@ -6182,11 +6730,62 @@ async def startup_scheduler():
             replace_existing=True
         )
         
+        # Repasser en "à planifier" les contrôles de surveillance entrés en période de rappel
+        scheduler.add_job(
+            rollover_due_controls,
+            CronTrigger(minute=5),  # Toutes les heures à HH:05
+            id='rollover_surveillance_due_dates',
+            name='Bascule des contrôles surveillance en période de rappel',
+            next_run_time=datetime.now(),  # Premier passage dès le démarrage
+            replace_existing=True
+        )
+        
+        # Récapitulatif des stocks bas aux gestionnaires de l'inventaire à 7h00
+        scheduler.add_job(
+            inventory_service.send_low_stock_digest,
+            CronTrigger(hour=7, minute=0),  # Tous les jours à 7h00
+            id='low_stock_digest',
+            name='Récapitulatif des stocks bas',
+            replace_existing=True
+        )
+        
+        # Nettoyage des uploads par morceaux abandonnés à 3h00
+        scheduler.add_job(
+            upload_service.cleanup_stale_sessions,
+            CronTrigger(hour=3, minute=0),  # Tous les jours à 3h00
+            id='cleanup_upload_sessions',
+            name='Nettoyage des uploads abandonnés',
+            replace_existing=True
+        )
+        
+        # Archivage du journal d'audit le 1er de chaque mois à 3h30
+        scheduler.add_job(
+            audit_service.archive.archive_old_logs,
+            CronTrigger(day=1, hour=3, minute=30),  # Le 1er du mois à 3h30
+            id='audit_log_archive',
+            name="Archivage du journal d'audit",
+            replace_existing=True
+        )
+        
+        # Suppression des pièces jointes orphelines à 4h00
+        scheduler.add_job(
+            blob_store.gc,
+            CronTrigger(hour=4, minute=0),  # Tous les jours à 4h00
+            id='blob_store_gc',
+            name='Nettoyage des pièces jointes orphelines',
+            replace_existing=True
+        )
+        
         scheduler.start()
         logger.info("✅ Scheduler démarré:")
         logger.info("   - Vérification maintenances préventives: tous les jours à 00h00")
         logger.info("   - Vérification mises à jour: tous les jours à 01h00")
         logger.info("   - Vérification demandes expirées: tous les jours à 02h00")
+        logger.info("   - Échéances plan de surveillance: toutes les heures à HH:05")
+        logger.info("   - Nettoyage uploads abandonnés: tous les jours à 03h00")
+        logger.info(f"   - Archivage journal d'audit (> {AUDIT_RETENTION_MONTHS} mois): le 1er du mois à 03h30")
+        logger.info("   - Pièces jointes orphelines: tous les jours à 04h00")
+        logger.info("   - Récapitulatif stocks bas: tous les jours à 07h00")
         
     except Exception as e:
         logger.error(f"❌ Erreur lors du démarrage du scheduler: {str(e)}")
@@ -6200,3 +6799,12 @@ async def shutdown_services():
     except Exception as e:
         logger.error(f"❌ Erreur lors de l'arrêt du scheduler: {str(e)}")
     
+    worker_pool.shutdown()
+    
+    # Écrire les logs d'audit encore en file
+    try:
+        await AuditService.shutdown_all()
+        logger.info("✅ Journal d'audit vidé")
+    except Exception as e:
+        logger.error(f"❌ Erreur lors de l'écriture des derniers logs d'audit: {str(e)}")
+    
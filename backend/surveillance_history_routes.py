@@ -1,12 +1,15 @@
-from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form
+from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form, Request
 from pydantic import BaseModel
 from typing import List, Optional
 import logging
 import uuid
-from datetime import datetime, timezone, timedelta
+from datetime import datetime, timezone
 from dependencies import get_current_user, db
+from recurrence import periodicite_step, step_from
+from file_responder import send_file
+from blob_store import blob_store, STORAGE_BLOB
+from preview_service import preview_service
 import os
-import shutil
 
 router = APIRouter(prefix="/surveillance-history", tags=["Surveillance History"])
 logger = logging.getLogger(__name__)
@@ -67,24 +70,21 @@ async def create_history_entry(
         entry_id = str(uuid.uuid4())
         saved_files = []
         
-        # Sauvegarder les fichiers uploadés
+        # Sauvegarder les fichiers uploadés (stockage par empreinte, dédupliqué)
         if fichiers:
             for file in fichiers:
                 if file.filename:
-                    file_id = str(uuid.uuid4())
-                    file_ext = os.path.splitext(file.filename)[1]
-                    file_path = os.path.join(UPLOAD_DIR, f"{file_id}{file_ext}")
-                    
-                    with open(file_path, "wb") as buffer:
-                        shutil.copyfileobj(file.file, buffer)
+                    stored = await blob_store.store_upload(file, None, current_user.get("id"))
                     
                     saved_files.append({
-                        "id": file_id,
-                        "nom": file.filename,
-                        "chemin": file_path,
-                        "taille": os.path.getsize(file_path),
-                        "type": file.content_type
+                        "id": str(uuid.uuid4()),
+                        "nom": stored["original_filename"],
+                        "sha256": stored["sha256"],
+                        "storage": stored["storage"],
+                        "taille": stored["size"],
+                        "type": stored["mime_type"]
                     })
+                    preview_service.schedule(stored["sha256"], stored["mime_type"], sha256=stored["sha256"])
         
         new_entry = {
             "id": entry_id,
@@ -150,6 +150,7 @@ async def get_control_stats(
 @router.get("/file/{file_id}")
 async def download_history_file(
     file_id: str,
+    request: Request,
     current_user: dict = Depends(get_current_user)
 ):
     """
@@ -169,16 +170,19 @@ async def download_history_file(
         if not file_info:
             raise HTTPException(status_code=404, detail="Fichier non trouvé")
         
-        file_path = file_info["chemin"]
-        
-        if not os.path.exists(file_path):
-            raise HTTPException(status_code=404, detail="Fichier physique non trouvé")
-        
-        from fastapi.responses import FileResponse
-        return FileResponse(
-            file_path,
-            media_type=file_info.get("type", "application/octet-stream"),
-            filename=file_info["nom"]
+        if file_info.get("storage") == STORAGE_BLOB:
+            return await blob_store.response(
+                request,
+                file_info["sha256"],
+                file_info["nom"],
+                file_info.get("type", "application/octet-stream")
+            )
+        
+        return await send_file(
+            request,
+            file_info["chemin"],
+            file_info["nom"],
+            file_info.get("type", "application/octet-stream")
         )
     
     except HTTPException:
@@ -191,48 +195,4 @@ def calculate_next_control_date(current_date: datetime, periodicite: str) -> dat
     """
     Calculer la prochaine date de contrôle selon la périodicité
     """
-    periodicite_lower = periodicite.lower()
-    
-    if "mensuel" in periodicite_lower or "mois" in periodicite_lower:
-        # Extraire le nombre de mois
-        if "6" in periodicite_lower:
-            months = 6
-        elif "3" in periodicite_lower or "trimestriel" in periodicite_lower:
-            months = 3
-        else:
-            months = 1
-        
-        # Ajouter les mois
-        new_month = current_date.month + months
-        new_year = current_date.year
-        
-        while new_month > 12:
-            new_month -= 12
-            new_year += 1
-        
-        # Gérer les jours invalides (ex: 31 février)
-        try:
-            next_date = current_date.replace(year=new_year, month=new_month)
-        except ValueError:
-            # Si le jour n'existe pas dans le nouveau mois, prendre le dernier jour du mois
-            import calendar
-            last_day = calendar.monthrange(new_year, new_month)[1]
-            next_date = current_date.replace(year=new_year, month=new_month, day=last_day)
-        
-        return next_date
-    
-    elif "annuel" in periodicite_lower or "an" in periodicite_lower:
-        # Ajouter 1 an
-        return current_date.replace(year=current_date.year + 1)
-    
-    elif "semaine" in periodicite_lower or "hebdo" in periodicite_lower:
-        # Ajouter 7 jours
-        return current_date + timedelta(days=7)
-    
-    elif "jour" in periodicite_lower or "quotidien" in periodicite_lower:
-        # Ajouter 1 jour
-        return current_date + timedelta(days=1)
-    
-    else:
-        # Par défaut, ajouter 30 jours
-        return current_date + timedelta(days=30)
+    return step_from(current_date, periodicite_step(periodicite), 1)
@@ -1,11 +1,11 @@
 """
 Routes API pour le Plan de Surveillance
 """
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Request
 from typing import List, Optional
 from datetime import datetime, timezone, timedelta
 from pathlib import Path
-import uuid
+from pymongo import UpdateOne
 import logging
 
 from models import (
@@ -19,6 +19,10 @@ from models import (
 )
 from dependencies import get_current_user, get_current_admin_user
 from audit_service import AuditService
+import upload_service
+from realtime_service import realtime_service
+from csv_import import read_import_file, insert_chunks, import_result, report_path
+from file_responder import send_file
 
 logger = logging.getLogger(__name__)
 
@@ -27,12 +31,107 @@ router = APIRouter(prefix="/surveillance", tags=["surveillance"])
 # Variables globales (seront injectées depuis server.py)
 db = None
 audit_service = None
+badge_service = None
 
-def init_surveillance_routes(database, audit_svc):
-    """Initialise les routes avec la connexion DB et audit service"""
-    global db, audit_service
+def init_surveillance_routes(database, audit_svc, badge_svc):
+    """Initialise les routes avec la connexion DB, l'audit service et le service des badges"""
+    global db, audit_service, badge_service
     db = database
     audit_service = audit_svc
+    badge_service = badge_svc
+    badge_service.register("surveillance", "surveillance", compute_badge_counts)
+
+
+# ==================== Dates typées ====================
+
+# Statuts pour lesquels un contrôle reste à faire (tout sauf REALISE)
+OPEN_STATUSES = [SurveillanceItemStatus.PLANIFIER.value, SurveillanceItemStatus.PLANIFIE.value]
+
+ANOMALIE_REGEX = "anomalie|problème|défaut|dysfonctionnement|intervention|réparation"
+
+
+def today_utc() -> datetime:
+    """Date du jour (UTC) à minuit, au format naïf utilisé par MongoDB"""
+    return datetime.now(timezone.utc).replace(tzinfo=None, hour=0, minute=0, second=0, microsecond=0)
+
+
+def parse_control_date(value) -> Optional[datetime]:
+    """Convertit une date ISO (chaîne) en datetime à minuit, None si invalide"""
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        try:
+            parsed = datetime.fromisoformat(str(value))
+        except ValueError:
+            return None
+    return datetime(parsed.year, parsed.month, parsed.day)
+
+
+def control_date_fields(prochain_controle, duree_rappel_echeance) -> dict:
+    """
+    Champs dates typés dérivés de prochain_controle (chaîne ISO conservée pour l'API) :
+    - prochain_controle_date : échéance en datetime, indexée
+    - date_rappel : début de la période d'alerte (échéance - duree_rappel_echeance)
+    """
+    prochain = parse_control_date(prochain_controle)
+    if prochain is None:
+        return {"prochain_controle_date": None, "date_rappel": None}
+    duree = duree_rappel_echeance if duree_rappel_echeance is not None else 30
+    return {"prochain_controle_date": prochain, "date_rappel": prochain - timedelta(days=duree)}
+
+
+async def ensure_surveillance_indexes():
+    """Crée les index du plan de surveillance et renseigne les dates typées manquantes"""
+    await db.surveillance_items.create_index("id")
+    await db.surveillance_items.create_index([("status", 1), ("date_rappel", 1)])
+    await db.surveillance_items.create_index("prochain_controle_date")
+    
+    # Migration des items créés avant l'ajout des dates typées
+    updates = []
+    async for item in db.surveillance_items.find(
+        {"date_rappel": {"$exists": False}},
+        {"_id": 1, "prochain_controle": 1, "duree_rappel_echeance": 1}
+    ):
+        fields = control_date_fields(item.get("prochain_controle"), item.get("duree_rappel_echeance"))
+        updates.append(UpdateOne({"_id": item["_id"]}, {"$set": fields}))
+    
+    if updates:
+        await db.surveillance_items.bulk_write(updates, ordered=False)
+        logger.info(f"✅ Dates typées renseignées pour {len(updates)} item(s) de surveillance")
+
+
+def count_if(condition) -> dict:
+    """Accumulateur $sum conditionnel"""
+    return {"$sum": {"$cond": [condition, 1, 0]}}
+
+
+def realisation_group(key) -> List[dict]:
+    """Étapes $group calculant total et réalisés par clé"""
+    return [{
+        "$group": {
+            "_id": key,
+            "total": {"$sum": 1},
+            "realises": count_if({"$eq": ["$status", SurveillanceItemStatus.REALISE.value]})
+        }
+    }]
+
+
+def realisation_breakdown(rows: List[dict], keys: Optional[List[str]] = None) -> dict:
+    """Met en forme les groupes {total, realises, pourcentage} renvoyés par l'agrégation"""
+    result = {}
+    if keys:
+        result = {key: {"total": 0, "realises": 0, "pourcentage": 0} for key in keys}
+    for row in rows:
+        if keys is not None and row["_id"] not in result:
+            continue
+        result[row["_id"]] = {
+            "total": row["total"],
+            "realises": row["realises"],
+            "pourcentage": round((row["realises"] / row["total"] * 100) if row["total"] else 0, 1)
+        }
+    return result
 
 
 # ==================== CRUD Routes ====================
@@ -108,7 +207,10 @@ async def create_surveillance_item(
         )
         
         item_dict = item.model_dump()
+        item_dict.update(control_date_fields(item.prochain_controle, item.duree_rappel_echeance))
         await db.surveillance_items.insert_one(item_dict)
+        badge_service.invalidate("surveillance")
+        realtime_service.publish("surveillance", "created", item.id)
         
         # Audit
         await audit_service.log_action(
@@ -155,11 +257,20 @@ async def update_surveillance_item(
         update_data["updated_at"] = datetime.now(timezone.utc).isoformat()
         update_data["updated_by"] = current_user.get("id")
         
+        # Recalculer les dates typées si l'échéance ou la durée de rappel change
+        if "prochain_controle" in update_data or "duree_rappel_echeance" in update_data:
+            update_data.update(control_date_fields(
+                update_data.get("prochain_controle", existing.get("prochain_controle")),
+                update_data.get("duree_rappel_echeance", existing.get("duree_rappel_echeance"))
+            ))
+        
         # Mettre à jour
         await db.surveillance_items.update_one(
             {"id": item_id},
             {"$set": update_data}
         )
+        badge_service.invalidate("surveillance")
+        realtime_service.publish("surveillance", "updated", item_id)
         
         # Récupérer l'item mis à jour
         updated_item = await db.surveillance_items.find_one({"id": item_id})
@@ -201,6 +312,8 @@ async def delete_surveillance_item(
             raise HTTPException(status_code=404, detail="Item non trouvé")
         
         await db.surveillance_items.delete_one({"id": item_id})
+        badge_service.invalidate("surveillance")
+        realtime_service.publish("surveillance", "deleted", item_id)
         
         # Audit
         await audit_service.log_action(
@@ -227,46 +340,40 @@ async def delete_surveillance_item(
 async def get_surveillance_stats(current_user: dict = Depends(get_current_user)):
     """Récupérer les statistiques globales du plan de surveillance"""
     try:
-        items = await db.surveillance_items.find().to_list(length=None)
-        
-        total = len(items)
-        realises = len([i for i in items if i.get("status") == SurveillanceItemStatus.REALISE.value])
-        planifies = len([i for i in items if i.get("status") == SurveillanceItemStatus.PLANIFIE.value])
-        a_planifier = len([i for i in items if i.get("status") == SurveillanceItemStatus.PLANIFIER.value])
-        
-        # Par catégorie (dynamique - récupère toutes les catégories existantes)
-        by_category = {}
-        categories = list(set([i.get("category") for i in items if i.get("category")]))
-        for cat in categories:
-            cat_items = [i for i in items if i.get("category") == cat]
-            cat_realises = len([i for i in cat_items if i.get("status") == SurveillanceItemStatus.REALISE.value])
-            by_category[cat] = {
-                "total": len(cat_items),
-                "realises": cat_realises,
-                "pourcentage": round((cat_realises / len(cat_items) * 100) if cat_items else 0, 1)
+        pipeline = [{
+            "$facet": {
+                "global": [{
+                    "$group": {
+                        "_id": None,
+                        "total": {"$sum": 1},
+                        "realises": count_if({"$eq": ["$status", SurveillanceItemStatus.REALISE.value]}),
+                        "planifies": count_if({"$eq": ["$status", SurveillanceItemStatus.PLANIFIE.value]}),
+                        "a_planifier": count_if({"$eq": ["$status", SurveillanceItemStatus.PLANIFIER.value]})
+                    }
+                }],
+                # Par catégorie (dynamique - toutes les catégories existantes)
+                "by_category": [{"$match": {"category": {"$nin": [None, ""]}}}] + realisation_group("$category"),
+                "by_responsable": realisation_group("$responsable")
             }
+        }]
+        facets = (await db.surveillance_items.aggregate(pipeline).to_list(length=1))[0]
         
-        # Par responsable
-        by_responsable = {}
-        for resp in SurveillanceResponsible:
-            resp_items = [i for i in items if i.get("responsable") == resp.value]
-            resp_realises = len([i for i in resp_items if i.get("status") == SurveillanceItemStatus.REALISE.value])
-            by_responsable[resp.value] = {
-                "total": len(resp_items),
-                "realises": resp_realises,
-                "pourcentage": round((resp_realises / len(resp_items) * 100) if resp_items else 0, 1)
-            }
+        counts = facets["global"][0] if facets["global"] else {}
+        total = counts.get("total", 0)
+        realises = counts.get("realises", 0)
         
         return {
             "global": {
                 "total": total,
                 "realises": realises,
-                "planifies": planifies,
-                "a_planifier": a_planifier,
+                "planifies": counts.get("planifies", 0),
+                "a_planifier": counts.get("a_planifier", 0),
                 "pourcentage_realisation": round((realises / total * 100) if total > 0 else 0, 1)
             },
-            "by_category": by_category,
-            "by_responsable": by_responsable
+            "by_category": realisation_breakdown(facets["by_category"]),
+            "by_responsable": realisation_breakdown(
+                facets["by_responsable"], [resp.value for resp in SurveillanceResponsible]
+            )
         }
     except Exception as e:
         logger.error(f"Erreur récupération statistiques: {str(e)}")
@@ -279,30 +386,18 @@ async def get_surveillance_stats(current_user: dict = Depends(get_current_user))
 async def get_surveillance_alerts(current_user: dict = Depends(get_current_user)):
     """Récupérer les items nécessitant une alerte (échéance proche)"""
     try:
-        items = await db.surveillance_items.find().to_list(length=None)
+        today = today_utc()
         
-        alerts = []
-        today = datetime.now(timezone.utc).date()
+        # Alerte dès que la période de rappel est atteinte (date_rappel <= aujourd'hui)
+        alerts = await db.surveillance_items.find(
+            {"status": {"$in": OPEN_STATUSES}, "date_rappel": {"$lte": today}},
+            {"_id": 0}
+        ).sort("prochain_controle_date", 1).to_list(length=None)
         
-        for item in items:
-            if item.get("prochain_controle") and item.get("status") != SurveillanceItemStatus.REALISE.value:
-                try:
-                    prochain_controle = datetime.fromisoformat(item["prochain_controle"]).date()
-                    days_until = (prochain_controle - today).days
-                    duree_rappel = item.get("duree_rappel_echeance", 30)
-                    
-                    # Alerte si moins de la durée de rappel configurée
-                    if days_until <= duree_rappel:
-                        if "_id" in item:
-                            del item["_id"]
-                        item["days_until"] = days_until
-                        item["urgence"] = "critique" if days_until <= 7 else "important" if days_until <= 14 else "normal"
-                        alerts.append(item)
-                except:
-                    pass
-        
-        # Trier par urgence (plus proche en premier)
-        alerts.sort(key=lambda x: x.get("days_until", 999))
+        for item in alerts:
+            days_until = (item["prochain_controle_date"] - today).days
+            item["days_until"] = days_until
+            item["urgence"] = "critique" if days_until <= 7 else "important" if days_until <= 14 else "normal"
         
         return {
             "count": len(alerts),
@@ -313,53 +408,37 @@ async def get_surveillance_alerts(current_user: dict = Depends(get_current_user)
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.get("/badge-stats")
-async def get_badge_stats(current_user: dict = Depends(get_current_user)):
+async def compute_badge_counts() -> dict:
     """
-    Récupérer les statistiques pour le badge de notification du header
+    Compteurs du badge de surveillance (recalculés par le service des badges)
     - Nombre de contrôles à échéance proche (selon duree_rappel_echeance de chaque item)
     - Pourcentage de réalisation global
     """
-    try:
-        items = await db.surveillance_items.find().to_list(length=None)
-        
-        total = len(items)
-        if total == 0:
-            return {
-                "echeances_proches": 0,
-                "pourcentage_realisation": 0
-            }
-        
-        # Compter les items réalisés
-        realises = len([i for i in items if i.get("status") == SurveillanceItemStatus.REALISE.value])
-        pourcentage_realisation = round((realises / total * 100), 1)
-        
-        # Compter les échéances proches (selon la durée de rappel de chaque item)
-        echeances_proches = 0
-        today = datetime.now(timezone.utc).date()
-        
-        for item in items:
-            # Ignorer les items déjà réalisés
-            if item.get("status") == SurveillanceItemStatus.REALISE.value:
-                continue
-                
-            if item.get("prochain_controle"):
-                try:
-                    prochain_controle = datetime.fromisoformat(item["prochain_controle"]).date()
-                    days_until = (prochain_controle - today).days
-                    duree_rappel = item.get("duree_rappel_echeance", 30)
-                    
-                    # Compter si l'échéance est proche selon la durée de rappel
-                    if days_until <= duree_rappel:
-                        echeances_proches += 1
-                except Exception as e:
-                    logger.warning(f"Erreur parsing date pour item {item.get('id')}: {str(e)}")
-                    pass
-        
+    total = await db.surveillance_items.estimated_document_count()
+    if total == 0:
         return {
-            "echeances_proches": echeances_proches,
-            "pourcentage_realisation": pourcentage_realisation
+            "echeances_proches": 0,
+            "pourcentage_realisation": 0
         }
+    
+    realises = await db.surveillance_items.count_documents(
+        {"status": SurveillanceItemStatus.REALISE.value}
+    )
+    echeances_proches = await db.surveillance_items.count_documents(
+        {"status": {"$in": OPEN_STATUSES}, "date_rappel": {"$lte": today_utc()}}
+    )
+    
+    return {
+        "echeances_proches": echeances_proches,
+        "pourcentage_realisation": round((realises / total * 100), 1)
+    }
+
+
+@router.get("/badge-stats")
+async def get_badge_stats(current_user: dict = Depends(get_current_user)):
+    """Récupérer les statistiques pour le badge de notification du header (valeurs en cache)"""
+    try:
+        return await badge_service.get("surveillance")
     except Exception as e:
         logger.error(f"Erreur récupération badge stats: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -372,10 +451,42 @@ async def get_rapport_stats(current_user: dict = Depends(get_current_user)):
     Inclut tous les KPIs : taux de réalisation par catégorie, bâtiment, périodicité, etc.
     """
     try:
-        items = await db.surveillance_items.find().to_list(length=None)
+        today = today_utc()
+        is_open = {"$ne": ["$status", SurveillanceItemStatus.REALISE.value]}
+        has_due_date = {"$ne": [{"$ifNull": ["$prochain_controle_date", None]}, None]}
+        
+        pipeline = [{
+            "$facet": {
+                "global": [{
+                    "$group": {
+                        "_id": None,
+                        "total": {"$sum": 1},
+                        "realises": count_if({"$eq": ["$status", SurveillanceItemStatus.REALISE.value]}),
+                        "planifies": count_if({"$eq": ["$status", SurveillanceItemStatus.PLANIFIE.value]}),
+                        "a_planifier": count_if({"$eq": ["$status", SurveillanceItemStatus.PLANIFIER.value]}),
+                        "en_retard": count_if({"$and": [
+                            is_open, has_due_date, {"$lt": ["$prochain_controle_date", today]}
+                        ]}),
+                        "a_temps": count_if({"$and": [
+                            is_open, has_due_date, {"$gte": ["$prochain_controle_date", today]}
+                        ]}),
+                        # Anomalies : commentaires mentionnant des problèmes
+                        "anomalies": count_if({"$regexMatch": {
+                            "input": {"$ifNull": ["$commentaire", ""]},
+                            "regex": ANOMALIE_REGEX,
+                            "options": "i"
+                        }})
+                    }
+                }],
+                "by_category": [{"$match": {"category": {"$nin": [None, ""]}}}] + realisation_group("$category"),
+                "by_batiment": realisation_group({"$ifNull": ["$batiment", "Non spécifié"]}),
+                "by_periodicite": realisation_group({"$ifNull": ["$periodicite", "Non spécifié"]}),
+                "by_responsable": realisation_group("$responsable")
+            }
+        }]
+        facets = (await db.surveillance_items.aggregate(pipeline).to_list(length=1))[0]
         
-        total = len(items)
-        if total == 0:
+        if not facets["global"]:
             return {
                 "global": {
                     "total": 0,
@@ -393,97 +504,26 @@ async def get_rapport_stats(current_user: dict = Depends(get_current_user)):
                 "anomalies": 0
             }
         
-        today = datetime.now(timezone.utc).date()
-        
-        # Statistiques globales
-        realises = [i for i in items if i.get("status") == SurveillanceItemStatus.REALISE.value]
-        planifies = [i for i in items if i.get("status") == SurveillanceItemStatus.PLANIFIE.value]
-        a_planifier = [i for i in items if i.get("status") == SurveillanceItemStatus.PLANIFIER.value]
-        
-        # Calculer les items en retard et à temps
-        en_retard = 0
-        a_temps = 0
-        for item in items:
-            if item.get("status") != SurveillanceItemStatus.REALISE.value and item.get("prochain_controle"):
-                try:
-                    prochain_controle = datetime.fromisoformat(item["prochain_controle"]).date()
-                    if prochain_controle < today:
-                        en_retard += 1
-                    else:
-                        a_temps += 1
-                except:
-                    pass
-        
-        # Compter les anomalies (items avec commentaires mentionnant des problèmes)
-        anomalies = 0
-        for item in items:
-            commentaire = item.get("commentaire", "") or ""
-            commentaire = commentaire.lower()
-            if any(keyword in commentaire for keyword in ["anomalie", "problème", "défaut", "dysfonctionnement", "intervention", "réparation"]):
-                anomalies += 1
-        
-        # Par catégorie (dynamique - récupère toutes les catégories existantes)
-        by_category = {}
-        categories = list(set([i.get("category") for i in items if i.get("category")]))
-        for cat in categories:
-            cat_items = [i for i in items if i.get("category") == cat]
-            cat_realises = len([i for i in cat_items if i.get("status") == SurveillanceItemStatus.REALISE.value])
-            by_category[cat] = {
-                "total": len(cat_items),
-                "realises": cat_realises,
-                "pourcentage": round((cat_realises / len(cat_items) * 100) if cat_items else 0, 1)
-            }
-        
-        # Par bâtiment
-        by_batiment = {}
-        batiments = set([i.get("batiment", "Non spécifié") for i in items])
-        for bat in batiments:
-            bat_items = [i for i in items if i.get("batiment") == bat]
-            bat_realises = len([i for i in bat_items if i.get("status") == SurveillanceItemStatus.REALISE.value])
-            by_batiment[bat] = {
-                "total": len(bat_items),
-                "realises": bat_realises,
-                "pourcentage": round((bat_realises / len(bat_items) * 100) if bat_items else 0, 1)
-            }
-        
-        # Par périodicité
-        by_periodicite = {}
-        periodicites = set([i.get("periodicite", "Non spécifié") for i in items])
-        for per in periodicites:
-            per_items = [i for i in items if i.get("periodicite") == per]
-            per_realises = len([i for i in per_items if i.get("status") == SurveillanceItemStatus.REALISE.value])
-            by_periodicite[per] = {
-                "total": len(per_items),
-                "realises": per_realises,
-                "pourcentage": round((per_realises / len(per_items) * 100) if per_items else 0, 1)
-            }
-        
-        # Par responsable
-        by_responsable = {}
-        for resp in SurveillanceResponsible:
-            resp_items = [i for i in items if i.get("responsable") == resp.value]
-            resp_realises = len([i for i in resp_items if i.get("status") == SurveillanceItemStatus.REALISE.value])
-            by_responsable[resp.value] = {
-                "total": len(resp_items),
-                "realises": resp_realises,
-                "pourcentage": round((resp_realises / len(resp_items) * 100) if resp_items else 0, 1)
-            }
+        counts = facets["global"][0]
+        total = counts["total"]
         
         return {
             "global": {
                 "total": total,
-                "realises": len(realises),
-                "planifies": len(planifies),
-                "a_planifier": len(a_planifier),
-                "pourcentage_realisation": round((len(realises) / total * 100), 1),
-                "en_retard": en_retard,
-                "a_temps": a_temps
+                "realises": counts["realises"],
+                "planifies": counts["planifies"],
+                "a_planifier": counts["a_planifier"],
+                "pourcentage_realisation": round((counts["realises"] / total * 100), 1),
+                "en_retard": counts["en_retard"],
+                "a_temps": counts["a_temps"]
             },
-            "by_category": by_category,
-            "by_batiment": by_batiment,
-            "by_periodicite": by_periodicite,
-            "by_responsable": by_responsable,
-            "anomalies": anomalies
+            "by_category": realisation_breakdown(facets["by_category"]),
+            "by_batiment": realisation_breakdown(facets["by_batiment"]),
+            "by_periodicite": realisation_breakdown(facets["by_periodicite"]),
+            "by_responsable": realisation_breakdown(
+                facets["by_responsable"], [resp.value for resp in SurveillanceResponsible]
+            ),
+            "anomalies": counts["anomalies"]
         }
     except Exception as e:
         logger.error(f"Erreur récupération rapport stats: {str(e)}")
@@ -505,19 +545,11 @@ async def upload_piece_jointe(
         if not item:
             raise HTTPException(status_code=404, detail="Item non trouvé")
         
-        # Créer le répertoire uploads/surveillance si nécessaire
-        upload_dir = Path("uploads/surveillance")
-        upload_dir.mkdir(parents=True, exist_ok=True)
-        
-        # Générer un nom de fichier unique
-        file_ext = Path(file.filename).suffix
-        unique_filename = f"{item_id}_{uuid.uuid4()}{file_ext}"
-        file_path = upload_dir / unique_filename
-        
-        # Sauvegarder le fichier
-        with open(file_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
+        # Sauvegarder le fichier par blocs dans uploads/surveillance
+        stored = await upload_service.receive_upload(
+            file, None, current_user.get("id"), Path("uploads/surveillance"), prefix=f"{item_id}_"
+        )
+        unique_filename = stored["filename"]
         
         # Mettre à jour l'item avec l'URL du fichier
         file_url = f"/uploads/surveillance/{unique_filename}"
@@ -552,57 +584,62 @@ async def import_surveillance_data(
     file: UploadFile = File(...),
     current_user: dict = Depends(get_current_admin_user)
 ):
-    """Importer des données depuis un fichier CSV/Excel"""
+    """
+    Importer des données depuis un fichier CSV/Excel
+    
+    Les colonnes sont validées en entier puis les lignes valides insérées par lots ;
+    les lignes refusées sont listées dans un rapport d'erreurs téléchargeable.
+    """
     try:
-        import pandas as pd
-        from io import BytesIO
+        frame = await read_import_file(file)
+        
+        # Mapper et valider les colonnes
+        columns = {
+            "classe_type": frame.text("classe_type", ""),
+            "category": frame.text("category", "AUTRE"),
+            "batiment": frame.text("batiment", ""),
+            "periodicite": frame.text("periodicite", ""),
+            "responsable": frame.choice("responsable", [r.value for r in SurveillanceResponsible], "MAINT"),
+            "executant": frame.text("executant", ""),
+            "description": frame.text("description"),
+            "derniere_visite": frame.text("derniere_visite"),  # date ou "X"
+            "prochain_controle": frame.date("prochain_controle"),
+            "commentaire": frame.text("commentaire"),
+            "created_by": current_user.get("id"),
+            "updated_by": current_user.get("id")
+        }
         
-        content = await file.read()
-        
-        # Lire le fichier selon l'extension
-        if file.filename.endswith('.csv'):
-            df = pd.read_csv(BytesIO(content))
-        elif file.filename.endswith(('.xlsx', '.xls')):
-            df = pd.read_excel(BytesIO(content))
-        else:
-            raise HTTPException(status_code=400, detail="Format de fichier non supporté")
-        
-        # Mapper les colonnes
-        imported_count = 0
-        errors = []
-        
-        for index, row in df.iterrows():
-            try:
-                item = SurveillanceItem(
-                    classe_type=str(row.get('classe_type', '')),
-                    category=str(row.get('category', 'AUTRE')),
-                    batiment=str(row.get('batiment', '')),
-                    periodicite=str(row.get('periodicite', '')),
-                    responsable=str(row.get('responsable', 'MAINT')),
-                    executant=str(row.get('executant', '')),
-                    description=str(row.get('description', '')) if pd.notna(row.get('description')) else None,
-                    derniere_visite=str(row.get('derniere_visite', '')) if pd.notna(row.get('derniere_visite')) else None,
-                    prochain_controle=str(row.get('prochain_controle', '')) if pd.notna(row.get('prochain_controle')) else None,
-                    commentaire=str(row.get('commentaire', '')) if pd.notna(row.get('commentaire')) else None,
-                    created_by=current_user.get("id"),
-                    updated_by=current_user.get("id")
-                )
-                
-                await db.surveillance_items.insert_one(item.model_dump())
-                imported_count += 1
-            except Exception as e:
-                errors.append(f"Ligne {index + 2}: {str(e)}")
+        documents = []
+        for ligne, values in frame.valid_rows(columns):
+            # Valeurs déjà validées : le modèle ne fait qu'ajouter les valeurs par défaut
+            item_dict = SurveillanceItem.model_construct(**values).model_dump(warnings=False)
+            item_dict.update(control_date_fields(item_dict["prochain_controle"], item_dict["duree_rappel_echeance"]))
+            documents.append((ligne, item_dict))
         
-        return {
-            "success": True,
-            "imported_count": imported_count,
-            "errors": errors[:10]  # Limiter à 10 erreurs
-        }
+        imported_count = await insert_chunks(db.surveillance_items, documents, frame)
+        
+        if imported_count:
+            badge_service.invalidate("surveillance")
+            realtime_service.publish("surveillance", "updated", data={"imported_count": imported_count})
+        
+        return await import_result(frame, imported_count, "/api/surveillance/import/reports/{report_id}")
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Erreur import données: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/import/reports/{report_id}")
+async def download_import_report(
+    request: Request,
+    report_id: str,
+    current_user: dict = Depends(get_current_admin_user)
+):
+    """Télécharger le rapport d'erreurs complet d'un import"""
+    return await send_file(request, report_path(report_id), "erreurs_import_plan_surveillance.csv", "text/csv")
+
+
 @router.get("/export/template")
 async def export_template(current_user: dict = Depends(get_current_user)):
     """Télécharger un template CSV pour l'import"""
@@ -646,64 +683,58 @@ async def export_template(current_user: dict = Depends(get_current_user)):
 
 # ==================== Vérification automatique des échéances ====================
 
+# Résultat du dernier passage planifié, renvoyé par /check-due-dates
+last_rollover = {"run_at": None, "updated_ids": []}
+
+
+async def rollover_due_controls() -> List[str]:
+    """
+    Repasse en "PLANIFIER" les contrôles "REALISE" entrés dans leur période de rappel
+    (duree_rappel_echeance jours avant prochain_controle), en une seule mise à jour.
+    
+    Exécuté par le scheduler ; renvoie les IDs modifiés pour notification.
+    """
+    query = {
+        "status": SurveillanceItemStatus.REALISE.value,
+        "date_rappel": {"$lte": today_utc()}
+    }
+    
+    due = await db.surveillance_items.find(query, {"_id": 0, "id": 1}).to_list(length=None)
+    updated_ids = [item["id"] for item in due]
+    
+    if updated_ids:
+        # Le filtre de statut est conservé : un item modifié entre-temps n'est pas écrasé
+        await db.surveillance_items.update_many(
+            {**query, "id": {"$in": updated_ids}},
+            {
+                "$set": {
+                    "status": SurveillanceItemStatus.PLANIFIER.value,
+                    "updated_at": datetime.now(timezone.utc).isoformat(),
+                    "updated_by": "system_auto_check"
+                }
+            }
+        )
+        badge_service.invalidate("surveillance")
+        realtime_service.publish("surveillance", "updated", data={"updated_ids": updated_ids})
+        logger.info(f"{len(updated_ids)} contrôle(s) repassé(s) de REALISE à PLANIFIER (période de rappel atteinte)")
+    
+    last_rollover["run_at"] = datetime.now(timezone.utc).isoformat()
+    last_rollover["updated_ids"] = updated_ids
+    return updated_ids
+
+
 @router.post("/check-due-dates")
 async def check_due_dates(current_user: dict = Depends(get_current_user)):
     """
-    Vérifier les dates d'échéance et mettre à jour automatiquement les statuts.
-    
-    Logique:
-    - Pour chaque item avec statut "REALISE"
-    - Si la date actuelle est dans la période de rappel (duree_rappel_echeance jours avant prochain_controle)
-    - Alors changer le statut de "REALISE" à "PLANIFIER"
+    Statut de la vérification automatique des échéances.
     
-    Cet endpoint est appelé automatiquement au chargement de la page de surveillance.
+    Le passage de "REALISE" à "PLANIFIER" est fait par le scheduler (rollover_due_controls) ;
+    cet endpoint, historiquement appelé au chargement de la page, ne fait plus qu'une lecture.
     """
-    try:
-        today = datetime.now(timezone.utc).date()
-        updated_count = 0
-        
-        # Récupérer tous les items avec statut REALISE
-        items = await db.surveillance_items.find({
-            "status": SurveillanceItemStatus.REALISE.value
-        }).to_list(length=None)
-        
-        for item in items:
-            # Vérifier si l'item a une date de prochain contrôle
-            if not item.get("prochain_controle"):
-                continue
-            
-            try:
-                prochain_controle = datetime.fromisoformat(item["prochain_controle"]).date()
-                duree_rappel = item.get("duree_rappel_echeance", 30)
-                
-                # Calculer la date de début de la période de rappel
-                date_rappel = prochain_controle - timedelta(days=duree_rappel)
-                
-                # Si nous sommes dans la période de rappel ou après
-                if today >= date_rappel:
-                    # Mettre à jour le statut vers PLANIFIER
-                    await db.surveillance_items.update_one(
-                        {"id": item["id"]},
-                        {
-                            "$set": {
-                                "status": SurveillanceItemStatus.PLANIFIER.value,
-                                "updated_at": datetime.now(timezone.utc).isoformat(),
-                                "updated_by": "system_auto_check"
-                            }
-                        }
-                    )
-                    updated_count += 1
-                    
-                    logger.info(f"Item {item['id']} ({item.get('classe_type')}) statut changé de REALISE à PLANIFIER (échéance: {prochain_controle})")
-            except Exception as e:
-                logger.warning(f"Erreur traitement item {item.get('id')}: {str(e)}")
-                continue
-        
-        return {
-            "success": True,
-            "updated_count": updated_count,
-            "message": f"{updated_count} contrôle(s) mis à jour automatiquement"
-        }
-    except Exception as e:
-        logger.error(f"Erreur vérification échéances: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+    return {
+        "success": True,
+        "updated_count": 0,
+        "last_run": last_rollover["run_at"],
+        "last_updated_ids": last_rollover["updated_ids"],
+        "message": "Vérification des échéances effectuée par le planificateur"
+    }
@@ -0,0 +1,51 @@
+"""
+Routes API pour les uploads par morceaux (reprise après coupure)
+
+Le client démarre un upload, envoie le fichier en morceaux (PUT avec offset), puis
+passe l'upload_id à la route d'upload du site concerné (ordre de travail, document...)
+qui récupère le fichier complet.
+"""
+from fastapi import APIRouter, Depends, HTTPException, Request
+import logging
+
+from models import UploadSessionCreate
+from dependencies import get_current_user
+import upload_service
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/uploads", tags=["uploads"])
+
+
+@router.post("")
+async def start_upload(
+    upload: UploadSessionCreate,
+    current_user: dict = Depends(get_current_user)
+):
+    """Démarrer un upload par morceaux"""
+    return await upload_service.create_session(
+        current_user["id"], upload.filename, upload.size, upload.mime_type
+    )
+
+
+@router.get("/{upload_id}")
+async def get_upload(upload_id: str, current_user: dict = Depends(get_current_user)):
+    """État d'un upload (octets reçus = position de reprise)"""
+    return await upload_service.get_session(upload_id, current_user["id"])
+
+
+@router.put("/{upload_id}")
+async def upload_chunk(
+    upload_id: str,
+    offset: int,
+    request: Request,
+    current_user: dict = Depends(get_current_user)
+):
+    """Envoyer un morceau (corps brut) à partir de la position offset"""
+    try:
+        return await upload_service.append_chunk(upload_id, current_user["id"], offset, request.stream())
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Erreur réception morceau {upload_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
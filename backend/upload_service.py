@@ -0,0 +1,297 @@
+"""
+Service d'enregistrement des fichiers uploadés (écriture par blocs, reprise des gros fichiers)
+"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import AsyncIterator, Dict, Optional
+import logging
+
+import aiofiles
+import aiofiles.os
+from fastapi import HTTPException, UploadFile
+
+logger = logging.getLogger(__name__)
+
+# Taille des blocs lus et écrits : la mémoire consommée par upload reste bornée
+CHUNK_SIZE = 1024 * 1024  # 1MB
+
+# Taille maximale par défaut d'un fichier (surchargeable par site d'upload)
+MAX_UPLOAD_SIZE = int(os.environ.get("MAX_UPLOAD_SIZE", 1024 * 1024 * 1024))  # 1GB
+
+# Uploads en plusieurs morceaux en cours (fichier partiel + métadonnées JSON)
+SESSIONS_DIR = Path(__file__).parent / "uploads" / "_sessions"
+
+# Durée de conservation d'un upload par morceaux abandonné
+SESSION_MAX_AGE = 24 * 3600
+
+# Un verrou par upload : deux morceaux envoyés en même temps (ex: renvoi après une
+# coupure) ne peuvent pas lire la même position de reprise et écrire tous les deux
+_session_locks: Dict[str, asyncio.Lock] = {}
+
+
+def _size_label(max_size: int) -> str:
+    return f"{max_size // (1024 * 1024)}MB"
+
+
+async def _remove_quietly(path: Path):
+    try:
+        await aiofiles.os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+async def save_upload(
+    file: UploadFile,
+    directory: Path,
+    filename: str,
+    max_size: int = MAX_UPLOAD_SIZE
+) -> dict:
+    """
+    Écrit un fichier uploadé sur disque par blocs de CHUNK_SIZE
+
+    La taille est contrôlée à chaque bloc (le fichier n'est jamais chargé entier en
+    mémoire) et le SHA-256 est calculé au passage. Le fichier est écrit sous un nom
+    temporaire puis renommé : un upload interrompu ne laisse pas de fichier tronqué.
+
+    Args:
+        file: Fichier reçu (multipart)
+        directory: Répertoire de destination
+        filename: Nom du fichier sur disque
+        max_size: Taille maximale acceptée (octets)
+
+    Returns:
+        dict avec path, size et sha256
+    """
+    await aiofiles.os.makedirs(directory, exist_ok=True)
+    final_path = Path(directory) / filename
+    partial_path = final_path.with_name(f".{filename}.part")
+
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(partial_path, "wb") as out:
+            while True:
+                chunk = await file.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_size:
+                    raise HTTPException(status_code=413, detail=f"Fichier trop volumineux (max {_size_label(max_size)})")
+                digest.update(chunk)
+                await out.write(chunk)
+        await aiofiles.os.replace(partial_path, final_path)
+    except BaseException:
+        await _remove_quietly(partial_path)
+        raise
+
+    return {"path": final_path, "size": size, "sha256": digest.hexdigest()}
+
+
+# ==================== Uploads par morceaux (reprise possible) ====================
+
+def _session_paths(upload_id: str):
+    # upload_id est un UUID généré ici : on refuse tout autre format (pas de chemin arbitraire)
+    try:
+        upload_id = str(uuid.UUID(upload_id))
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Upload non trouvé")
+    return SESSIONS_DIR / f"{upload_id}.json", SESSIONS_DIR / f"{upload_id}.part"
+
+
+def _session_lock(upload_id: str) -> asyncio.Lock:
+    return _session_locks.setdefault(upload_id, asyncio.Lock())
+
+
+async def _read_session(upload_id: str, user_id: str) -> dict:
+    meta_path, data_path = _session_paths(upload_id)
+    try:
+        async with aiofiles.open(meta_path, "r") as f:
+            session = json.loads(await f.read())
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Upload non trouvé ou expiré")
+    if session["user_id"] != user_id:
+        raise HTTPException(status_code=404, detail="Upload non trouvé ou expiré")
+    try:
+        session["received"] = (await aiofiles.os.stat(data_path)).st_size
+    except FileNotFoundError:
+        session["received"] = 0
+    return session
+
+
+async def create_session(
+    user_id: str,
+    filename: str,
+    total_size: int,
+    mime_type: Optional[str] = None,
+    max_size: int = MAX_UPLOAD_SIZE
+) -> dict:
+    """Démarre un upload par morceaux ; le client envoie ensuite les morceaux avec append_chunk"""
+    if total_size <= 0:
+        raise HTTPException(status_code=400, detail="Taille de fichier invalide")
+    if total_size > max_size:
+        raise HTTPException(status_code=413, detail=f"Fichier trop volumineux (max {_size_label(max_size)})")
+
+    await aiofiles.os.makedirs(SESSIONS_DIR, exist_ok=True)
+    upload_id = str(uuid.uuid4())
+    meta_path, data_path = _session_paths(upload_id)
+    session = {
+        "upload_id": upload_id,
+        "user_id": user_id,
+        "filename": filename,
+        "mime_type": mime_type,
+        "total_size": total_size,
+        "max_size": max_size,
+        "created_at": time.time()
+    }
+    async with aiofiles.open(meta_path, "w") as f:
+        await f.write(json.dumps(session))
+    async with aiofiles.open(data_path, "wb"):
+        pass
+
+    return {**session, "received": 0, "chunk_size": CHUNK_SIZE}
+
+
+async def get_session(upload_id: str, user_id: str) -> dict:
+    """État d'un upload par morceaux (received = octets déjà reçus, point de reprise)"""
+    session = await _read_session(upload_id, user_id)
+    return {**session, "chunk_size": CHUNK_SIZE}
+
+
+async def append_chunk(upload_id: str, user_id: str, offset: int, stream: AsyncIterator[bytes]) -> dict:
+    """
+    Ajoute un morceau à un upload en cours
+
+    offset doit correspondre aux octets déjà reçus : un morceau renvoyé après une
+    coupure est refusé (409) avec la position de reprise. Les morceaux d'un même upload
+    sont écrits l'un après l'autre.
+    """
+    _, data_path = _session_paths(upload_id)
+    async with _session_lock(upload_id):
+        session = await _read_session(upload_id, user_id)
+        if offset != session["received"]:
+            raise HTTPException(
+                status_code=409,
+                detail={"message": "Position de reprise incorrecte", "received": session["received"]}
+            )
+
+        max_size = session.get("max_size", MAX_UPLOAD_SIZE)
+        received = session["received"]
+        async with aiofiles.open(data_path, "ab") as out:
+            async for chunk in stream:
+                if not chunk:
+                    continue
+                received += len(chunk)
+                if received > max_size:
+                    await out.truncate(session["received"])
+                    raise HTTPException(status_code=413, detail=f"Fichier trop volumineux (max {_size_label(max_size)})")
+                if received > session["total_size"]:
+                    await out.truncate(session["received"])
+                    raise HTTPException(status_code=413, detail="Le morceau dépasse la taille annoncée")
+                await out.write(chunk)
+
+    return {"upload_id": upload_id, "received": received, "total_size": session["total_size"]}
+
+
+async def claim_session(upload_id: str, user_id: str, directory: Path, filename: str, max_size: int = MAX_UPLOAD_SIZE) -> dict:
+    """
+    Termine un upload par morceaux : déplace le fichier complet dans le répertoire du site
+
+    Returns:
+        dict avec path, size, sha256, original_filename et mime_type
+    """
+    async with _session_lock(upload_id):
+        session = await _read_session(upload_id, user_id)
+        if session["received"] != session["total_size"]:
+            raise HTTPException(
+                status_code=409,
+                detail={"message": "Upload incomplet", "received": session["received"], "total_size": session["total_size"]}
+            )
+        if session["total_size"] > max_size:
+            raise HTTPException(status_code=413, detail=f"Fichier trop volumineux (max {_size_label(max_size)})")
+
+        meta_path, data_path = _session_paths(upload_id)
+
+        digest = hashlib.sha256()
+        async with aiofiles.open(data_path, "rb") as f:
+            while True:
+                chunk = await f.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+
+        await aiofiles.os.makedirs(directory, exist_ok=True)
+        final_path = Path(directory) / filename
+        await aiofiles.os.replace(data_path, final_path)
+        await _remove_quietly(meta_path)
+    _session_locks.pop(upload_id, None)
+
+    return {
+        "path": final_path,
+        "size": session["total_size"],
+        "sha256": digest.hexdigest(),
+        "original_filename": session["filename"],
+        "mime_type": session.get("mime_type")
+    }
+
+
+async def receive_upload(
+    file: Optional[UploadFile],
+    upload_id: Optional[str],
+    user_id: str,
+    directory: Path,
+    prefix: str = "",
+    max_size: int = MAX_UPLOAD_SIZE
+) -> dict:
+    """
+    Enregistre le fichier d'une route d'upload : fichier multipart ou upload par morceaux terminé
+
+    Le nom sur disque est {prefix}{uuid}{extension d'origine}.
+
+    Returns:
+        dict avec path, filename, size, sha256, original_filename et mime_type
+    """
+    if upload_id:
+        session = await _read_session(upload_id, user_id)
+        filename = f"{prefix}{uuid.uuid4()}{Path(session['filename']).suffix}"
+        stored = await claim_session(upload_id, user_id, directory, filename, max_size)
+        return {**stored, "filename": filename}
+
+    if file is None or not file.filename:
+        raise HTTPException(status_code=400, detail="Aucun fichier fourni")
+
+    filename = f"{prefix}{uuid.uuid4()}{Path(file.filename).suffix}"
+    stored = await save_upload(file, directory, filename, max_size)
+    return {
+        **stored,
+        "filename": filename,
+        "original_filename": file.filename,
+        "mime_type": file.content_type
+    }
+
+
+async def cleanup_stale_sessions():
+    """Tâche planifiée : supprime les uploads par morceaux abandonnés"""
+    try:
+        if not await aiofiles.os.path.exists(SESSIONS_DIR):
+            return
+        now = time.time()
+        removed = 0
+        for name in await aiofiles.os.listdir(SESSIONS_DIR):
+            path = SESSIONS_DIR / name
+            if now - (await aiofiles.os.stat(path)).st_mtime > SESSION_MAX_AGE:
+                await _remove_quietly(path)
+                removed += 1
+
+        # Verrous des uploads terminés ou inconnus
+        for upload_id, lock in list(_session_locks.items()):
+            if not lock.locked() and not await aiofiles.os.path.exists(SESSIONS_DIR / f"{upload_id}.json"):
+                _session_locks.pop(upload_id, None)
+        if removed:
+            logger.info(f"🧹 {removed} fichier(s) d'upload abandonné(s) supprimé(s)")
+    except Exception as e:
+        logger.error(f"❌ Erreur lors du nettoyage des uploads: {str(e)}")
@@ -0,0 +1,39 @@
+"""
+Pool de processus partagé pour les traitements lourds (vignettes, rendu de PDF)
+
+Ces traitements sont du calcul Python pur : exécutés dans la boucle d'événements ou dans un
+thread, ils bloqueraient les autres requêtes. Les fonctions passées doivent être définies au
+niveau d'un module et leurs arguments sérialisables (pickle).
+"""
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+WORKER_PROCESSES = int(os.environ.get("WORKER_PROCESSES", 2))
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=WORKER_PROCESSES)
+    return _executor
+
+
+async def run_in_process(func, *args):
+    """Exécute func(*args) dans un processus du pool et attend son résultat"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), func, *args)
+
+
+def shutdown():
+    """Arrête le pool (appelé par shutdown_services)"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -41,14 +41,28 @@ import InactivityHandler from '../Common/InactivityHandler';
 import TokenValidator from '../Common/TokenValidator';
 import { usePermissions } from '../../hooks/usePermissions';
 import { getBackendURL } from '../../utils/config';
+import { useRealtimeEvents, isRealtimeConnected } from '../../hooks/useRealtimeEvents';
 import { usePreferences } from '../../contexts/PreferencesContext';
 
+// Échéances dépassées par module (compteurs overdue_<module> de /api/badges)
+// ORANGE : exécution, JAUNE : demandes, BLEU : maintenances préventives
+const OVERDUE_MODULES = {
+  workOrders: { label: 'Ordres de travail', route: '/work-orders', category: 'execution' },
+  improvements: { label: 'Améliorations', route: '/improvements', category: 'execution' },
+  interventionRequests: { label: "Demandes d'intervention", route: '/intervention-requests', category: 'requests' },
+  improvementRequests: { label: "Demandes d'amélioration", route: '/improvement-requests', category: 'requests' },
+  preventiveMaintenance: { label: 'Maintenances préventives', route: '/preventive-maintenance', category: 'maintenance' }
+};
+
 const MainLayout = () => {
   const { preferences } = usePreferences();
   const [sidebarOpen, setSidebarOpen] = useState(true);
   const [firstLoginDialogOpen, setFirstLoginDialogOpen] = useState(false);
   const navigate = useNavigate();
   const location = useLocation();
+  
+  // Flux temps réel des changements (remplace le polling tant qu'il est connecté)
+  useRealtimeEvents();
   const [user, setUser] = useState({ nom: 'Utilisateur', role: 'VIEWER', firstLogin: false, id: '' });
   const [workOrdersCount, setWorkOrdersCount] = useState(0);
   const [overdueCount, setOverdueCount] = useState(0); // Nombre d'échéances dépassées TOTAL
@@ -60,6 +74,8 @@ const MainLayout = () => {
   const [overdueMaintenanceCount, setOverdueMaintenanceCount] = useState(0); // Maintenances préventives (bleu)
   const [surveillanceBadge, setSurveillanceBadge] = useState({ echeances_proches: 0, pourcentage_realisation: 0 });
   const [inventoryStats, setInventoryStats] = useState({ rupture: 0, niveau_bas: 0 }); // Stats inventaire
+  const [interventionBadge, setInterventionBadge] = useState({ en_attente: 0 }); // Demandes non converties
+  const [presquAccidentBadge, setPresquAccidentBadge] = useState({ a_traiter: 0, en_retard: 0 }); // Presqu'accidents
   const { canView, isAdmin } = usePermissions();
 
   // Gérer le comportement auto-collapse de la sidebar
@@ -115,33 +131,39 @@ const MainLayout = () => {
 
         // Charger le nombre d'ordres de travail assignés
         loadWorkOrdersCount(parsedUser.id);
-        // Charger le nombre d'échéances dépassées
-        loadOverdueCount();
-        // Charger les stats du badge de surveillance
-        loadSurveillanceBadgeStats();
-        // Charger les stats de l'inventaire
-        loadInventoryStats();
+        // Charger les compteurs des badges (échéances, surveillance, inventaire...) en un seul appel
+        loadBadges();
         
         // Rafraîchir les notifications toutes les 60 secondes
         const intervalId = setInterval(() => {
-          loadWorkOrdersCount(parsedUser.id);
-          loadOverdueCount();
-          loadSurveillanceBadgeStats();
-          loadInventoryStats();
+          // Les ordres de travail arrivent déjà par le flux temps réel
+          if (!isRealtimeConnected()) {
+            loadWorkOrdersCount(parsedUser.id);
+          }
+          // Les échéances dépassées évoluent avec le temps et l'inventaire / les presqu'accidents
+          // ne publient aucun événement : toujours interroger le serveur
+          loadBadges();
         }, 60000); // 60 secondes
         
         // Écouter les événements de création/modification/suppression
         const handleWorkOrderChange = () => {
           loadWorkOrdersCount(parsedUser.id);
-          loadOverdueCount(); // Aussi rafraîchir les échéances
+          loadBadges(); // Aussi rafraîchir les échéances
         };
         
         const handleSurveillanceChange = () => {
-          loadSurveillanceBadgeStats();
+          loadBadges();
         };
         
         const handleInventoryChange = () => {
-          loadInventoryStats();
+          loadBadges();
+        };
+        
+        // Demandes d'intervention et d'arrêt : pas d'événement window dédié
+        const handleRealtimeChange = (event) => {
+          if (['intervention_request', 'demande_arret'].includes(event.detail?.entity_type)) {
+            loadBadges();
+          }
         };
         
         window.addEventListener('workOrderCreated', handleWorkOrderChange);
@@ -156,6 +178,7 @@ const MainLayout = () => {
         window.addEventListener('inventoryItemCreated', handleInventoryChange);
         window.addEventListener('inventoryItemUpdated', handleInventoryChange);
         window.addEventListener('inventoryItemDeleted', handleInventoryChange);
+        window.addEventListener('realtimeChange', handleRealtimeChange);
         
         // Nettoyer les listeners et l'intervalle au démontage
         return () => {
@@ -172,6 +195,7 @@ const MainLayout = () => {
           window.removeEventListener('inventoryItemCreated', handleInventoryChange);
           window.removeEventListener('inventoryItemUpdated', handleInventoryChange);
           window.removeEventListener('inventoryItemDeleted', handleInventoryChange);
+          window.removeEventListener('realtimeChange', handleRealtimeChange);
         };
       } catch (error) {
         console.error('Erreur lors du parsing des infos utilisateur:', error);
@@ -221,189 +245,12 @@ const MainLayout = () => {
     }
   };
 
-  const loadOverdueCount = async () => {
+  const loadBadges = async () => {
     try {
       const token = localStorage.getItem('token');
       const backend_url = getBackendURL();
       
-      // Récupérer les permissions depuis localStorage
-      const userInfo = localStorage.getItem('user');
-      const permissions = userInfo ? JSON.parse(userInfo).permissions : {};
-      
-      const canViewModule = (module) => {
-        return permissions[module]?.view === true;
-      };
-      
-      const today = new Date();
-      today.setHours(23, 59, 59, 999);
-      
-      let total = 0;
-      let executionCount = 0; // Work orders + Improvements
-      let requestsCount = 0; // Demandes d'inter. + Demandes d'amél.
-      let maintenanceCount = 0; // Maintenances préventives
-      const details = {};
-      
-      // 1. Ordres de travail en retard (ORANGE)
-      if (canViewModule('workOrders')) {
-        try {
-          const woResponse = await fetch(`${backend_url}/api/work-orders`, {
-            headers: { Authorization: `Bearer ${token}` }
-          });
-          if (woResponse.ok) {
-            const workOrders = await woResponse.json();
-            const overdueWO = workOrders.filter(wo => {
-              if (!wo.dateLimite || wo.statut === 'TERMINE' || wo.statut === 'ANNULE') return false;
-              const dueDate = new Date(wo.dateLimite);
-              return dueDate < today;
-            });
-            if (overdueWO.length > 0) {
-              details.workOrders = {
-                count: overdueWO.length,
-                label: 'Ordres de travail',
-                route: '/work-orders',
-                category: 'execution'
-              };
-              executionCount += overdueWO.length;
-              total += overdueWO.length;
-            }
-          }
-        } catch (err) {
-          console.error('Erreur work orders:', err);
-        }
-      }
-      
-      // 2. Améliorations en retard (ORANGE)
-      if (canViewModule('improvements')) {
-        try {
-          const impResponse = await fetch(`${backend_url}/api/improvements`, {
-            headers: { Authorization: `Bearer ${token}` }
-          });
-          if (impResponse.ok) {
-            const improvements = await impResponse.json();
-            const overdueImp = improvements.filter(imp => {
-              if (!imp.dateLimite || imp.statut === 'TERMINE' || imp.statut === 'ANNULE') return false;
-              const dueDate = new Date(imp.dateLimite);
-              return dueDate < today;
-            });
-            if (overdueImp.length > 0) {
-              details.improvements = {
-                count: overdueImp.length,
-                label: 'Améliorations',
-                route: '/improvements',
-                category: 'execution'
-              };
-              executionCount += overdueImp.length;
-              total += overdueImp.length;
-            }
-          }
-        } catch (err) {
-          console.error('Erreur improvements:', err);
-        }
-      }
-      
-      // 3. Demandes d'intervention en retard (JAUNE)
-      if (canViewModule('interventionRequests')) {
-        try {
-          const irResponse = await fetch(`${backend_url}/api/intervention-requests`, {
-            headers: { Authorization: `Bearer ${token}` }
-          });
-          if (irResponse.ok) {
-            const interventionRequests = await irResponse.json();
-            const overdueIR = interventionRequests.filter(ir => {
-              if (!ir.date_limite_desiree || ir.statut === 'TERMINE' || ir.statut === 'ANNULE') return false;
-              const dueDate = new Date(ir.date_limite_desiree);
-              return dueDate < today;
-            });
-            if (overdueIR.length > 0) {
-              details.interventionRequests = {
-                count: overdueIR.length,
-                label: "Demandes d'intervention",
-                route: '/intervention-requests',
-                category: 'requests'
-              };
-              requestsCount += overdueIR.length;
-              total += overdueIR.length;
-            }
-          }
-        } catch (err) {
-          console.error('Erreur intervention requests:', err);
-        }
-      }
-      
-      // 4. Demandes d'amélioration en retard (JAUNE)
-      if (canViewModule('improvementRequests')) {
-        try {
-          const imprResponse = await fetch(`${backend_url}/api/improvement-requests`, {
-            headers: { Authorization: `Bearer ${token}` }
-          });
-          if (imprResponse.ok) {
-            const improvementRequests = await imprResponse.json();
-            const overdueIMPR = improvementRequests.filter(impr => {
-              if (!impr.date_limite_desiree || impr.statut === 'TERMINE' || impr.statut === 'ANNULE') return false;
-              const dueDate = new Date(impr.date_limite_desiree);
-              return dueDate < today;
-            });
-            if (overdueIMPR.length > 0) {
-              details.improvementRequests = {
-                count: overdueIMPR.length,
-                label: "Demandes d'amélioration",
-                route: '/improvement-requests',
-                category: 'requests'
-              };
-              requestsCount += overdueIMPR.length;
-              total += overdueIMPR.length;
-            }
-          }
-        } catch (err) {
-          console.error('Erreur improvement requests:', err);
-        }
-      }
-      
-      // 5. Maintenances préventives (BLEU)
-      if (canViewModule('preventiveMaintenance')) {
-        try {
-          const pmResponse = await fetch(`${backend_url}/api/preventive-maintenance`, {
-            headers: { Authorization: `Bearer ${token}` }
-          });
-          if (pmResponse.ok) {
-            const pms = await pmResponse.json();
-            const overduePM = pms.filter(pm => {
-              if (!pm.prochaineMaintenance || pm.statut !== 'ACTIF') return false;
-              const nextDate = new Date(pm.prochaineMaintenance);
-              return nextDate < today;
-            });
-            if (overduePM.length > 0) {
-              details.preventiveMaintenance = {
-                count: overduePM.length,
-                label: 'Maintenances préventives',
-                route: '/preventive-maintenance',
-                category: 'maintenance'
-              };
-              maintenanceCount += overduePM.length;
-              total += overduePM.length;
-            }
-          }
-        } catch (err) {
-          console.error('Erreur preventive maintenance:', err);
-        }
-      }
-      
-      setOverdueCount(total);
-      setOverdueExecutionCount(executionCount);
-      setOverdueRequestsCount(requestsCount);
-      setOverdueMaintenanceCount(maintenanceCount);
-      setOverdueDetails(details);
-    } catch (error) {
-      console.error('Erreur lors du chargement des échéances:', error);
-    }
-  };
-
-  const loadSurveillanceBadgeStats = async () => {
-    try {
-      const token = localStorage.getItem('token');
-      const backend_url = getBackendURL();
-      
-      const response = await fetch(`${backend_url}/api/surveillance/badge-stats`, {
+      const response = await fetch(`${backend_url}/api/badges`, {
         headers: {
           Authorization: `Bearer ${token}`
         }
@@ -411,30 +258,42 @@ const MainLayout = () => {
       
       if (response.ok) {
         const data = await response.json();
-        setSurveillanceBadge(data);
-      }
-    } catch (error) {
-      console.error('Erreur lors du chargement des stats de surveillance:', error);
-    }
-  };
-
-  const loadInventoryStats = async () => {
-    try {
-      const token = localStorage.getItem('token');
-      const backend_url = getBackendURL();
-      
-      const response = await fetch(`${backend_url}/api/inventory/stats`, {
-        headers: {
-          Authorization: `Bearer ${token}`
+        if (data.surveillance) {
+          setSurveillanceBadge(data.surveillance);
         }
-      });
-      
-      if (response.ok) {
-        const data = await response.json();
-        setInventoryStats(data);
+        if (data.inventory) {
+          setInventoryStats(data.inventory);
+        }
+        if (data.intervention_requests) {
+          setInterventionBadge(data.intervention_requests);
+        }
+        if (data.presqu_accident) {
+          setPresquAccidentBadge(data.presqu_accident);
+        }
+
+        // Échéances dépassées : un compteur par module visible par l'utilisateur
+        let total = 0;
+        let executionCount = 0; // Work orders + Improvements
+        let requestsCount = 0; // Demandes d'inter. + Demandes d'amél.
+        let maintenanceCount = 0; // Maintenances préventives
+        const details = {};
+        Object.entries(OVERDUE_MODULES).forEach(([module, config]) => {
+          const count = data[`overdue_${module}`]?.count || 0;
+          if (count === 0) return;
+          details[module] = { count, ...config };
+          total += count;
+          if (config.category === 'execution') executionCount += count;
+          if (config.category === 'requests') requestsCount += count;
+          if (config.category === 'maintenance') maintenanceCount += count;
+        });
+        setOverdueCount(total);
+        setOverdueExecutionCount(executionCount);
+        setOverdueRequestsCount(requestsCount);
+        setOverdueMaintenanceCount(maintenanceCount);
+        setOverdueDetails(details);
       }
     } catch (error) {
-      console.error('Erreur lors du chargement des stats inventaire:', error);
+      console.error('Erreur lors du chargement des badges:', error);
     }
   };
 
@@ -728,6 +587,62 @@ const MainLayout = () => {
             </div>
           </button>
           
+          {/* Badge Demandes d'intervention (non converties en ordre de travail) */}
+          {canView('interventionRequests') && (
+            <button 
+              className="p-2 hover:bg-gray-100 rounded-lg transition-colors relative group"
+              onClick={() => navigate('/intervention-requests')}
+              title="Demandes d'intervention en attente"
+            >
+              <MessageSquare size={20} className="text-gray-600" />
+              {interventionBadge.en_attente > 0 && (
+                <span className="absolute -top-1 -right-1 w-5 h-5 bg-yellow-500 rounded-full flex items-center justify-center text-white text-xs font-bold">
+                  {interventionBadge.en_attente > 9 ? '9+' : interventionBadge.en_attente}
+                </span>
+              )}
+              {/* Tooltip avec détails */}
+              <div className="absolute hidden group-hover:block right-0 mt-2 w-64 bg-white rounded-lg shadow-lg border border-gray-200 z-50 p-3">
+                <div className="text-sm font-semibold text-gray-800 mb-2">Demandes d'intervention</div>
+                <div className="space-y-2 text-sm">
+                  <div className="flex justify-between items-center">
+                    <span className="text-gray-600">En attente de conversion:</span>
+                    <span className="font-bold text-yellow-600">{interventionBadge.en_attente}</span>
+                  </div>
+                </div>
+              </div>
+            </button>
+          )}
+          
+          {/* Badge Presqu'accidents (à traiter + actions en retard) */}
+          {canView('presquaccident') && (
+            <button 
+              className="p-2 hover:bg-gray-100 rounded-lg transition-colors relative group"
+              onClick={() => navigate('/presqu-accident')}
+              title="Presqu'accidents à traiter"
+            >
+              <AlertTriangle size={20} className="text-gray-600" />
+              {(presquAccidentBadge.a_traiter + presquAccidentBadge.en_retard) > 0 && (
+                <span className="absolute -top-1 -right-1 w-5 h-5 bg-red-500 rounded-full flex items-center justify-center text-white text-xs font-bold">
+                  {(presquAccidentBadge.a_traiter + presquAccidentBadge.en_retard) > 9 ? '9+' : (presquAccidentBadge.a_traiter + presquAccidentBadge.en_retard)}
+                </span>
+              )}
+              {/* Tooltip avec détails */}
+              <div className="absolute hidden group-hover:block right-0 mt-2 w-64 bg-white rounded-lg shadow-lg border border-gray-200 z-50 p-3">
+                <div className="text-sm font-semibold text-gray-800 mb-2">Presqu'accidents</div>
+                <div className="space-y-2 text-sm">
+                  <div className="flex justify-between items-center">
+                    <span className="text-gray-600">À traiter:</span>
+                    <span className="font-bold text-orange-600">{presquAccidentBadge.a_traiter}</span>
+                  </div>
+                  <div className="flex justify-between items-center">
+                    <span className="text-gray-600">Actions en retard:</span>
+                    <span className="font-bold text-red-600">{presquAccidentBadge.en_retard}</span>
+                  </div>
+                </div>
+              </div>
+            </button>
+          )}
+          
           {/* Cloche notifications */}
           <button 
             className="p-2 hover:bg-gray-100 rounded-lg transition-colors relative"
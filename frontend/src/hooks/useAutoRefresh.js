@@ -1,13 +1,19 @@
 import { useEffect, useRef } from 'react';
+import { isRealtimeCovering } from './useRealtimeEvents';
 
 /**
  * Hook personnalisé pour rafraîchir automatiquement des données toutes les 5 secondes
  * Le rafraîchissement est invisible : il ne provoque de re-render que si les données ont changé
+ * Les données se rafraîchissent à la réception d'un événement 'realtimeChange' portant sur
+ * l'un des types d'entité donnés ; le polling n'est suspendu que si le flux temps réel est
+ * connecté et publie tous ces types
  * @param {Function} refreshFunction - Fonction à appeler pour rafraîchir les données (doit retourner une Promise)
  * @param {Array} dependencies - Tableau de dépendances (comme dans useEffect)
  * @param {number} interval - Intervalle en millisecondes (par défaut 5000ms = 5s)
+ * @param {Array} entityTypes - Types d'entité dont dépendent les données (ex: ['work_order']) ;
+ *   sans type, le polling n'est jamais suspendu
  */
-export const useAutoRefresh = (refreshFunction, dependencies = [], interval = 5000) => {
+export const useAutoRefresh = (refreshFunction, dependencies = [], interval = 5000, entityTypes = []) => {
   const intervalRef = useRef(null);
   const isInitialMount = useRef(true);
 
@@ -18,8 +24,24 @@ export const useAutoRefresh = (refreshFunction, dependencies = [], interval = 50
       isInitialMount.current = false;
     }
 
-    // Configurer le rafraîchissement automatique silencieux
+    // Rafraîchir dès qu'un changement concernant ces données est poussé par le serveur
+    const handleRealtimeChange = async (event) => {
+      if (!entityTypes.includes(event.detail?.entity_type)) {
+        return;
+      }
+      try {
+        await refreshFunction();
+      } catch (error) {
+        console.error('Erreur lors du rafraîchissement temps réel:', error);
+      }
+    };
+    window.addEventListener('realtimeChange', handleRealtimeChange);
+
+    // Configurer le rafraîchissement automatique silencieux (sauf si le flux temps réel couvre ces données)
     intervalRef.current = setInterval(async () => {
+      if (isRealtimeCovering(entityTypes)) {
+        return;
+      }
       try {
         // Exécuter le rafraîchissement en arrière-plan
         await refreshFunction();
@@ -30,6 +52,7 @@ export const useAutoRefresh = (refreshFunction, dependencies = [], interval = 50
 
     // Nettoyer l'intervalle au démontage
     return () => {
+      window.removeEventListener('realtimeChange', handleRealtimeChange);
       if (intervalRef.current) {
         clearInterval(intervalRef.current);
       }
@@ -0,0 +1,82 @@
+import { useEffect } from 'react';
+import { getBackendURL } from '../utils/config';
+
+// Événements window déjà écoutés par l'application pour chaque type d'entité
+const WINDOW_EVENTS = {
+  work_order: {
+    created: 'workOrderCreated',
+    updated: 'workOrderUpdated',
+    deleted: 'workOrderDeleted'
+  },
+  surveillance: {
+    created: 'surveillanceItemCreated',
+    updated: 'surveillanceItemUpdated',
+    deleted: 'surveillanceItemDeleted'
+  }
+};
+
+// Types d'entité publiés par le serveur sur le flux temps réel
+// (les autres données, ex: inventaire, presqu'accidents, restent rafraîchies par polling)
+export const REALTIME_ENTITY_TYPES = ['work_order', 'intervention_request', 'surveillance', 'demande_arret'];
+
+let connected = false;
+
+/**
+ * Indique si le flux temps réel est connecté (les rafraîchissements périodiques peuvent alors être suspendus)
+ */
+export const isRealtimeConnected = () => connected;
+
+/**
+ * Indique si tous les types d'entité donnés sont couverts par le flux temps réel connecté
+ * @param {Array} entityTypes - Types d'entité dont dépendent les données affichées
+ */
+export const isRealtimeCovering = (entityTypes) =>
+  connected && entityTypes.length > 0 && entityTypes.every((type) => REALTIME_ENTITY_TYPES.includes(type));
+
+/**
+ * Hook ouvrant le flux Server-Sent Events /api/events/stream.
+ * Chaque changement reçu est relayé en événement window 'realtimeChange' (detail = événement)
+ * ainsi qu'en événement spécifique existant (ex: 'workOrderCreated') quand il y en a un.
+ */
+export const useRealtimeEvents = () => {
+  useEffect(() => {
+    const token = localStorage.getItem('token');
+    if (!token || typeof EventSource === 'undefined') {
+      return undefined;
+    }
+
+    const source = new EventSource(
+      `${getBackendURL()}/api/events/stream?token=${encodeURIComponent(token)}`
+    );
+
+    source.onopen = () => {
+      connected = true;
+    };
+
+    source.onerror = () => {
+      // EventSource se reconnecte automatiquement ; le polling reprend en attendant
+      connected = false;
+    };
+
+    source.addEventListener('change', (message) => {
+      try {
+        const event = JSON.parse(message.data);
+        window.dispatchEvent(new CustomEvent('realtimeChange', { detail: event }));
+
+        const specific = WINDOW_EVENTS[event.entity_type]?.[event.action];
+        if (specific) {
+          window.dispatchEvent(new Event(specific));
+        }
+      } catch (error) {
+        console.error('Erreur lecture événement temps réel:', error);
+      }
+    });
+
+    return () => {
+      connected = false;
+      source.close();
+    };
+  }, []);
+};
+
+export default useRealtimeEvents;
@@ -84,11 +84,13 @@ function Documentations() {
   const loadPoles = async () => {
     try {
       setLoading(true);
-      const polesData = await documentationsAPI.getPoles();
-      
-      // Les pôles retournés contiennent déjà les documents et bons de travail
+      // Nombres seulement : les documents et bons sont chargés à l'ouverture d'un pôle
+      const polesData = await documentationsAPI.getPoles({ include: 'counts' });
       setPoles(polesData);
       setFilteredPoles(polesData);
+      
+      // Recharger le contenu des pôles déjà ouverts
+      new Set([...expandedBonsPoles, ...expandedDocsPoles]).forEach(loadPoleContent);
     } catch (error) {
       console.error('Erreur chargement pôles:', error);
       toast({
@@ -181,12 +183,33 @@ function Documentations() {
     navigate(`/documentations/${poleId}`);
   };
 
+  const loadPoleContent = async (poleId) => {
+    try {
+      const poleData = await documentationsAPI.getPole(poleId);
+      setPoles(prev => prev.map(pole => (
+        pole.id === poleId
+          ? { ...pole, documents: poleData.documents, bons_travail: poleData.bons_travail }
+          : pole
+      )));
+    } catch (error) {
+      console.error('Erreur chargement contenu du pôle:', error);
+    }
+  };
+
+  const ensurePoleContent = (poleId) => {
+    const pole = poles.find(p => p.id === poleId);
+    if (pole && !pole.documents) {
+      loadPoleContent(poleId);
+    }
+  };
+
   const toggleBonsExpansion = (poleId) => {
     const newExpanded = new Set(expandedBonsPoles);
     if (newExpanded.has(poleId)) {
       newExpanded.delete(poleId);
     } else {
       newExpanded.add(poleId);
+      ensurePoleContent(poleId);
     }
     setExpandedBonsPoles(newExpanded);
   };
@@ -197,6 +220,7 @@ function Documentations() {
       newExpanded.delete(poleId);
     } else {
       newExpanded.add(poleId);
+      ensurePoleContent(poleId);
     }
     setExpandedDocsPoles(newExpanded);
   };
@@ -426,11 +450,11 @@ function Documentations() {
                           <div className="flex flex-col gap-1 text-xs text-gray-500">
                             <span className="flex items-center gap-1">
                               <span className="w-2 h-2 bg-blue-500 rounded-full"></span>
-                              {pole.bons_travail?.length || 0} bon(s)
+                              {pole.bons_travail?.length ?? pole.bons_travail_count ?? 0} bon(s)
                             </span>
                             <span className="flex items-center gap-1">
                               <span className="w-2 h-2 bg-green-500 rounded-full"></span>
-                              {pole.documents?.length || 0} doc(s)
+                              {pole.documents?.length ?? pole.documents_count ?? 0} doc(s)
                             </span>
                           </div>
                           <Button
@@ -462,7 +486,9 @@ function Documentations() {
                           <div className="px-4 py-2 bg-blue-100">
                             <p className="text-xs font-semibold text-blue-800">📋 BONS DE TRAVAIL</p>
                           </div>
-                          {pole.bons_travail && pole.bons_travail.length > 0 ? (
+                          {!pole.bons_travail ? (
+                            <div className="p-4 pl-16 text-sm text-gray-500">Chargement...</div>
+                          ) : pole.bons_travail.length > 0 ? (
                             <div className="divide-y divide-blue-200">
                               {pole.bons_travail.map((bon) => (
                                 <div
@@ -533,7 +559,9 @@ function Documentations() {
                           <div className="px-4 py-2 bg-green-100">
                             <p className="text-xs font-semibold text-green-800">📄 DOCUMENTS</p>
                           </div>
-                          {pole.documents && pole.documents.length > 0 ? (
+                          {!pole.documents ? (
+                            <div className="p-4 pl-16 text-sm text-gray-500">Chargement...</div>
+                          ) : pole.documents.length > 0 ? (
                             <div className="divide-y divide-green-200">
                               {pole.documents.map((doc) => {
                                 const DocIcon = getFileIcon(doc.fichier_type);
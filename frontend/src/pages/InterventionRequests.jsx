@@ -58,7 +58,7 @@ const InterventionRequests = () => {
     }
   };
 
-  useAutoRefresh(loadRequests, []);
+  useAutoRefresh(loadRequests, [], 5000, ['intervention_request']);
 
   const handleDelete = async (id) => {
     setItemToDelete(id);
@@ -22,7 +22,11 @@ const Journal = () => {
   const [pagination, setPagination] = useState({
     skip: 0,
     limit: 50,
-    total: 0
+    total: 0,
+    totalEstimated: false,
+    // Curseur de chaque page visitée (le premier est la page 1) pour revenir en arrière
+    cursors: [null],
+    nextCursor: null
   });
 
   const actionTypes = {
@@ -51,9 +55,10 @@ const Journal = () => {
   const fetchLogs = async () => {
     try {
       setLoading(true);
+      const cursor = pagination.cursors[pagination.cursors.length - 1];
       const params = {
-        skip: pagination.skip,
         limit: pagination.limit,
+        ...(cursor && { cursor }),
         ...(filters.action && filters.action !== 'all' && { action: filters.action }),
         ...(filters.entity_type && filters.entity_type !== 'all' && { entity_type: filters.entity_type }),
         ...(filters.user_id && { user_id: filters.user_id })
@@ -61,7 +66,12 @@ const Journal = () => {
 
       const response = await auditAPI.getAuditLogs(params);
       setLogs(response.logs);
-      setPagination(prev => ({ ...prev, total: response.total }));
+      setPagination(prev => ({
+        ...prev,
+        total: response.total,
+        totalEstimated: response.total_estimated,
+        nextCursor: response.next_cursor
+      }));
     } catch (error) {
       console.error('Erreur lors du chargement des logs:', error);
       toast({
@@ -115,15 +125,34 @@ const Journal = () => {
     return formatter.format(date);
   };
 
+  // Un changement de filtre repart de la première page (les curseurs ne valent que pour l'ancien filtre)
+  const updateFilters = (newFilters) => {
+    setFilters(newFilters);
+    setPagination(prev => ({
+      ...prev,
+      skip: 0,
+      cursors: [null],
+      nextCursor: null
+    }));
+  };
+
   const handleNextPage = () => {
-    if (pagination.skip + pagination.limit < pagination.total) {
-      setPagination(prev => ({ ...prev, skip: prev.skip + prev.limit }));
+    if (pagination.nextCursor) {
+      setPagination(prev => ({
+        ...prev,
+        skip: prev.skip + prev.limit,
+        cursors: [...prev.cursors, prev.nextCursor]
+      }));
     }
   };
 
   const handlePrevPage = () => {
-    if (pagination.skip > 0) {
-      setPagination(prev => ({ ...prev, skip: Math.max(0, prev.skip - prev.limit) }));
+    if (pagination.cursors.length > 1) {
+      setPagination(prev => ({
+        ...prev,
+        skip: Math.max(0, prev.skip - prev.limit),
+        cursors: prev.cursors.slice(0, -1)
+      }));
     }
   };
 
@@ -159,7 +188,7 @@ const Journal = () => {
           <div className="grid grid-cols-1 md:grid-cols-4 gap-4">
             <Select
               value={filters.action || "all"}
-              onValueChange={(value) => setFilters(prev => ({ ...prev, action: value === "all" ? "" : value }))}
+              onValueChange={(value) => updateFilters(prev => ({ ...prev, action: value === "all" ? "" : value }))}
             >
               <SelectTrigger>
                 <SelectValue placeholder="Type d'action" />
@@ -176,7 +205,7 @@ const Journal = () => {
 
             <Select
               value={filters.entity_type || "all"}
-              onValueChange={(value) => setFilters(prev => ({ ...prev, entity_type: value === "all" ? "" : value }))}
+              onValueChange={(value) => updateFilters(prev => ({ ...prev, entity_type: value === "all" ? "" : value }))}
             >
               <SelectTrigger>
                 <SelectValue placeholder="Type d'entité" />
@@ -200,7 +229,7 @@ const Journal = () => {
             </Button>
 
             <Button 
-              onClick={() => setFilters({ action: 'all', entity_type: 'all', user_id: '', search: '' })}
+              onClick={() => updateFilters({ action: 'all', entity_type: 'all', user_id: '', search: '' })}
               variant="outline"
               className="w-full"
             >
@@ -281,12 +310,12 @@ const Journal = () => {
               {/* Pagination */}
               <div className="flex justify-between items-center p-4 border-t">
                 <div className="text-sm text-gray-500">
-                  Affichage de {pagination.skip + 1} à {Math.min(pagination.skip + pagination.limit, pagination.total)} sur {pagination.total} logs
+                  Affichage de {pagination.skip + 1} à {Math.min(pagination.skip + pagination.limit, pagination.total)} sur {pagination.totalEstimated ? 'environ ' : ''}{pagination.total} logs
                 </div>
                 <div className="flex gap-2">
                   <Button
                     onClick={handlePrevPage}
-                    disabled={pagination.skip === 0}
+                    disabled={pagination.cursors.length <= 1}
                     variant="outline"
                     size="sm"
                   >
@@ -294,7 +323,7 @@ const Journal = () => {
                   </Button>
                   <Button
                     onClick={handleNextPage}
-                    disabled={pagination.skip + pagination.limit >= pagination.total}
+                    disabled={!pagination.nextCursor}
                     variant="outline"
                     size="sm"
                   >
@@ -174,6 +174,20 @@ function PresquAccidentList() {
         title: 'Succès', 
         description: `${result.imported_count} presqu'accident(s) importé(s)` 
       });
+      if (result.error_report_id) {
+        // Rapport complet des lignes refusées
+        const blob = await presquAccidentAPI.downloadImportReport(result.error_report_id);
+        const url = window.URL.createObjectURL(blob);
+        const a = document.createElement('a');
+        a.href = url;
+        a.download = 'erreurs_import_presqu_accidents.csv';
+        a.click();
+        toast({
+          title: 'Lignes refusées',
+          description: `${result.error_count} erreur(s) : voir le rapport téléchargé`,
+          variant: 'destructive'
+        });
+      }
       loadData();
       if (importInputRef.current) importInputRef.current.value = '';
     } catch (error) {
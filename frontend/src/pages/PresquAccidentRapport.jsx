@@ -526,7 +526,9 @@ const PresquAccidentRapport = () => {
               <div>
                 <p className="text-sm font-medium text-gray-600">Délai moyen</p>
                 <p className="text-3xl font-bold text-gray-900 mt-2">{stats.global.delai_moyen_traitement}</p>
-                <p className="text-xs text-gray-500 mt-1">jours</p>
+                <p className="text-xs text-gray-500 mt-1">
+                  jours (médiane {stats.global.delai_median_traitement ?? 0} · P90 {stats.global.delai_p90_traitement ?? 0})
+                </p>
               </div>
               <div className="bg-gray-100 p-3 rounded-xl">
                 <Clock size={24} className="text-gray-600" />
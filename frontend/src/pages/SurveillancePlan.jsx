@@ -65,12 +65,8 @@ function SurveillancePlan() {
     try {
       setLoading(true);
       
-      // D'abord, vérifier et mettre à jour automatiquement les statuts selon les échéances
-      await surveillanceAPI.checkDueDates().catch(err => {
-        console.warn('Erreur vérification échéances (non bloquant):', err);
-      });
-      
-      // Ensuite, charger toutes les données
+      // Les statuts selon les échéances sont mis à jour par le planificateur côté serveur
+      // Charger toutes les données
       const [itemsData, statsData, alertsData] = await Promise.all([
         surveillanceAPI.getItems(),
         surveillanceAPI.getStats(),
@@ -183,6 +179,20 @@ function SurveillancePlan() {
     try {
       const result = await surveillanceAPI.importData(formData);
       toast({ title: 'Succès', description: `${result.imported_count} items importés` });
+      if (result.error_report_id) {
+        // Rapport complet des lignes refusées
+        const blob = await surveillanceAPI.downloadImportReport(result.error_report_id);
+        const url = window.URL.createObjectURL(blob);
+        const a = document.createElement('a');
+        a.href = url;
+        a.download = 'erreurs_import_plan_surveillance.csv';
+        a.click();
+        toast({
+          title: 'Lignes refusées',
+          description: `${result.error_count} erreur(s) : voir le rapport téléchargé`,
+          variant: 'destructive'
+        });
+      }
       loadData();
     } catch (error) {
       toast({ title: 'Erreur', description: "Erreur lors de l'import", variant: 'destructive' });
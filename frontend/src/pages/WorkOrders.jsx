@@ -155,7 +155,7 @@ const WorkOrders = () => {
   };
   
   // Rafraîchissement automatique toutes les 5 secondes (invisible)
-  useAutoRefresh(loadWorkOrders, [dateFilter, dateType, customStartDate, customEndDate]);
+  useAutoRefresh(loadWorkOrders, [dateFilter, dateType, customStartDate, customEndDate], 5000, ['work_order']);
 
   const handleDelete = async (id) => {
     setItemToDelete(id);
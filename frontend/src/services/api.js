@@ -363,6 +363,10 @@ export const surveillanceAPI = {
   
   exportTemplate: () => api.get('/surveillance/export/template', {
     responseType: 'blob'
+  }).then(res => res.data),
+  
+  downloadImportReport: (reportId) => api.get(`/surveillance/import/reports/${reportId}`, {
+    responseType: 'blob'
   }).then(res => res.data)
 };
 
@@ -397,13 +401,17 @@ export const presquAccidentAPI = {
   
   exportTemplate: () => api.get('/presqu-accident/export/template', {
     responseType: 'blob'
+  }).then(res => res.data),
+  
+  downloadImportReport: (reportId) => api.get(`/presqu-accident/import/reports/${reportId}`, {
+    responseType: 'blob'
   }).then(res => res.data)
 };
 
 // ==================== DOCUMENTATIONS ====================
 export const documentationsAPI = {
   // Pôles de Service
-  getPoles: () => api.get('/documentations/poles').then(res => res.data),
+  getPoles: (params) => api.get('/documentations/poles', { params }).then(res => res.data),
   getPole: (id) => api.get(`/documentations/poles/${id}`).then(res => res.data),
   createPole: (data) => api.post('/documentations/poles', data).then(res => res.data),
   updatePole: (id, data) => api.put(`/documentations/poles/${id}`, data).then(res => res.data),
@@ -0,0 +1,10 @@
+import os
+import sys
+from pathlib import Path
+
+# Les modules du backend s'importent à plat (comme depuis backend/server.py)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+# server.py lit la configuration MongoDB à l'import (aucune connexion n'est ouverte)
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "gmao_tests")
@@ -0,0 +1,97 @@
+import asyncio
+
+from counter_service import SEQUENCES, CounterService
+
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    async def to_list(self, length=None):
+        return self.documents[:length]
+
+
+class FakeCollection:
+    """Collection en mémoire : seules les opérations utilisées par CounterService"""
+
+    def __init__(self, documents=None):
+        self.documents = {doc["_id"]: doc for doc in documents or []}
+        self.aggregations = 0
+
+    def aggregate(self, pipeline):
+        # Pipeline de CounterService._seed : $max des numéros convertibles en entier
+        self.aggregations += 1
+        numbers = []
+        for doc in self.documents.values():
+            try:
+                numbers.append(int(doc.get("numero")))
+            except (TypeError, ValueError):
+                pass
+        if not self.documents:
+            return FakeCursor([])
+        return FakeCursor([{"_id": None, "max": max(numbers) if numbers else None}])
+
+    async def update_one(self, query, update, upsert=False):
+        doc = self.documents.setdefault(query["_id"], {"_id": query["_id"]})
+        for field, value in update["$max"].items():
+            doc[field] = max(doc.get(field, value), value)
+
+    async def find_one_and_update(self, query, update, upsert=False, return_document=None):
+        doc = self.documents.setdefault(query["_id"], {"_id": query["_id"]})
+        for field, value in update["$inc"].items():
+            doc[field] = doc.get(field, 0) + value
+        return dict(doc)
+
+
+class FakeDB:
+    def __init__(self, **collections):
+        self.collections = collections
+
+    def __getattr__(self, name):
+        return self[name]
+
+    def __getitem__(self, name):
+        return self.collections.setdefault(name, FakeCollection())
+
+
+def _next(service, name, times=1):
+    async def run():
+        return [await service.next_value(name) for _ in range(times)]
+    return asyncio.run(run())
+
+
+def test_collection_vide_part_de_la_base():
+    service = CounterService(FakeDB())
+    base = SEQUENCES["work_orders"][1]
+    assert _next(service, "work_orders", 2) == [base + 1, base + 2]
+
+
+def test_aligne_sur_le_plus_grand_numero_existant():
+    work_orders = FakeCollection([
+        {"_id": 1, "numero": "6001"},
+        {"_id": 2, "numero": "6042"},
+        {"_id": 3, "numero": "PM-20240101-ABC"},  # numéro non numérique ignoré
+    ])
+    service = CounterService(FakeDB(work_orders=work_orders))
+    assert _next(service, "work_orders") == [6043]
+
+
+def test_numeros_inferieurs_a_la_base():
+    improvements = FakeCollection([{"_id": 1, "numero": "12"}])
+    service = CounterService(FakeDB(improvements=improvements))
+    assert _next(service, "improvements") == [SEQUENCES["improvements"][1] + 1]
+
+
+def test_compteur_deja_en_avance_conserve():
+    # $max : un compteur plus avancé que la collection (numéros supprimés) ne recule pas
+    counters = FakeCollection([{"_id": "bons_travail", "seq": 50}])
+    bons = FakeCollection([{"_id": 1, "numero": "10"}])
+    service = CounterService(FakeDB(counters=counters, bons_travail=bons))
+    assert _next(service, "bons_travail") == [51]
+
+
+def test_alignement_une_seule_fois_par_processus():
+    work_orders = FakeCollection([{"_id": 1, "numero": "6000"}])
+    service = CounterService(FakeDB(work_orders=work_orders))
+    _next(service, "work_orders", 3)
+    assert work_orders.aggregations == 1
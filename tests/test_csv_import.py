@@ -0,0 +1,88 @@
+import pandas as pd
+
+from csv_import import ImportFrame
+
+
+def _frame(rows):
+    return ImportFrame(pd.DataFrame(rows, dtype=str))
+
+
+def _errors(frame):
+    return frame.errors()[["ligne", "colonne", "valeur", "erreur"]].to_dict("records")
+
+
+def test_valeur_obligatoire_et_numero_de_ligne():
+    frame = _frame([{"titre": "A"}, {"titre": "  "}, {"titre": "C"}])
+    titres = frame.text("titre", required=True)
+
+    errors = _errors(frame)
+    # Ligne 1 = en-tête : la deuxième ligne de données est la ligne 3 du fichier
+    assert [e["ligne"] for e in errors] == [3]
+    assert errors[0]["colonne"] == "titre"
+    assert errors[0]["valeur"] == ""
+    assert [ligne for ligne, _ in frame.valid_rows({"titre": titres})] == [2, 4]
+
+
+def test_valeur_par_defaut():
+    frame = _frame([{"batiment": ""}, {"batiment": " B2 "}])
+    values = frame.text("batiment", default="NC")
+    assert values.tolist() == ["NC", "B2"]
+    assert frame.errors().empty
+
+
+def test_colonne_absente():
+    frame = _frame([{"autre": "x"}])
+    frame.text("titre", required=True)
+    assert _errors(frame)[0]["colonne"] == "titre"
+
+
+def test_choix_sans_tenir_compte_de_la_casse():
+    frame = _frame([{"statut": "planifier"}, {"statut": "inconnu"}, {"statut": ""}])
+    statuts = frame.choice("statut", ["PLANIFIER", "REALISE"], default="PLANIFIER")
+
+    errors = _errors(frame)
+    assert [(e["ligne"], e["valeur"]) for e in errors] == [(3, "inconnu")]
+    assert "PLANIFIER, REALISE" in errors[0]["erreur"]
+    assert [row["statut"] for _, row in frame.valid_rows({"statut": statuts})] == ["PLANIFIER", "PLANIFIER"]
+
+
+def test_choix_obligatoire_sans_defaut():
+    frame = _frame([{"statut": ""}])
+    frame.choice("statut", ["A", "B"])
+    assert _errors(frame)[0]["erreur"] == "Valeur obligatoire manquante"
+
+
+def test_dates_iso_et_francaises():
+    frame = _frame([
+        {"date": "2024-03-15"},
+        {"date": "15/03/2024"},
+        {"date": "2024-03-15T10:30:00"},
+        {"date": ""},
+        {"date": "31/02/2024"},
+        {"date": "demain"},
+    ])
+    dates = frame.date("date")
+
+    assert [(e["ligne"], e["valeur"]) for e in _errors(frame)] == [(6, "31/02/2024"), (7, "demain")]
+    rows = frame.valid_rows({"date": dates})
+    assert [row["date"] for _, row in rows] == ["2024-03-15", "2024-03-15", "2024-03-15", None]
+
+
+def test_date_obligatoire():
+    frame = _frame([{"date": ""}])
+    frame.date("date", required=True)
+    assert _errors(frame)[0]["erreur"] == "Valeur obligatoire manquante"
+
+
+def test_erreurs_triees_par_ligne():
+    frame = _frame([
+        {"titre": "A", "date": "x"},
+        {"titre": "", "date": "2024-01-01"},
+        {"titre": "", "date": "y"},
+    ])
+    frame.date("date")
+    frame.text("titre", required=True)
+    frame.add_errors([{"ligne": 2, "colonne": "", "valeur": "", "erreur": "Doublon"}])
+
+    assert frame.errors()["ligne"].tolist() == [2, 2, 3, 4, 4]
+    assert frame.valid_rows({"titre": frame.text("titre")}) == []
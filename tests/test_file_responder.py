@@ -0,0 +1,46 @@
+import pytest
+from fastapi import HTTPException
+
+from file_responder import _parse_range
+
+
+def test_plage_complete():
+    assert _parse_range("bytes=0-99", 1000) == (0, 99)
+
+
+def test_plage_ouverte():
+    assert _parse_range("bytes=500-", 1000) == (500, 999)
+
+
+def test_suffixe():
+    assert _parse_range("bytes=-100", 1000) == (900, 999)
+    # Suffixe plus long que le fichier : tout le fichier
+    assert _parse_range("bytes=-5000", 1000) == (0, 999)
+
+
+def test_fin_ramenee_a_la_taille():
+    assert _parse_range("bytes=900-5000", 1000) == (900, 999)
+
+
+def test_unite_insensible_a_la_casse():
+    assert _parse_range("Bytes= 10-20", 1000) == (10, 20)
+
+
+@pytest.mark.parametrize("header", [
+    "items=0-10",       # unité inconnue
+    "bytes=0-10,20-30",  # plusieurs plages
+    "bytes=abc-10",     # syntaxe invalide
+    "bytes=-0",         # suffixe vide
+    "bytes=-",
+    "bytes=50-10",      # fin avant le début
+])
+def test_entete_ignore(header):
+    assert _parse_range(header, 1000) is None
+
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=2000-3000"])
+def test_hors_du_fichier(header):
+    with pytest.raises(HTTPException) as exc:
+        _parse_range(header, 1000)
+    assert exc.value.status_code == 416
+    assert exc.value.headers["Content-Range"] == "bytes */1000"
@@ -0,0 +1,100 @@
+import json
+
+import pytest
+
+from models import MeterReadingBulkItem
+from server import compute_reading_consumption, parse_bulk_readings_payload
+
+
+def test_payload_json_tableau():
+    rows = [{"meter_id": "m1", "valeur": 10}, {"meter_id": "m1", "valeur": 12}]
+    assert parse_bulk_readings_payload(json.dumps(rows).encode(), "application/json") == rows
+
+
+def test_payload_json_objet_readings():
+    body = json.dumps({"readings": [{"meter_id": "m1", "valeur": 3}]}).encode()
+    assert parse_bulk_readings_payload(body, "application/json") == [{"meter_id": "m1", "valeur": 3}]
+
+
+def test_payload_json_vide():
+    assert parse_bulk_readings_payload(b"", "application/json") == []
+
+
+def test_payload_json_invalide():
+    with pytest.raises(ValueError):
+        parse_bulk_readings_payload(b'"texte"', "application/json")
+
+
+def test_payload_ndjson():
+    body = b'{"meter_id": "m1", "valeur": 1}\n\n{"meter_id": "m2", "valeur": 2}\n'
+    rows = parse_bulk_readings_payload(body, "application/x-ndjson")
+    assert rows == [{"meter_id": "m1", "valeur": 1}, {"meter_id": "m2", "valeur": 2}]
+
+
+def test_payload_ndjson_par_extension():
+    body = b'{"meter_id": "m1", "valeur": 1}\n'
+    assert parse_bulk_readings_payload(body, "application/octet-stream", "releves.jsonl") == [{"meter_id": "m1", "valeur": 1}]
+
+
+def test_payload_csv_point_virgule_et_bom():
+    body = "\ufeffmeter_id ;valeur;notes\nm1;10,5;\nm2;7;ok, vérifié\n".encode("utf-8")
+    rows = parse_bulk_readings_payload(body, "text/csv")
+    # En-têtes nettoyés, cellules vides retirées, virgule décimale convertie
+    assert rows == [{"meter_id": "m1", "valeur": "10.5"}, {"meter_id": "m2", "valeur": "7", "notes": "ok, vérifié"}]
+
+
+def test_payload_csv_francais_valide_par_le_modele():
+    body = (
+        "meter_id;date_releve;valeur;prix_unitaire\n"
+        "m1;2024-03-01;1 234,5;0,18\n"
+        "m1;2024-04-01;1 300;\n"
+    ).encode("utf-8")
+    items = [MeterReadingBulkItem(**row) for row in parse_bulk_readings_payload(body, "text/csv")]
+    assert [item.valeur for item in items] == [1234.5, 1300.0]
+    assert items[0].prix_unitaire == 0.18
+    assert items[1].prix_unitaire is None
+
+
+def test_payload_csv_virgule_garde_les_decimales_a_point():
+    body = b"meter_id,valeur\nm1,10.5\n"
+    assert parse_bulk_readings_payload(body, "text/csv") == [{"meter_id": "m1", "valeur": "10.5"}]
+
+
+def test_payload_csv_par_extension():
+    body = b"meter_id,valeur\nm1,4\n"
+    assert parse_bulk_readings_payload(body, "", "export.CSV") == [{"meter_id": "m1", "valeur": "4"}]
+
+
+def test_consommation_premier_releve():
+    reading = {"valeur": 100}
+    compute_reading_consumption(reading, None, {"prix_unitaire": 2})
+    assert reading["consommation"] == 0
+    assert reading["cout"] == 0
+
+
+def test_consommation_et_cout():
+    reading = {"valeur": 130}
+    compute_reading_consumption(reading, {"valeur": 100}, {"prix_unitaire": 0.5})
+    assert reading["consommation"] == 30
+    assert reading["cout"] == 15
+
+
+def test_prix_du_releve_prioritaire():
+    reading = {"valeur": 110, "prix_unitaire": 3}
+    compute_reading_consumption(reading, {"valeur": 100}, {"prix_unitaire": 1})
+    assert reading["cout"] == 30
+
+
+def test_consommation_negative_ramenee_a_zero():
+    # Compteur remis à zéro : pas de consommation négative ni de coût
+    reading = {"valeur": 5}
+    compute_reading_consumption(reading, {"valeur": 100}, {"prix_unitaire": 1})
+    assert reading["consommation"] == 0
+    assert reading["cout"] is None
+
+
+def test_sans_prix():
+    reading = {"valeur": 120}
+    compute_reading_consumption(reading, {"valeur": 100}, {})
+    assert reading["consommation"] == 20
+    assert reading["cout"] is None
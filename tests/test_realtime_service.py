@@ -0,0 +1,54 @@
+import asyncio
+import time
+
+from realtime_service import RealtimeService
+
+ADMIN = {"email": "admin@test", "role": "ADMIN"}
+
+
+class FakeRequest:
+    async def is_disconnected(self):
+        return False
+
+
+def _collect(service, refresh_user, publish=None):
+    async def run():
+        chunks = []
+        async for chunk in service.stream(ADMIN, FakeRequest(), refresh_user):
+            chunks.append(chunk)
+            if publish and len(chunks) == 1:
+                publish()
+        return chunks
+    return asyncio.run(run())
+
+
+def test_flux_ferme_quand_la_session_expire():
+    service = RealtimeService(heartbeat=0.01)
+    calls = []
+
+    async def refresh_user():
+        calls.append(1)
+        return ADMIN if len(calls) < 3 else None
+
+    chunks = _collect(service, refresh_user)
+    assert chunks[0].startswith("retry:")
+    assert len(calls) == 3
+    assert service.connection_count == 0
+
+
+def test_evenement_filtre_apres_retrait_de_permission():
+    service = RealtimeService(heartbeat=0.01)
+    viewer = {"email": "viewer@test", "role": "VISUALISEUR", "permissions": {}}
+    calls = []
+
+    async def refresh_user():
+        calls.append(1)
+        return viewer if len(calls) == 1 else None
+
+    def publish():
+        # Publié pour l'administrateur, lu après un heartbeat où les droits ont été retirés
+        service.publish("work_order", "updated", "wo1")
+        time.sleep(0.02)
+
+    chunks = _collect(service, refresh_user, publish)
+    assert not any(chunk.startswith("event: change") for chunk in chunks)
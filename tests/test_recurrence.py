@@ -0,0 +1,108 @@
+from datetime import datetime
+
+from recurrence import (
+    DEFAULT_STEP,
+    occurrence_rank,
+    occurrences_between,
+    periodicite_step,
+    pm_frequency_step,
+    step_from,
+)
+
+
+def test_periodicite_numerique():
+    assert periodicite_step("6 mois") == (6, 0)
+    assert periodicite_step("1 an") == (12, 0)
+    assert periodicite_step("3 ans") == (36, 0)
+    assert periodicite_step("2 semaines") == (0, 14)
+    assert periodicite_step("15 jours") == (0, 15)
+
+
+def test_periodicite_mots_cles():
+    assert periodicite_step("Trimestriel") == (3, 0)
+    assert periodicite_step("hebdomadaire") == (0, 7)
+    assert periodicite_step("inconnue") == DEFAULT_STEP
+    assert periodicite_step(None) == DEFAULT_STEP
+
+
+def test_periodicite_nulle_pas_par_defaut():
+    assert periodicite_step("0 mois") == DEFAULT_STEP
+    assert periodicite_step("0 jours") == DEFAULT_STEP
+    assert periodicite_step("0 fois par an") == DEFAULT_STEP
+
+
+def test_periodicite_fois_par():
+    assert periodicite_step("2 fois par an") == (6, 0)
+    assert periodicite_step("4 fois par an") == (3, 0)
+    assert periodicite_step("5 fois par an") == (0, 73)
+    assert periodicite_step("1 fois par mois") == (1, 0)
+    assert periodicite_step("2 fois par mois") == (0, 15)
+
+
+def test_pm_frequency_step():
+    assert pm_frequency_step("MENSUEL") == (1, 0)
+    assert pm_frequency_step("hebdomadaire") == (0, 7)
+    assert pm_frequency_step("???") == DEFAULT_STEP
+
+
+def test_fin_de_mois_sans_derive():
+    anchor = datetime(2024, 1, 31)
+    assert step_from(anchor, (1, 0), 1) == datetime(2024, 2, 29)
+    assert step_from(anchor, (1, 0), 2) == datetime(2024, 3, 31)
+    assert occurrences_between(anchor, (1, 0), datetime(2024, 2, 1), datetime(2024, 4, 30)) == [
+        datetime(2024, 2, 29),
+        datetime(2024, 3, 31),
+        datetime(2024, 4, 30),
+    ]
+
+
+def test_occurrences_bornes_incluses():
+    anchor = datetime(2024, 1, 1)
+    dates = occurrences_between(anchor, (0, 7), datetime(2024, 1, 8), datetime(2024, 1, 22))
+    assert dates == [datetime(2024, 1, 8), datetime(2024, 1, 15), datetime(2024, 1, 22)]
+
+
+def test_occurrences_ancre_apres_la_fin():
+    assert occurrences_between(datetime(2025, 1, 1), (1, 0), datetime(2024, 1, 1), datetime(2024, 12, 31)) == []
+
+
+def test_occurrences_pas_nul():
+    # Un pas nul ne doit ni lever ZeroDivisionError ni boucler indéfiniment
+    anchor = datetime(2024, 1, 1)
+    dates = occurrences_between(anchor, (0, 0), datetime(2024, 1, 15), datetime(2024, 3, 1))
+    assert dates == [datetime(2024, 1, 31), datetime(2024, 3, 1)]
+
+
+def test_occurrence_rank():
+    anchor = datetime(2024, 1, 31)
+    assert occurrence_rank(anchor, (1, 0), datetime(2024, 1, 1)) == 0
+    assert occurrence_rank(anchor, (1, 0), datetime(2024, 2, 29)) == 1
+    assert occurrence_rank(anchor, (1, 0), datetime(2024, 3, 1)) == 2
+
+
+def test_valeur_stockee_pour_comparer_l_echeance():
+    from datetime import timezone, timedelta
+    from server import stored_value
+
+    stored = datetime(2024, 1, 31, 8, 0, 0, 123000)
+    # Même instant renvoyé par le formulaire avec fuseau et microsecondes
+    submitted = datetime(2024, 1, 31, 9, 0, 0, 123456, tzinfo=timezone(timedelta(hours=1)))
+    assert stored_value(submitted) == stored_value(stored)
+    assert stored_value("MENSUEL") == "MENSUEL"
+
+
+def test_numero_pm_sans_collision_entre_maintenances():
+    from bson import ObjectId
+    from server import build_pm_work_order
+
+    occurrence = datetime(2024, 3, 1)
+    now = datetime(2024, 3, 2)
+    # Deux identifiants qui partagent leurs 6 derniers caractères
+    pm_a = {"_id": ObjectId("65a000000000000000abcdef"), "titre": "A", "equipement_id": "e1"}
+    pm_b = {"_id": ObjectId("65b000000000000000abcdef"), "titre": "B", "equipement_id": "e1"}
+    wo_a = build_pm_work_order(pm_a, None, occurrence, now)
+    wo_b = build_pm_work_order(pm_b, None, occurrence, now)
+    assert wo_a["numero"] != wo_b["numero"]
+    # Une deuxième exécution produit le même numéro et la même clé de dédoublonnage
+    again = build_pm_work_order(pm_a, None, occurrence, now)
+    assert (again["numero"], again["pm_occurrence"]) == (wo_a["numero"], wo_a["pm_occurrence"])
@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import upload_service
+
+
+@pytest.fixture(autouse=True)
+def sessions_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(upload_service, "SESSIONS_DIR", tmp_path / "_sessions")
+    monkeypatch.setattr(upload_service, "_session_locks", {})
+
+
+async def _stream(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+def _append(upload_id, offset, *chunks, user_id="u1"):
+    return asyncio.run(upload_service.append_chunk(upload_id, user_id, offset, _stream(*chunks)))
+
+
+def _create(total_size, max_size=upload_service.MAX_UPLOAD_SIZE):
+    return asyncio.run(upload_service.create_session("u1", "rapport.pdf", total_size, "application/pdf", max_size))
+
+
+def test_reprise_a_la_position_recue():
+    session = _create(10)
+    upload_id = session["upload_id"]
+
+    assert _append(upload_id, 0, b"abcd")["received"] == 4
+    assert _append(upload_id, 4, b"ef", b"ghij")["received"] == 10
+    assert asyncio.run(upload_service.get_session(upload_id, "u1"))["received"] == 10
+
+
+def test_position_incorrecte_refusee():
+    upload_id = _create(10)["upload_id"]
+    _append(upload_id, 0, b"abcd")
+
+    # Morceau renvoyé après une coupure : la position de reprise est indiquée
+    with pytest.raises(HTTPException) as exc:
+        _append(upload_id, 0, b"abcd")
+    assert exc.value.status_code == 409
+    assert exc.value.detail["received"] == 4
+
+
+def test_depassement_de_la_taille_annoncee():
+    upload_id = _create(6)["upload_id"]
+    _append(upload_id, 0, b"abc")
+
+    with pytest.raises(HTTPException) as exc:
+        _append(upload_id, 3, b"def", b"gh")
+    assert exc.value.status_code == 413
+    # Le morceau refusé est retiré : la reprise repart de la position précédente
+    assert asyncio.run(upload_service.get_session(upload_id, "u1"))["received"] == 3
+
+
+def test_taille_maximale_de_la_session():
+    session = _create(6, max_size=6)
+    assert session["max_size"] == 6
+
+    with pytest.raises(HTTPException) as exc:
+        _create(7, max_size=6)
+    assert exc.value.status_code == 413
+
+
+def test_morceaux_concurrents_serialises():
+    upload_id = _create(8)["upload_id"]
+
+    async def both():
+        return await asyncio.gather(
+            upload_service.append_chunk(upload_id, "u1", 0, _stream(b"abcd")),
+            upload_service.append_chunk(upload_id, "u1", 0, _stream(b"abcd")),
+            return_exceptions=True
+        )
+
+    results = asyncio.run(both())
+    refused = [r for r in results if isinstance(r, HTTPException)]
+    assert len(refused) == 1 and refused[0].status_code == 409
+    assert asyncio.run(upload_service.get_session(upload_id, "u1"))["received"] == 4
+
+
+def test_upload_d_un_autre_utilisateur():
+    upload_id = _create(4)["upload_id"]
+    with pytest.raises(HTTPException) as exc:
+        _append(upload_id, 0, b"abcd", user_id="u2")
+    assert exc.value.status_code == 404
+
+
+def test_identifiant_invalide():
+    with pytest.raises(HTTPException) as exc:
+        _append("../../etc/passwd", 0, b"x")
+    assert exc.value.status_code == 404